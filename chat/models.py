@@ -115,6 +115,11 @@ class ChatSession(models.Model):
         verbose_name = 'Chat Session'
         verbose_name_plural = 'Chat Sessions'
         ordering = ['-started_at']
+        indexes = [
+            # Agent queues: waiting / active sessions, newest first
+            models.Index(fields=['status', 'started_at'], name='chat_session_status_idx'),
+            models.Index(fields=['agent', 'status'], name='chat_session_agent_status_idx'),
+        ]
 
     def __str__(self):
         return f"Session {self.session_id} - {self.status}"
@@ -175,6 +180,10 @@ class ChatMessage(models.Model):
         verbose_name = 'Chat Message'
         verbose_name_plural = 'Chat Messages'
         ordering = ['timestamp']
+        indexes = [
+            # Session history in order, and the latest message per session
+            models.Index(fields=['session', 'timestamp'], name='chat_message_session_time_idx'),
+        ]
 
     def __str__(self):
         return f"{self.sender_type}: {self.message[:50]}"
@@ -1,3 +1,85 @@
+from django.db.models import Count, Max
 from django.test import TestCase
 
-# Create your tests here.
+from core.models import UserProfile
+from core.testutils import QueryPlanMixin
+
+from .models import ChatMessage, ChatSession
+
+
+class ChatQueryPlanTests(QueryPlanMixin, TestCase):
+    """
+    Agent queues and session history must be served by an index
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = UserProfile.objects.create_user(username='agent', password='x', role='admin', is_staff=True)
+        statuses = ['closed', 'closed', 'closed', 'active', 'waiting', 'bot']
+        ChatSession.objects.bulk_create([
+            ChatSession(
+                session_id=f'session-{index}',
+                customer_name=f'Customer {index}',
+                agent=cls.agent if statuses[index % len(statuses)] in ('active', 'closed') else None,
+                status=statuses[index % len(statuses)],
+            )
+            for index in range(1200)
+        ])
+        cls.session = ChatSession.objects.get(session_id='session-3')
+        first = ChatSession.objects.order_by('pk').first()
+        ChatMessage.objects.bulk_create([
+            ChatMessage(session_id=first.pk + index % 1200, sender_type='customer', message=f'Message {index}')
+            for index in range(6000)
+        ], batch_size=500)
+        cls.analyze()
+
+    def test_waiting_sessions(self):
+        self.assertUsesIndex(ChatSession.objects.filter(status='waiting'), 'chat_session_status_idx')
+
+    def test_agent_active_sessions(self):
+        self.assertUsesIndex(ChatSession.objects.filter(status='active', agent=self.agent))
+
+    def test_session_history(self):
+        self.assertUsesIndex(
+            ChatMessage.objects.filter(session_id=self.session.pk).values('sender_type', 'message', 'timestamp'),
+            'chat_message_session_time_idx'
+        )
+
+    def test_session_validators(self):
+        self.assertUsesIndex(
+            ChatSession.objects.filter(session_id=self.session.session_id).annotate(
+                last_message_at=Max('messages__timestamp'),
+                message_count=Count('messages')
+            ).values_list('pk', 'last_message_at', 'message_count')
+        )
+
+
+class ChatHistoryConditionalGetTests(TestCase):
+    """
+    Polling clients get 304 Not Modified until a message arrives
+    """
+
+    def setUp(self):
+        self.session = ChatSession.objects.create(session_id='session-1', customer_name='Customer')
+        ChatMessage.objects.create(session=self.session, sender_type='customer', message='Hello')
+        self.url = f'/chat/api/history/{self.session.session_id}/'
+
+    def test_matching_etag_is_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([message['message'] for message in response.json()['messages']], ['Hello'])
+        etag = response.headers['ETag']
+
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.headers['ETag'], etag)
+
+        ChatMessage.objects.create(session=self.session, sender_type='bot', message='Hi there')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(len(response.json()['messages']), 2)
+
+    def test_unknown_session_is_not_found(self):
+        self.assertEqual(self.client.get('/chat/api/history/missing/').status_code, 404)
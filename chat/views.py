@@ -4,6 +4,10 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic import TemplateView, ListView
 from django.http import JsonResponse
 from django.views import View
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+import hashlib
 import uuid
 from .models import ChatSession, ChatMessage, FAQ
 
@@ -129,24 +133,65 @@ class FAQListView(ListView):
 class GetChatHistoryView(View):
     """
     API endpoint to get chat history for a session
+    Supports conditional GET: unchanged sessions get 304 Not Modified
     """
     def get(self, request, session_id):
-        try:
-            session = ChatSession.objects.get(session_id=session_id)
-            messages = session.messages.all().values(
-                'sender_type',
-                'message',
-                'timestamp',
-                'sender__username'
-            )
-
-            return JsonResponse({
-                'success': True,
-                'messages': list(messages),
-                'status': session.status
-            })
-        except ChatSession.DoesNotExist:
+        validators = self.get_validators(session_id)
+        if validators is None:
             return JsonResponse({
                 'success': False,
                 'error': 'Session not found'
             }, status=404)
+
+        session_pk, session_status, etag, last_modified = validators
+
+        # Answer from the validators alone when the client is up to date
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            not_modified.headers['ETag'] = etag
+            return not_modified
+
+        messages = ChatMessage.objects.filter(session_id=session_pk).values(
+            'sender_type',
+            'message',
+            'timestamp',
+            'sender__username'
+        )
+
+        response = JsonResponse({
+            'success': True,
+            'messages': list(messages),
+            'status': session_status
+        })
+        response.headers['ETag'] = etag
+        response.headers['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def get_validators(self, session_id):
+        """
+        Return (pk, status, etag, last_modified) for a session, or None
+        Reads only the session row and aggregates over its messages on the
+        session foreign key index instead of loading the message bodies
+        """
+        row = ChatSession.objects.filter(session_id=session_id).annotate(
+            last_message_at=Max('messages__timestamp'),
+            message_count=Count('messages')
+        ).values_list(
+            'pk', 'status', 'started_at', 'agent_joined_at', 'ended_at',
+            'last_message_at', 'message_count'
+        ).first()
+
+        if row is None:
+            return None
+
+        pk, status, started_at, agent_joined_at, ended_at, last_message_at, message_count = row
+
+        etag_source = f'{session_id}:{status}:{last_message_at and last_message_at.isoformat()}:{message_count}'
+        etag = quote_etag(hashlib.sha1(etag_source.encode()).hexdigest())
+
+        last_modified = max(
+            timestamp for timestamp in (started_at, agent_joined_at, ended_at, last_message_at)
+            if timestamp is not None
+        )
+
+        return pk, status, etag, int(last_modified.timestamp())
@@ -0,0 +1,142 @@
+"""
+Address normalization
+
+Free-text pickup and delivery addresses are parsed once, when a shipment is
+written, into city / region / postcode / country columns. Tracking responses
+and reports read those columns instead of re-splitting the raw text.
+"""
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
+ADDRESS_CACHE_SIZE = 4096
+
+# Common spellings mapped to one canonical country name so they group together
+COUNTRY_ALIASES = {
+    'ng': 'Nigeria',
+    'nga': 'Nigeria',
+    'nigeria': 'Nigeria',
+    'gh': 'Ghana',
+    'gha': 'Ghana',
+    'ghana': 'Ghana',
+    'ke': 'Kenya',
+    'kenya': 'Kenya',
+    'za': 'South Africa',
+    'south africa': 'South Africa',
+    'us': 'United States',
+    'usa': 'United States',
+    'u.s.a.': 'United States',
+    'united states': 'United States',
+    'united states of america': 'United States',
+    'uk': 'United Kingdom',
+    'gb': 'United Kingdom',
+    'great britain': 'United Kingdom',
+    'united kingdom': 'United Kingdom',
+    'england': 'United Kingdom',
+    'ca': 'Canada',
+    'canada': 'Canada',
+    'de': 'Germany',
+    'germany': 'Germany',
+    'fr': 'France',
+    'france': 'France',
+    'in': 'India',
+    'india': 'India',
+    'cn': 'China',
+    'china': 'China',
+    'ae': 'United Arab Emirates',
+    'uae': 'United Arab Emirates',
+    'united arab emirates': 'United Arab Emirates',
+}
+
+POSTCODE_PATTERNS = [
+    re.compile(r'\b[A-Z]{1,2}\d[A-Z\d]?\s*\d[A-Z]{2}\b', re.IGNORECASE),  # UK
+    re.compile(r'\b[A-Z]\d[A-Z]\s*\d[A-Z]\d\b', re.IGNORECASE),  # Canada
+    re.compile(r'\b\d{5}(?:-\d{4})?\b'),  # US ZIP / ZIP+4
+    re.compile(r'\b\d{4,6}\b'),  # Generic numeric postcodes
+]
+
+SEPARATORS = re.compile(r'[,\n;]+')
+WHITESPACE = re.compile(r'\s+')
+
+
+class ParsedAddress(NamedTuple):
+    city: str
+    region: str
+    postcode: str
+    country: str
+
+
+EMPTY_ADDRESS = ParsedAddress('', '', '', '')
+
+
+def normalize_address_text(address):
+    """
+    Collapse whitespace in every line of an address, dropping empty lines
+    """
+    lines = (WHITESPACE.sub(' ', line).strip() for line in (address or '').splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+@lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def parse_address(address):
+    """
+    Parse a free-text address into (city, region, postcode, country)
+    Results are memoized in-process since the same addresses recur often
+    (e.g. a shipper's pickup address)
+    """
+    parts = [WHITESPACE.sub(' ', part).strip() for part in SEPARATORS.split(address or '')]
+    parts = [part for part in parts if part]
+    if not parts:
+        return EMPTY_ADDRESS
+
+    # Country: a known name or code in the last part
+    country = ''
+    if len(parts) > 1:
+        country = COUNTRY_ALIASES.get(parts[-1].lower().rstrip('.'), '')
+        if country:
+            parts = parts[:-1]
+
+    # Postcode: searched from the end, removed from the part it was found in
+    postcode = ''
+    for index in range(len(parts) - 1, max(len(parts) - 3, 0) - 1, -1):
+        for pattern in POSTCODE_PATTERNS:
+            match = pattern.search(parts[index])
+            if match and index > 0:
+                postcode = WHITESPACE.sub(' ', match.group(0)).upper()
+                remainder = (parts[index][:match.start()] + parts[index][match.end():]).strip(' -')
+                if remainder:
+                    parts[index] = remainder
+                else:
+                    del parts[index]
+                break
+        if postcode:
+            break
+
+    # The first part is the street; then city, then region if present
+    locality = parts[1:]
+    city = region = ''
+    if len(locality) >= 2:
+        city, region = locality[-2], locality[-1]
+    elif len(locality) == 1:
+        city = locality[0]
+
+    if len(region) <= 3:
+        region = region.upper()
+
+    return ParsedAddress(city=city, region=region, postcode=postcode, country=country)
+
+
+def apply_address_fields(shipment):
+    """
+    Populate the normalized address columns of a shipment from its raw addresses
+    Components longer than their column are cut to fit, except postcodes,
+    which are left blank rather than stored wrong
+    """
+    for prefix in ('pickup', 'delivery'):
+        parsed = parse_address(getattr(shipment, f'{prefix}_address'))
+        for component, value in parsed._asdict().items():
+            field_name = f'{prefix}_{component}'
+            max_length = shipment._meta.get_field(field_name).max_length
+            if len(value) > max_length:
+                value = '' if component == 'postcode' else value[:max_length].rstrip()
+            setattr(shipment, field_name, value)
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import UserProfile, Shipment, ShipmentStatusNote
+from .models import UserProfile, Shipment, ShipmentStatusNote, ShipmentEvent
 
 # Register your models here.
 
@@ -36,6 +36,18 @@ class ShipmentStatusNoteInline(admin.TabularInline):
         formset.save_m2m()
 
 
+class ShipmentEventInline(admin.TabularInline):
+    """Read-only inline showing the append-only event log"""
+    model = ShipmentEvent
+    extra = 0
+    can_delete = False
+    fields = ['status', 'location', 'city', 'description', 'actor', 'created_at']
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Shipment)
 class ShipmentAdmin(admin.ModelAdmin):
     list_display = [
@@ -48,18 +60,23 @@ class ShipmentAdmin(admin.ModelAdmin):
         'created_at',
         'updated_at'
     ]
-    list_filter = ['status', 'created_at', 'updated_at', 'courier']
+    list_filter = ['status', 'created_at', 'updated_at', 'courier', 'delivery_country']
     search_fields = [
         'tracking_number',
         'recipient_name',
         'shipper__username',
         'courier__username'
     ]
-    readonly_fields = ['tracking_number', 'created_at', 'updated_at']
+    readonly_fields = [
+        'tracking_number', 'created_at', 'updated_at',
+        'pickup_city', 'pickup_region', 'pickup_postcode', 'pickup_country',
+        'delivery_city', 'delivery_region', 'delivery_postcode', 'delivery_country',
+    ]
     date_hierarchy = 'created_at'
     ordering = ['-created_at']
     list_per_page = 25
-    inlines = [ShipmentStatusNoteInline]
+    inlines = [ShipmentStatusNoteInline, ShipmentEventInline]
+    actions = ['auto_assign_couriers']
 
     fieldsets = (
         ('Tracking Information', {
@@ -74,6 +91,13 @@ class ShipmentAdmin(admin.ModelAdmin):
         ('Addresses', {
             'fields': ('pickup_address', 'delivery_address')
         }),
+        ('Normalized Addresses', {
+            'fields': (
+                ('pickup_city', 'pickup_region', 'pickup_postcode', 'pickup_country'),
+                ('delivery_city', 'delivery_region', 'delivery_postcode', 'delivery_country'),
+            ),
+            'classes': ('collapse',)
+        }),
         ('Package Details', {
             'fields': ('weight', 'notes')
         }),
@@ -92,6 +116,14 @@ class ShipmentAdmin(admin.ModelAdmin):
         qs = super().get_queryset(request)
         return qs.select_related('shipper', 'courier')
 
+    @admin.action(description='Auto-assign couriers to selected unassigned shipments')
+    def auto_assign_couriers(self, request, queryset):
+        """Hand pending shipments without a courier to the least loaded couriers"""
+        from .assignment import assign_unassigned
+
+        assigned = assign_unassigned(queryset=queryset, actor=request.user)
+        self.message_user(request, f'Assigned {assigned} shipments to couriers.')
+
     def save_formset(self, request, form, formset, change):
         """Save formset and set created_by for status notes"""
         if formset.model == ShipmentStatusNote:
@@ -105,81 +137,10 @@ class ShipmentAdmin(admin.ModelAdmin):
             formset.save()
 
     def save_model(self, request, obj, form, change):
-        """Send email notification when status changes"""
-        if change:
-            # Get the original object from database
-            try:
-                original = Shipment.objects.get(pk=obj.pk)
-                if original.status != obj.status:
-                    # Status has changed - store previous status
-                    obj.previous_status = original.status
-                    # Send email notification
-                    self.send_status_change_email(obj, original.status, obj.status)
-            except Shipment.DoesNotExist:
-                pass
-
-        super().save_model(request, obj, form, change)
-
-    def send_status_change_email(self, shipment, old_status, new_status):
-        """Send email notification about status change"""
-        from django.core.mail import send_mail
-        from django.conf import settings
-
-        # Prepare email recipients
-        recipients = []
-
-        # Add shipper email
-        if shipment.shipper.email:
-            recipients.append(shipment.shipper.email)
-
-        # Add recipient email if provided
-        if shipment.recipient_email:
-            recipients.append(shipment.recipient_email)
-
-        if not recipients:
-            return
-
-        # Prepare email content
-        subject = f'Shipment Update - {shipment.tracking_number}'
-
-        old_status_display = dict(Shipment.STATUS_CHOICES).get(old_status, old_status)
-        new_status_display = dict(Shipment.STATUS_CHOICES).get(new_status, new_status)
-
-        message = f'''
-Hello,
-
-Your shipment status has been updated:
-
-Tracking Number: {shipment.tracking_number}
-Previous Status: {old_status_display}
-New Status: {new_status_display}
-'''
-
-        # Add hold reason if status is hold
-        if new_status == 'hold' and shipment.hold_reason:
-            message += f'\nReason for Hold: {shipment.hold_reason}\n'
-
-        message += f'''
-Package Details:
-- From: {shipment.shipper.username}
-- To: {shipment.recipient_name}
-- Weight: {shipment.weight} kg
-
-You can track your shipment at any time using your tracking number.
-
-Thank you for using our service!
-
-Best regards,
-Nexpress Team
-        '''
-
-        try:
-            send_mail(
-                subject,
-                message,
-                settings.DEFAULT_FROM_EMAIL if hasattr(settings, 'DEFAULT_FROM_EMAIL') else 'noreply@nexpress.com',
-                recipients,
-                fail_silently=True,
-            )
-        except Exception as e:
-            print(f"Error sending status change email: {e}")
+        """Record the previous status; the state machine emails the status change"""
+        if change and obj.has_changed('status'):
+            # Status has changed - store previous status from the loaded snapshot
+            obj.previous_status = obj.get_original_value('status')
+
+        # Save directly (instead of super().save_model) to record the actor on the event log
+        obj.save(actor=request.user)
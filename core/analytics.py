@@ -0,0 +1,233 @@
+"""
+Delivery performance analytics
+
+Status transitions are read from the ShipmentEvent log in one values_list
+pass into a columnar NumPy record array (shipment, status, timestamp,
+courier), sorted by shipment and time. Every metric is then computed with
+vectorized operations on those columns, never row by row:
+
+- time in status: the gap between consecutive events of a shipment, grouped
+  by the status it was in
+- pickup to delivery: first picked_up to last delivered event, per courier
+- hold dwell: time spent in 'hold', as a histogram
+
+Grouped percentiles sort once by (group, value) and pick each group's
+percentile positions with array indexing. Results are cached per time window.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+ANALYTICS_CACHE_TIMEOUT = getattr(settings, 'ANALYTICS_CACHE_TIMEOUT', 300)
+
+# window: days of shipments (by creation date) analysed
+ANALYTICS_WINDOWS = {'7d': 7, '30d': 30, '90d': 90}
+
+DEFAULT_ANALYTICS_WINDOW = '30d'
+
+PERCENTILES = (50, 90, 99)
+
+# Histogram bucket edges in hours
+DWELL_BUCKET_HOURS = [0, 1, 4, 12, 24, 48, 72, 168, np.inf]
+
+TRANSITION_DTYPE = np.dtype([
+    ('shipment', 'i8'),
+    ('status', 'i1'),
+    ('at', 'f8'),       # seconds since the epoch
+    ('courier', 'i8'),  # 0 when unassigned
+])
+
+
+def status_codes():
+    from .models import Shipment
+
+    return [code for code, _ in Shipment.STATUS_CHOICES]
+
+
+def analytics_cache_key(window):
+    return f'analytics:delivery:v1:{window}'
+
+
+def load_transitions(since=None, until=None):
+    """
+    Status transitions of shipments created in [since, until) as a
+    TRANSITION_DTYPE array ordered by shipment and time
+    One query, streamed straight into the array
+    """
+    from .models import ShipmentEvent
+
+    status_index = {code: index for index, code in enumerate(status_codes())}
+
+    events = ShipmentEvent.objects.order_by('shipment_id', 'created_at', 'id')
+    if since is not None:
+        events = events.filter(shipment__created_at__gte=since)
+    if until is not None:
+        events = events.filter(shipment__created_at__lt=until)
+
+    rows = events.values_list('shipment_id', 'status', 'created_at', 'shipment__courier_id').iterator(chunk_size=5000)
+    return np.fromiter(
+        ((shipment_id, status_index[status], created_at.timestamp(), courier_id or 0)
+         for shipment_id, status, created_at, courier_id in rows),
+        dtype=TRANSITION_DTYPE
+    )
+
+
+def grouped_percentiles(keys, values, percentiles=PERCENTILES):
+    """
+    Percentiles of values per distinct key, interpolated linearly like
+    numpy.percentile
+    Returns (groups, counts, matrix) with one row of percentiles per group
+    """
+    if len(values) == 0:
+        return np.array([], dtype=keys.dtype), np.array([], dtype=np.int64), np.empty((0, len(percentiles)))
+
+    order = np.lexsort((values, keys))
+    keys, values = keys[order], values[order]
+    groups, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+
+    positions = (counts - 1)[:, None] * (np.asarray(percentiles) / 100)[None, :]
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.minimum(lower + 1, (counts - 1)[:, None])
+    low_values = values[starts[:, None] + lower]
+    high_values = values[starts[:, None] + upper]
+    return groups, counts, low_values + (high_values - low_values) * (positions - lower)
+
+
+def status_dwell(transitions):
+    """
+    (status, seconds) of every completed stay in a status: the gap to the
+    shipment's next event
+    """
+    same_shipment = transitions['shipment'][1:] == transitions['shipment'][:-1]
+    seconds = np.diff(transitions['at'])[same_shipment]
+    return transitions['status'][:-1][same_shipment], seconds
+
+
+def pickup_to_delivery(transitions):
+    """
+    (courier, seconds) from the first picked_up to the last delivered event of
+    every delivered shipment with a courier
+    """
+    codes = status_codes()
+    picked = transitions[transitions['status'] == codes.index('picked_up')]
+    delivered = transitions[transitions['status'] == codes.index('delivered')][::-1]
+
+    # Rows are ordered by time per shipment, so the first index of each
+    # shipment is its first pickup, and in the reversed array its last delivery
+    picked_ids, picked_first = np.unique(picked['shipment'], return_index=True)
+    delivered_ids, delivered_last = np.unique(delivered['shipment'], return_index=True)
+    _, picked_rows, delivered_rows = np.intersect1d(
+        picked_ids, delivered_ids, assume_unique=True, return_indices=True
+    )
+
+    picked = picked[picked_first[picked_rows]]
+    delivered = delivered[delivered_last[delivered_rows]]
+    seconds = delivered['at'] - picked['at']
+    keep = (seconds >= 0) & (delivered['courier'] != 0)
+    return delivered['courier'][keep], seconds[keep]
+
+
+def dwell_histogram(seconds, bucket_hours=DWELL_BUCKET_HOURS):
+    """
+    Counts of durations per hour bucket, as [{'label', 'count'}]
+    """
+    counts, _ = np.histogram(np.asarray(seconds) / 3600, bins=bucket_hours)
+    labels = []
+    for low, high in zip(bucket_hours[:-1], bucket_hours[1:]):
+        if np.isinf(high):
+            labels.append(f'{format_hours(low)}+')
+        else:
+            labels.append(f'{format_hours(low)}-{format_hours(high)}')
+    return [{'label': label, 'count': int(count)} for label, count in zip(labels, counts)]
+
+
+def format_hours(hours):
+    if hours and hours % 24 == 0:
+        return f'{int(hours // 24)}d'
+    return f'{int(hours)}h'
+
+
+def percentile_row(values, percentiles=PERCENTILES):
+    """
+    {'count', 'p50', 'p90', ...} of an array of durations
+    """
+    row = {'count': int(len(values))}
+    points = np.percentile(values, percentiles) if len(values) else [None] * len(percentiles)
+    row.update({f'p{p}': None if point is None else float(point) for p, point in zip(percentiles, points)})
+    return row
+
+
+def compute_delivery_analytics(transitions, percentiles=PERCENTILES):
+    """
+    Every delivery metric of a transition array
+    Durations are in seconds; couriers are identified by id
+    """
+    from .models import Shipment
+
+    codes = status_codes()
+    labels = dict(Shipment.STATUS_CHOICES)
+    names = [f'p{p}' for p in percentiles]
+
+    statuses, dwell = status_dwell(transitions)
+    groups, counts, matrix = grouped_percentiles(statuses, dwell, percentiles)
+    time_in_status = [
+        {'status': codes[group], 'display': labels[codes[group]], 'count': int(count),
+         **dict(zip(names, row.tolist()))}
+        for group, count, row in zip(groups, counts, matrix)
+    ]
+
+    couriers, delivery = pickup_to_delivery(transitions)
+    groups, counts, matrix = grouped_percentiles(couriers, delivery, percentiles)
+    courier_delivery = [
+        {'courier_id': int(group), 'count': int(count), **dict(zip(names, row.tolist()))}
+        for group, count, row in zip(groups, counts, matrix)
+    ]
+    courier_delivery.sort(key=lambda row: row[names[0]])
+
+    hold_dwell = dwell[statuses == codes.index('hold')]
+
+    return {
+        'event_count': int(len(transitions)),
+        'shipment_count': int(len(np.unique(transitions['shipment']))),
+        'time_in_status': time_in_status,
+        'delivery': percentile_row(delivery, percentiles),
+        'delivery_histogram': dwell_histogram(delivery),
+        'courier_delivery': courier_delivery,
+        'hold': percentile_row(hold_dwell, percentiles),
+        'hold_histogram': dwell_histogram(hold_dwell),
+    }
+
+
+def get_delivery_analytics(window=DEFAULT_ANALYTICS_WINDOW):
+    """
+    Read-through cached delivery analytics of the shipments created within a
+    window (a key of ANALYTICS_WINDOWS; unknown windows use the default)
+    """
+    from .models import UserProfile
+
+    if window not in ANALYTICS_WINDOWS:
+        window = DEFAULT_ANALYTICS_WINDOW
+
+    key = analytics_cache_key(window)
+    analytics = cache.get(key)
+    if analytics is not None:
+        return analytics
+
+    now = timezone.now()
+    transitions = load_transitions(since=now - timedelta(days=ANALYTICS_WINDOWS[window]))
+    analytics = compute_delivery_analytics(transitions)
+
+    usernames = dict(
+        UserProfile.objects.filter(
+            pk__in=[row['courier_id'] for row in analytics['courier_delivery']]
+        ).values_list('pk', 'username')
+    )
+    for row in analytics['courier_delivery']:
+        row['courier'] = usernames.get(row['courier_id'], '')
+
+    analytics.update(window=window, generated_at=now)
+    cache.set(key, analytics, ANALYTICS_CACHE_TIMEOUT)
+    return analytics
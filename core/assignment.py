@@ -0,0 +1,290 @@
+"""
+Automatic courier assignment
+
+A workload index maps every courier to their number of active shipments and
+their area (the city of their profile address, else the city most of their
+active shipments are picked up in). It is built with two queries, cached, and
+kept live: Shipment.save and deletes adjust the cached loads once their
+transaction commits. Like the shared rate-limit store it is best-effort (a
+read-modify-write of one cache entry); its timeout bounds any drift.
+
+assign_unassigned() hands pending shipments without a courier, oldest first,
+to the least loaded courier, preferring a courier in the shipment's pickup city
+unless they carry LOCALITY_SLACK more shipments than the least loaded courier
+overall. Candidates come from min-heaps on load (one overall, one per city)
+so each pick is O(log couriers). Each batch of shipments is committed with one
+bulk_update; the state machine's transition hooks write the events, counters
+and rollups Shipment.save would have produced, and couriers get one summary
+email per batch.
+"""
+import heapq
+import logging
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import send_mass_mail
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .addresses import parse_address
+
+logger = logging.getLogger(__name__)
+
+WORKLOAD_CACHE_KEY = 'assignment:workload:v1'
+
+WORKLOAD_CACHE_TIMEOUT = getattr(settings, 'WORKLOAD_CACHE_TIMEOUT', 600)
+
+# Statuses that count towards a courier's load
+WORKLOAD_STATUSES = ('accepted', 'picked_up', 'in_transit')
+
+# Most active shipments the engine gives a courier (None for no limit)
+ASSIGNMENT_MAX_LOAD = getattr(settings, 'ASSIGNMENT_MAX_LOAD', 25)
+
+# Extra shipments a local courier may carry over the least loaded one and still be preferred
+LOCALITY_SLACK = getattr(settings, 'ASSIGNMENT_LOCALITY_SLACK', 3)
+
+ASSIGNMENT_BATCH_SIZE = 500
+
+
+def area_key(city):
+    return (city or '').strip().lower()
+
+
+def build_workload_index():
+    """
+    Return {courier_id: {'load': active shipments, 'area': city key}} from the
+    database
+    """
+    from .models import Shipment, UserProfile
+
+    index = {
+        pk: {'load': 0, 'area': area_key(parse_address(address).city)}
+        for pk, address in UserProfile.objects.filter(role='courier', is_active=True).values_list('pk', 'address')
+    }
+
+    cities = {}
+    rows = Shipment.objects.filter(
+        courier__isnull=False, status__in=WORKLOAD_STATUSES
+    ).order_by().values('courier_id', 'pickup_city').annotate(total=Count('pk'))
+    for row in rows:
+        entry = index.get(row['courier_id'])
+        if entry is None:
+            continue
+        entry['load'] += row['total']
+        cities.setdefault(row['courier_id'], Counter())[area_key(row['pickup_city'])] += row['total']
+
+    for courier_id, counts in cities.items():
+        if not index[courier_id]['area']:
+            index[courier_id]['area'] = counts.most_common(1)[0][0]
+    return index
+
+
+def get_workload_index(refresh=False):
+    """
+    Read-through cached workload index
+    """
+    index = None if refresh else cache.get(WORKLOAD_CACHE_KEY)
+    if index is None:
+        index = build_workload_index()
+        cache.set(WORKLOAD_CACHE_KEY, index, WORKLOAD_CACHE_TIMEOUT)
+    return index
+
+
+def workload_deltas(old_courier_id, old_status, new_courier_id, new_status):
+    """
+    {courier_id: delta} of a shipment moving between (courier, status) pairs
+    """
+    deltas = Counter()
+    if old_courier_id and old_status in WORKLOAD_STATUSES:
+        deltas[old_courier_id] -= 1
+    if new_courier_id and new_status in WORKLOAD_STATUSES:
+        deltas[new_courier_id] += 1
+    return {courier_id: delta for courier_id, delta in deltas.items() if delta}
+
+
+def adjust_workload(deltas):
+    """
+    Apply {courier_id: delta} to the cached workload index once the current
+    transaction commits; a no-op when the index is not cached
+    """
+    if not deltas:
+        return
+
+    def apply():
+        index = cache.get(WORKLOAD_CACHE_KEY)
+        if index is None:
+            return
+        for courier_id, delta in deltas.items():
+            if courier_id in index:
+                index[courier_id]['load'] = max(0, index[courier_id]['load'] + delta)
+        cache.set(WORKLOAD_CACHE_KEY, index, WORKLOAD_CACHE_TIMEOUT)
+
+    transaction.on_commit(apply)
+
+
+class CourierHeap:
+    """
+    Couriers ordered by load, overall and per area
+    Entries are (load, courier_id); an entry is stale once the courier's load
+    has moved on and is discarded when it reaches the top
+    """
+
+    def __init__(self, index, max_load=ASSIGNMENT_MAX_LOAD):
+        self.loads = {courier_id: entry['load'] for courier_id, entry in index.items()}
+        self.areas = {courier_id: entry['area'] for courier_id, entry in index.items()}
+        self.max_load = max_load
+        self.overall = []
+        self.by_area = {}
+        for courier_id in self.loads:
+            self.push(courier_id)
+
+    def push(self, courier_id):
+        load = self.loads[courier_id]
+        if self.max_load is not None and load >= self.max_load:
+            return
+        heapq.heappush(self.overall, (load, courier_id))
+        if self.areas[courier_id]:
+            heapq.heappush(self.by_area.setdefault(self.areas[courier_id], []), (load, courier_id))
+
+    def peek(self, heap):
+        while heap and heap[0][0] != self.loads[heap[0][1]]:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def take(self, area=''):
+        """
+        Pick the courier for a shipment picked up in an area and count the
+        shipment against them; None when every courier is at capacity
+        """
+        best = self.peek(self.overall)
+        if best is None:
+            return None
+        local = self.peek(self.by_area.get(area_key(area), []))
+        if local is not None and local[0] <= best[0] + LOCALITY_SLACK:
+            best = local
+
+        courier_id = best[1]
+        self.loads[courier_id] += 1
+        self.push(courier_id)
+        return courier_id
+
+
+def assign_unassigned(queryset=None, batch_size=ASSIGNMENT_BATCH_SIZE, max_load=ASSIGNMENT_MAX_LOAD,
+                      limit=None, actor=None, progress=None):
+    """
+    Assign pending shipments without a courier, oldest first
+    queryset optionally narrows the shipments considered (e.g. an admin
+    selection); returns the number of shipments assigned
+    progress, if given, is called with each committed batch as
+    [(shipment, courier_id)]
+    """
+    from .models import Shipment
+
+    if queryset is None:
+        queryset = Shipment.objects.all()
+    heap = CourierHeap(get_workload_index(), max_load=max_load)
+    assigned = 0
+
+    while limit is None or assigned < limit:
+        size = batch_size if limit is None else min(batch_size, limit - assigned)
+        with transaction.atomic():
+            # Rows locked by a concurrent accept are skipped, not waited for
+            shipments = list(
+                queryset.select_related(None).select_for_update(skip_locked=True).filter(
+                    status='pending', courier__isnull=True
+                ).order_by('created_at', 'id')[:size]
+            )
+            if not shipments:
+                break
+
+            pairs = []
+            for shipment in shipments:
+                courier_id = heap.take(shipment.pickup_city)
+                if courier_id is None:
+                    break
+                pairs.append((shipment, courier_id))
+            if not pairs:
+                break
+
+            commit_assignments(pairs, actor=actor)
+
+        assigned += len(pairs)
+        if progress:
+            progress(pairs)
+        if len(pairs) < len(shipments):
+            # Every courier is at capacity
+            break
+
+    return assigned
+
+
+def commit_assignments(pairs, actor=None):
+    """
+    Write [(shipment, courier_id)] assignments of pending shipments, within the
+    caller's transaction
+    One bulk_update for the shipments; the transition hooks then write the
+    events, counters, rollups and workload changes once per batch
+    """
+    from .models import Shipment, UserProfile
+    from .state_machine import SYSTEM_ROLE, run_transition_hooks, validate_transition
+    from .tracking import invalidate_tracking_cache, publish_tracking_update
+
+    couriers = UserProfile.objects.in_bulk({courier_id for _, courier_id in pairs})
+    now = timezone.now()
+
+    transitions = []
+    for shipment, courier_id in pairs:
+        validate_transition(SYSTEM_ROLE, shipment.status, 'accepted')
+        transitions.append((shipment, shipment.status, shipment.courier_id, 'accepted'))
+        shipment.previous_status = shipment.status
+        shipment.status = 'accepted'
+        shipment.courier = couriers[courier_id]
+        shipment.updated_at = now
+    shipments = [shipment for shipment, _ in pairs]
+
+    Shipment.objects.bulk_update(shipments, ['status', 'previous_status', 'courier', 'updated_at'])
+    for shipment in shipments:
+        shipment._loaded_values = shipment._snapshot()
+
+    # Assignments are the system's decisions, whoever triggered the run
+    run_transition_hooks(transitions, role=SYSTEM_ROLE, actor=actor, now=now)
+
+    invalidate_tracking_cache(*[shipment.tracking_number for shipment in shipments])
+    for shipment in shipments:
+        publish_tracking_update(shipment)
+
+    transaction.on_commit(lambda: notify_couriers(shipments))
+
+
+def notify_couriers(shipments):
+    """
+    Email each courier one summary of the shipments assigned to them
+    """
+    by_courier = {}
+    for shipment in shipments:
+        by_courier.setdefault(shipment.courier, []).append(shipment)
+
+    sender = getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@nexpress.com')
+    messages = []
+    for courier, assigned in by_courier.items():
+        if not courier.email:
+            continue
+        lines = '\n'.join(
+            f'- {shipment.tracking_number}: {shipment.pickup_city or shipment.pickup_address} -> '
+            f'{shipment.delivery_city or shipment.delivery_address}'
+            for shipment in assigned
+        )
+        messages.append((
+            f'{len(assigned)} new shipment(s) assigned to you',
+            f'Hello {courier.username},\n\nThe following shipments have been assigned to you:\n\n{lines}\n\n'
+            f'Please log in to your courier dashboard to view more details.\n\nBest regards,\nNexpress Team',
+            sender,
+            [courier.email],
+        ))
+
+    try:
+        send_mass_mail(messages, fail_silently=True)
+    except Exception:
+        logger.exception('Error sending courier assignment emails')
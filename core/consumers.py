@@ -0,0 +1,71 @@
+import json
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
+from .tracking import get_tracking_payload, tracking_group_name
+
+
+class TrackingConsumer(AsyncWebsocketConsumer):
+    """
+    WebSocket consumer for live shipment tracking
+    Subscribers join a per-shipment group and receive a push whenever the
+    shipment's status, courier or hold reason changes
+    """
+
+    async def connect(self):
+        self.tracking_number = self.scope['url_route']['kwargs']['tracking_number'].upper()
+        self.group_name = None
+
+        payload = await self.get_payload()
+        if payload is None:
+            await self.close()
+            return
+
+        # Previous tracking numbers subscribe to the shipment's current number
+        self.group_name = tracking_group_name(payload['tracking_number'])
+
+        # Join shipment group
+        await self.channel_layer.group_add(
+            self.group_name,
+            self.channel_name
+        )
+
+        await self.accept()
+
+        # Send current state so the client starts from a known snapshot
+        await self.send(text_data=json.dumps({
+            'type': 'snapshot',
+            'tracking_number': payload['tracking_number'],
+            'status': payload['status'],
+            'status_display': payload['status_display'],
+            'last_updated': payload['last_updated'],
+        }))
+
+    async def disconnect(self, close_code):
+        # Leave shipment group (rejected connections never joined one)
+        if self.group_name is None:
+            return
+        await self.channel_layer.group_discard(
+            self.group_name,
+            self.channel_name
+        )
+
+    async def tracking_update(self, event):
+        """
+        Receive shipment change from the group and send to WebSocket
+        """
+        await self.send(text_data=json.dumps({
+            'type': 'update',
+            'tracking_number': event['tracking_number'],
+            'status': event['status'],
+            'status_display': event['status_display'],
+            'courier': event['courier'],
+            'hold_reason': event['hold_reason'],
+            'last_updated': event['last_updated'],
+        }))
+
+    @database_sync_to_async
+    def get_payload(self):
+        """
+        Get the (cached) tracking payload for this shipment
+        """
+        return get_tracking_payload(self.tracking_number)
@@ -0,0 +1,123 @@
+"""
+Admin dashboard statistics
+
+Status counts come from the maintained ShipmentStatusCounter table and the
+date-range counters from the shipment rollups (core.rollups); user counters
+come from one conditional-aggregation query over UserProfile, so the cost
+does not grow with the number of statuses or roles. The assembled snapshot is
+cached for a short time so that repeated page loads and auto-refreshes do not
+hit the database at all.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
+
+from .rollups import get_daily_trend
+
+DASHBOARD_CACHE_KEY = 'dashboard:snapshot:v2'
+
+DASHBOARD_CACHE_TIMEOUT = getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 30)
+
+ACTIVE_STATUSES = ['accepted', 'picked_up', 'in_transit']
+
+
+def get_shipment_stats(now=None):
+    """
+    Shipment counters: per-status counts and the total are read from the
+    maintained ShipmentStatusCounter rows; today, this week and unassigned
+    come from one aggregate over the hourly / daily rollups
+    """
+    from .models import Shipment, ShipmentStatusCounter
+    from .rollups import get_period_totals
+
+    counts = ShipmentStatusCounter.get_counts()
+    totals = get_period_totals(now)
+
+    return {
+        'status_counts': {
+            code: {'display': display, 'count': counts[code]}
+            for code, display in Shipment.STATUS_CHOICES
+        },
+        'total_shipments': sum(counts.values()),
+        'today_shipments': totals['today'],
+        'week_shipments': totals['week'],
+        'unassigned_count': totals['unassigned'],
+    }
+
+
+def get_user_stats():
+    """
+    User counters (total, per role, active couriers) computed with a single
+    aggregate query
+    """
+    from .models import Shipment, UserProfile
+
+    has_active_shipment = Exists(
+        Shipment.objects.filter(courier=OuterRef('pk'), status__in=ACTIVE_STATUSES)
+    )
+    aggregates = {
+        f'role_{code}': Count('pk', filter=Q(role=code))
+        for code, _ in UserProfile.ROLE_CHOICES
+    }
+    aggregates.update(
+        total=Count('pk'),
+        active_couriers=Count('pk', filter=Q(has_active_shipment, role='courier')),
+    )
+    row = UserProfile.objects.aggregate(**aggregates)
+
+    role_counts = {code: row[f'role_{code}'] for code, _ in UserProfile.ROLE_CHOICES}
+    return {
+        'role_counts': role_counts,
+        'total_users': row['total'],
+        'courier_count': role_counts.get('courier', 0),
+        'shipper_count': role_counts.get('shipper', 0),
+        'active_couriers': row['active_couriers'],
+    }
+
+
+def get_leaderboards():
+    """
+    Top shippers by shipments created and top couriers by shipments delivered
+    """
+    from .models import UserProfile
+
+    top_shippers = UserProfile.objects.filter(
+        shipments_sent__isnull=False
+    ).annotate(
+        shipment_count=Count('shipments_sent')
+    ).order_by('-shipment_count')[:5]
+
+    top_couriers = UserProfile.objects.filter(
+        role='courier',
+        shipments_assigned__status='delivered'
+    ).annotate(
+        delivered_count=Count('shipments_assigned')
+    ).order_by('-delivered_count')[:5]
+
+    return {
+        'top_shippers': list(top_shippers),
+        'top_couriers': list(top_couriers),
+    }
+
+
+def get_dashboard_snapshot():
+    """
+    Read-through cached snapshot of every admin dashboard statistic
+    A cold snapshot costs six queries however many shipments and users
+    exist: status counters, rollup totals, user counters, one per
+    leaderboard and the daily trend; a warm one costs none
+    """
+    snapshot = cache.get(DASHBOARD_CACHE_KEY)
+    if snapshot is not None:
+        return snapshot
+
+    snapshot = {
+        **get_shipment_stats(),
+        **get_user_stats(),
+        **get_leaderboards(),
+        'daily_trend': get_daily_trend(),
+        'generated_at': timezone.now(),
+    }
+    cache.set(DASHBOARD_CACHE_KEY, snapshot, DASHBOARD_CACHE_TIMEOUT)
+    return snapshot
@@ -0,0 +1,195 @@
+"""
+Streaming shipment exports
+
+Shipments are read as plain value tuples through a server-side cursor
+(QuerySet.iterator) and encoded one chunk at a time, with one extra query per
+chunk for the status history of its shipments. Only a single chunk is ever held
+in memory, so exporting ten million rows costs the same memory as a thousand.
+
+CSV is written as text; Parquet is written with pandas and pyarrow, one row
+group per chunk.
+"""
+import csv
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.utils import timezone
+
+EXPORT_CHUNK_SIZE = 2000
+
+# (column, Shipment field read with values_list)
+EXPORT_FIELDS = [
+    ('tracking_number', 'tracking_number'),
+    ('status', 'status'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+    ('shipper', 'shipper__username'),
+    ('courier', 'courier__username'),
+    ('recipient_name', 'recipient_name'),
+    ('recipient_email', 'recipient_email'),
+    ('pickup_city', 'pickup_city'),
+    ('pickup_country', 'pickup_country'),
+    ('delivery_city', 'delivery_city'),
+    ('delivery_country', 'delivery_country'),
+    ('weight', 'weight'),
+]
+
+EXPORT_COLUMNS = [column for column, _ in EXPORT_FIELDS] + ['status_history']
+
+EXPORT_FORMATS = {
+    # format: (content type, file extension)
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+class UnsupportedExportFormat(ValueError):
+    pass
+
+
+def export_queryset(start=None, end=None, status=None):
+    """
+    Shipments created between two dates (both inclusive, in the current time
+    zone), oldest first
+    """
+    from .models import Shipment
+
+    queryset = Shipment.objects.order_by('created_at', 'id')
+    if start is not None:
+        queryset = queryset.filter(created_at__gte=timezone.make_aware(datetime.combine(start, time.min)))
+    if end is not None:
+        queryset = queryset.filter(
+            created_at__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+        )
+    if status:
+        queryset = queryset.filter(status=status)
+    return queryset
+
+
+def iter_export_chunks(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield lists of up to chunk_size export rows (tuples ordered as EXPORT_COLUMNS)
+    """
+    rows = queryset.values_list('pk', *[field for _, field in EXPORT_FIELDS]).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        histories = get_status_histories([row[0] for row in chunk])
+        yield [(*row[1:], histories.get(row[0], '')) for row in chunk]
+
+
+def get_status_histories(shipment_ids):
+    """
+    Map shipment id to its status history ("status@timestamp; ...", oldest first)
+    One query on the (shipment, created_at) event index
+    """
+    from .models import ShipmentEvent
+
+    histories = {}
+    events = ShipmentEvent.objects.filter(
+        shipment_id__in=shipment_ids
+    ).order_by('shipment_id', 'created_at', 'id').values_list('shipment_id', 'status', 'created_at')
+    for shipment_id, status, created_at in events:
+        histories.setdefault(shipment_id, []).append(f'{status}@{created_at.isoformat()}')
+    return {shipment_id: '; '.join(history) for shipment_id, history in histories.items()}
+
+
+def stream_export(queryset, export_format, chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+    """
+    Return an iterator over the encoded export of a queryset: str chunks for
+    CSV, bytes for Parquet
+    progress, if given, is called with the number of rows in each chunk
+    Raises UnsupportedExportFormat for unknown formats, or for Parquet when
+    pyarrow is not installed
+    """
+    if export_format == 'csv':
+        return iter_csv(queryset, chunk_size, progress)
+    if export_format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise UnsupportedExportFormat('Parquet export requires pyarrow') from e
+        return iter_parquet(queryset, chunk_size, progress)
+    raise UnsupportedExportFormat(f'Unknown export format: {export_format}')
+
+
+class Echo:
+    """
+    File-like object that returns what is written instead of buffering it
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(queryset, chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for chunk in iter_export_chunks(queryset, chunk_size):
+        yield ''.join(
+            writer.writerow([
+                value.isoformat() if isinstance(value, datetime) else value
+                for value in row
+            ])
+            for row in chunk
+        )
+        if progress:
+            progress(len(chunk))
+
+
+class ChunkSink:
+    """
+    Write-only binary file that hands back (and forgets) what was written
+    since the last drain
+    """
+    closed = False
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer.extend(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def parquet_schema():
+    import pyarrow as pa
+
+    timestamp = pa.timestamp('us', tz='UTC')
+    types = {'created_at': timestamp, 'updated_at': timestamp, 'weight': pa.float64()}
+    return pa.schema([(column, types.get(column, pa.string())) for column in EXPORT_COLUMNS])
+
+
+def iter_parquet(queryset, chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema()
+    sink = ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema, compression='snappy')
+    try:
+        for chunk in iter_export_chunks(queryset, chunk_size):
+            frame = pd.DataFrame.from_records(chunk, columns=EXPORT_COLUMNS)
+            frame['created_at'] = pd.to_datetime(frame['created_at'], utc=True)
+            frame['updated_at'] = pd.to_datetime(frame['updated_at'], utc=True)
+            frame['weight'] = frame['weight'].astype('float64')
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+            yield sink.drain()
+            if progress:
+                progress(len(chunk))
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -1,6 +1,18 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from .models import UserProfile, Shipment
+from .addresses import normalize_address_text
+
+# Shipment validation rules, shared with the bulk importer (core.imports)
+MAX_SHIPMENT_WEIGHT = 1000
+
+MIN_ADDRESS_LENGTH = 10
+
+WEIGHT_TOO_LOW_MESSAGE = 'Weight must be greater than 0.'
+
+WEIGHT_TOO_HIGH_MESSAGE = 'Weight cannot exceed 1000 kg. For larger shipments, please contact support.'
+
+INCOMPLETE_ADDRESS_MESSAGE = 'Please provide a complete {kind} address.'
 
 
 class UserRegistrationForm(UserCreationForm):
@@ -157,21 +169,21 @@ class ShipmentForm(forms.ModelForm):
     def clean_weight(self):
         weight = self.cleaned_data.get('weight')
         if weight and weight <= 0:
-            raise forms.ValidationError('Weight must be greater than 0.')
-        if weight and weight > 1000:
-            raise forms.ValidationError('Weight cannot exceed 1000 kg. For larger shipments, please contact support.')
+            raise forms.ValidationError(WEIGHT_TOO_LOW_MESSAGE)
+        if weight and weight > MAX_SHIPMENT_WEIGHT:
+            raise forms.ValidationError(WEIGHT_TOO_HIGH_MESSAGE)
         return weight
 
     def clean_pickup_address(self):
-        address = self.cleaned_data.get('pickup_address')
-        if address and len(address.strip()) < 10:
-            raise forms.ValidationError('Please provide a complete pickup address.')
+        address = normalize_address_text(self.cleaned_data.get('pickup_address'))
+        if address and len(address) < MIN_ADDRESS_LENGTH:
+            raise forms.ValidationError(INCOMPLETE_ADDRESS_MESSAGE.format(kind='pickup'))
         return address
 
     def clean_delivery_address(self):
-        address = self.cleaned_data.get('delivery_address')
-        if address and len(address.strip()) < 10:
-            raise forms.ValidationError('Please provide a complete delivery address.')
+        address = normalize_address_text(self.cleaned_data.get('delivery_address'))
+        if address and len(address) < MIN_ADDRESS_LENGTH:
+            raise forms.ValidationError(INCOMPLETE_ADDRESS_MESSAGE.format(kind='delivery'))
         return address
 
 class ContactForm(forms.Form):
@@ -0,0 +1,316 @@
+"""
+Bulk shipment import
+
+Uploads (CSV, JSON Lines, or a JSON array) are read row by row and handled in
+batches. Each batch is validated column-wise with pandas against the
+ShipmentForm rules, and its valid rows are inserted with:
+
+- one block of pre-allocated tracking numbers
+- one bulk_create each for shipments and tracking aliases
+- one lookup each for couriers and recipient accounts
+- the state machine's transition hooks (events, counters, rollups and
+  workloads), run once per batch
+
+Those are the side effects Shipment.save would produce one row at a time.
+Couriers get one summary email per batch once it commits. The result is a
+per-row report: the tracking number of every created row and the field
+errors of every rejected one.
+
+JSON arrays have to be parsed whole; use CSV or JSON Lines for very large files.
+"""
+import codecs
+import csv
+import json
+from decimal import Decimal
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from .addresses import apply_address_fields, normalize_address_text
+from .forms import (
+    INCOMPLETE_ADDRESS_MESSAGE, MAX_SHIPMENT_WEIGHT, MIN_ADDRESS_LENGTH, WEIGHT_TOO_HIGH_MESSAGE
+)
+
+IMPORT_BATCH_SIZE = 500
+
+IMPORT_MAX_ROWS = getattr(settings, 'SHIPMENT_IMPORT_MAX_ROWS', 50000)
+
+IMPORT_FIELDS = [
+    'recipient_name',
+    'recipient_phone',
+    'recipient_email',
+    'pickup_address',
+    'delivery_address',
+    'weight',
+    'notes',
+    'courier',
+]
+
+IMPORT_FORMATS = {
+    # file extension: format
+    'csv': 'csv',
+    'json': 'json',
+    'jsonl': 'jsonl',
+    'ndjson': 'jsonl',
+}
+
+# (field, max length) checked like the model's CharFields
+MAX_LENGTHS = [('recipient_name', 255), ('recipient_phone', 20), ('recipient_email', 254)]
+
+REQUIRED_MESSAGE = 'This field is required.'
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def detect_format(filename):
+    """
+    Import format of an uploaded file name, or None
+    """
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return IMPORT_FORMATS.get(extension)
+
+
+def iter_upload_rows(file, file_format):
+    """
+    Yield the rows of an uploaded file as dicts, reading it incrementally
+    (JSON arrays excepted)
+    Raises ImportFormatError for files that cannot be decoded or parsed
+    """
+    try:
+        yield from _iter_rows(file, file_format)
+    except UnicodeDecodeError as e:
+        raise ImportFormatError(
+            f'The file is not valid UTF-8 text (byte {e.start}). Save it as UTF-8 and upload it again.'
+        ) from e
+    except csv.Error as e:
+        raise ImportFormatError(f'Invalid CSV: {e}') from e
+
+
+def _iter_rows(file, file_format):
+    if file_format == 'csv':
+        yield from csv.DictReader(codecs.iterdecode(file, 'utf-8-sig'))
+    elif file_format == 'jsonl':
+        for line_number, line in enumerate(codecs.iterdecode(file, 'utf-8-sig'), start=1):
+            if line.strip():
+                yield _json_row(line, line_number)
+    elif file_format == 'json':
+        try:
+            rows = json.load(codecs.getreader('utf-8-sig')(file))
+        except UnicodeDecodeError:
+            raise
+        except ValueError as e:
+            raise ImportFormatError(f'Invalid JSON: {e}') from e
+        if not isinstance(rows, list):
+            raise ImportFormatError('A JSON upload must be a list of shipment objects.')
+        for row in rows:
+            yield row if isinstance(row, dict) else {}
+    else:
+        raise ImportFormatError(f'Unsupported import format: {file_format}')
+
+
+def _json_row(line, line_number):
+    try:
+        row = json.loads(line)
+    except ValueError as e:
+        raise ImportFormatError(f'Invalid JSON on line {line_number}: {e}') from e
+    return row if isinstance(row, dict) else {}
+
+
+def validate_batch(rows, first_row, couriers):
+    """
+    Validate a batch of raw rows column by column
+    couriers maps usernames to courier accounts
+    Returns (valid, errors): valid is a list of (row number, cleaned dict),
+    errors a list of {'row': n, 'errors': {field: [messages]}}
+    """
+    frame = pd.DataFrame.from_records(
+        [{field: row.get(field) for field in IMPORT_FIELDS} for row in rows],
+        columns=IMPORT_FIELDS
+    )
+    for field in IMPORT_FIELDS:
+        frame[field] = frame[field].fillna('').astype(str).str.strip()
+
+    problems = {}
+
+    def fail(field, mask, message):
+        mask = np.asarray(mask, dtype=bool)
+        if mask.any():
+            problems.setdefault(field, []).append((mask, message))
+
+    fail('recipient_name', frame['recipient_name'] == '', REQUIRED_MESSAGE)
+    for field, limit in MAX_LENGTHS:
+        lengths = frame[field].str.len()
+        for position in np.flatnonzero(lengths > limit):
+            mask = np.zeros(len(frame), dtype=bool)
+            mask[position] = True
+            fail(field, mask, f'Ensure this value has at most {limit} characters (it has {lengths.iat[position]}).')
+
+    emails = frame['recipient_email']
+    fail('recipient_email', emails.map(lambda email: bool(email) and not _is_valid_email(email)),
+         'Enter a valid email address.')
+
+    for kind in ('pickup', 'delivery'):
+        field = f'{kind}_address'
+        frame[field] = frame[field].map(normalize_address_text)
+        lengths = frame[field].str.len()
+        fail(field, lengths == 0, REQUIRED_MESSAGE)
+        fail(field, (lengths > 0) & (lengths < MIN_ADDRESS_LENGTH), INCOMPLETE_ADDRESS_MESSAGE.format(kind=kind))
+
+    raw_weight = frame['weight']
+    weight = pd.to_numeric(raw_weight, errors='coerce')
+    decimal_places = raw_weight.str.extract(r'\.(\d+)$', expand=False).str.len()
+    fail('weight', raw_weight == '', REQUIRED_MESSAGE)
+    fail('weight', (raw_weight != '') & weight.isna(), 'Enter a number.')
+    fail('weight', decimal_places > 2, 'Ensure that there are no more than 2 decimal places.')
+    fail('weight', weight < 0.01, 'Ensure this value is greater than or equal to 0.01.')
+    fail('weight', weight > MAX_SHIPMENT_WEIGHT, WEIGHT_TOO_HIGH_MESSAGE)
+
+    courier = frame['courier']
+    fail('courier', (courier != '') & ~courier.isin(list(couriers)),
+         'Select a valid choice. That choice is not one of the available choices.')
+
+    invalid = np.zeros(len(frame), dtype=bool)
+    for checks in problems.values():
+        for mask, _ in checks:
+            invalid |= mask
+
+    errors = []
+    for position in np.flatnonzero(invalid):
+        row_errors = {}
+        for field, checks in problems.items():
+            for mask, message in checks:
+                if mask[position]:
+                    row_errors.setdefault(field, []).append(message)
+        errors.append({'row': first_row + int(position), 'errors': row_errors})
+
+    positions = np.flatnonzero(~invalid)
+    valid = []
+    for position, row in zip(positions, frame.iloc[positions].to_dict('records')):
+        row['weight'] = Decimal(row['weight'])
+        row['courier'] = couriers.get(row['courier'])
+        valid.append((first_row + int(position), row))
+    return valid, errors
+
+
+def _is_valid_email(email):
+    try:
+        validate_email(email)
+    except ValidationError:
+        return False
+    return True
+
+
+def create_shipments(shipper, rows, actor=None):
+    """
+    Insert validated rows for a shipper, within the caller's transaction
+    Shipments with a courier are created accepted, as in CreateShipmentView
+    Returns the created shipments
+    """
+    from .assignment import notify_couriers
+    from .models import Shipment, TrackingAlias
+    from .recipients import find_recipient_users, normalize_email
+    from .search import build_search_text
+    from .state_machine import CREATED, role_for, run_transition_hooks, validate_transition
+    from .tracking_numbers import allocate_tracking_numbers
+
+    role = role_for(shipper)
+    numbers = allocate_tracking_numbers(len(rows))
+    recipients = find_recipient_users(row['recipient_email'] for row in rows)
+
+    shipments = []
+    for tracking_number, row in zip(numbers, rows):
+        courier = row['courier']
+        status = 'accepted' if courier else 'pending'
+        validate_transition(role, CREATED, status)
+        shipment = Shipment(
+            shipper=shipper,
+            courier=courier,
+            status=status,
+            tracking_number=tracking_number,
+            recipient_name=row['recipient_name'],
+            recipient_phone=row['recipient_phone'],
+            recipient_email=row['recipient_email'],
+            recipient_email_normalized=normalize_email(row['recipient_email']),
+            pickup_address=row['pickup_address'],
+            delivery_address=row['delivery_address'],
+            weight=row['weight'],
+            notes=row['notes'],
+        )
+        shipment.recipient_user_id = recipients.get(shipment.recipient_email_normalized)
+        apply_address_fields(shipment)
+        shipment.search_text = build_search_text(shipment)
+        shipments.append(shipment)
+
+    Shipment.objects.bulk_create(shipments)
+
+    TrackingAlias.objects.bulk_create([
+        TrackingAlias(shipment=shipment, tracking_number=shipment.tracking_number)
+        for shipment in shipments
+    ])
+    run_transition_hooks(
+        [(shipment, CREATED, None, shipment.status) for shipment in shipments], role=role, actor=actor
+    )
+
+    assigned = [shipment for shipment in shipments if shipment.courier_id]
+    if assigned:
+        transaction.on_commit(lambda: notify_couriers(assigned))
+
+    return shipments
+
+
+def import_shipments(file, file_format, shipper, actor=None, batch_size=IMPORT_BATCH_SIZE,
+                     max_rows=IMPORT_MAX_ROWS, progress=None):
+    """
+    Validate and create the shipments of an uploaded file for a shipper
+    Each batch of valid rows is committed on its own, so rows already created
+    stay created if a later batch fails validation
+    Returns {'created', 'failed', 'shipments': [{'row', 'tracking_number'}],
+    'errors': [{'row', 'errors'}]}; raises ImportFormatError for unreadable files
+    progress, if given, is called with the running report after each batch
+    """
+    from .models import UserProfile
+
+    couriers = {courier.username: courier for courier in UserProfile.objects.filter(role='courier')}
+    report = {'created': 0, 'failed': 0, 'shipments': [], 'errors': []}
+
+    rows = iter_upload_rows(file, file_format)
+    first_row = 1
+    while True:
+        remaining = max_rows - first_row + 1
+        if remaining <= 0:
+            if next(rows, None) is not None:
+                report['errors'].append({
+                    'row': first_row,
+                    'errors': {'__all__': [f'Imports are limited to {max_rows} rows; the rest of the file was skipped.']},
+                })
+            break
+
+        batch = list(islice(rows, min(batch_size, remaining)))
+        if not batch:
+            break
+
+        valid, errors = validate_batch(batch, first_row, couriers)
+        if valid:
+            with transaction.atomic():
+                shipments = create_shipments(shipper, [row for _, row in valid], actor=actor)
+            report['shipments'].extend(
+                {'row': row_number, 'tracking_number': shipment.tracking_number}
+                for (row_number, _), shipment in zip(valid, shipments)
+            )
+            report['created'] += len(shipments)
+        report['errors'].extend(errors)
+        report['failed'] += len(errors)
+        first_row += len(batch)
+
+        if progress:
+            progress(report)
+
+    report['errors'].sort(key=lambda error: error['row'])
+    return report
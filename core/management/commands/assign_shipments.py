@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from core.assignment import ASSIGNMENT_BATCH_SIZE, ASSIGNMENT_MAX_LOAD, assign_unassigned, get_workload_index
+
+
+class Command(BaseCommand):
+    help = 'Assign pending shipments without a courier to the least loaded couriers, preferring local ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=ASSIGNMENT_BATCH_SIZE,
+            help='Shipments assigned per transaction'
+        )
+        parser.add_argument(
+            '--max-load',
+            type=int,
+            default=ASSIGNMENT_MAX_LOAD,
+            help='Most active shipments a courier may be given'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Stop after assigning this many shipments'
+        )
+        parser.add_argument(
+            '--refresh-index',
+            action='store_true',
+            help='Rebuild the cached courier workload index from the database first'
+        )
+
+    def handle(self, *args, **options):
+        if options['refresh_index']:
+            index = get_workload_index(refresh=True)
+            self.stdout.write(f'Rebuilt workload index for {len(index)} couriers')
+
+        def progress(pairs):
+            self.stdout.write(f'Assigned {len(pairs)} shipments')
+
+        assigned = assign_unassigned(
+            batch_size=options['batch_size'],
+            max_load=options['max_load'],
+            limit=options['limit'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Assigned {assigned} shipments to couriers'))
@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.models import Shipment, ShipmentEvent
+from core.tracking import invalidate_tracking_cache
+
+
+class Command(BaseCommand):
+    help = 'Build the shipment event log for shipments that have no events yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of shipments processed per transaction'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = 0
+        shipment_count = 0
+        event_count = 0
+
+        while True:
+            shipments = list(
+                Shipment.objects.filter(pk__gt=last_pk, events__isnull=True)
+                .prefetch_related('status_notes')
+                .order_by('pk')[:batch_size]
+            )
+            if not shipments:
+                break
+
+            events = []
+            for shipment in shipments:
+                events.extend(self.build_events(shipment))
+
+            with transaction.atomic():
+                ShipmentEvent.objects.bulk_create(events, batch_size=batch_size)
+                invalidate_tracking_cache(*[shipment.tracking_number for shipment in shipments])
+
+            last_pk = shipments[-1].pk
+            shipment_count += len(shipments)
+            event_count += len(events)
+            self.stdout.write(f'Processed {shipment_count} shipments...')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Created {event_count} events for {shipment_count} shipments')
+        )
+
+    def build_events(self, shipment):
+        """
+        Reconstruct the timeline of a shipment from its creation time,
+        status notes, previous_status and current status
+        """
+        # (status, timestamp, actor_id) in chronological order
+        transitions = [('pending', shipment.created_at, None)]
+
+        notes = sorted(shipment.status_notes.all(), key=lambda note: note.created_at)
+        for note in notes:
+            transitions.append((note.status, note.created_at, note.created_by_id))
+
+        seen_statuses = {status for status, _, _ in transitions}
+        if shipment.previous_status and shipment.previous_status not in seen_statuses:
+            transitions.append((shipment.previous_status, shipment.updated_at, None))
+
+        if transitions[-1][0] != shipment.status:
+            transitions.append((shipment.status, shipment.updated_at, None))
+
+        events = []
+        previous = None
+        for status, timestamp, actor_id in transitions:
+            # Consecutive notes for the same status are one transition
+            if status == previous:
+                continue
+            previous = status
+            events.append(ShipmentEvent(
+                **ShipmentEvent.describe(shipment, status),
+                shipment=shipment,
+                status=status,
+                actor_id=actor_id,
+                created_at=timestamp,
+            ))
+
+        return events
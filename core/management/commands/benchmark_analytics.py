@@ -0,0 +1,124 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from core.analytics import PERCENTILES, TRANSITION_DTYPE, compute_delivery_analytics, load_transitions, status_codes
+
+# Mean seconds spent in each status of the synthetic delivery path
+SYNTHETIC_DWELL = {
+    'pending': 2 * 3600,
+    'accepted': 3600,
+    'picked_up': 4 * 3600,
+    'in_transit': 18 * 3600,
+    'hold': 36 * 3600,
+}
+
+
+class Command(BaseCommand):
+    help = 'Time the vectorized delivery analytics against a row-by-row baseline on synthetic events'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--events',
+            type=int,
+            default=1000000,
+            help='Synthetic status transitions to generate (five per shipment)'
+        )
+        parser.add_argument(
+            '--couriers',
+            type=int,
+            default=200,
+            help='Couriers the synthetic shipments are spread over'
+        )
+        parser.add_argument(
+            '--skip-baseline',
+            action='store_true',
+            help='Only time the vectorized computation'
+        )
+
+    def handle(self, *args, **options):
+        transitions = self.synthetic_transitions(options['events'], options['couriers'])
+        self.stdout.write(f'Generated {len(transitions)} synthetic events')
+
+        start = time.perf_counter()
+        analytics = compute_delivery_analytics(transitions)
+        vectorized = time.perf_counter() - start
+        self.stdout.write(f'  vectorized: {vectorized * 1000:.0f} ms')
+
+        for row in analytics['time_in_status']:
+            self.stdout.write(
+                f'    {row["status"]:>10}: p50 {row["p50"] / 3600:.1f}h, '
+                f'p90 {row["p90"] / 3600:.1f}h, p99 {row["p99"] / 3600:.1f}h'
+            )
+
+        if not options['skip_baseline']:
+            start = time.perf_counter()
+            baseline = self.row_by_row(transitions.tolist())
+            row_by_row = time.perf_counter() - start
+            self.stdout.write(f'  row by row (time in status only): {row_by_row * 1000:.0f} ms')
+
+            for row in analytics['time_in_status']:
+                if not np.allclose([row[f'p{p}'] for p in PERCENTILES], baseline[row['status']]):
+                    self.stdout.write(self.style.ERROR(f'Results differ for {row["status"]}'))
+            self.stdout.write(self.style.SUCCESS(f'Vectorized is {row_by_row / vectorized:.1f}x row by row'))
+
+        start = time.perf_counter()
+        stored = load_transitions()
+        self.stdout.write(
+            f'Loaded {len(stored)} stored events in {(time.perf_counter() - start) * 1000:.0f} ms'
+        )
+
+    def synthetic_transitions(self, events, couriers):
+        """
+        Shipments moving pending -> accepted -> picked_up -> in_transit (or hold)
+        -> delivered, with exponentially distributed stays
+        """
+        codes = status_codes()
+        rng = np.random.default_rng(0)
+        shipments = max(1, events // 5)
+
+        path = np.array(
+            [codes.index(status) for status in ('pending', 'accepted', 'picked_up', 'in_transit', 'delivered')],
+            dtype=np.int8
+        )
+        statuses = np.tile(path, (shipments, 1))
+        statuses[rng.random(shipments) < 0.1, 3] = codes.index('hold')
+
+        scales = np.zeros(len(codes))
+        for status, seconds in SYNTHETIC_DWELL.items():
+            scales[codes.index(status)] = seconds
+        stays = rng.exponential(scales[statuses[:, :-1]])
+        starts = rng.uniform(0, 30 * 86400, shipments)
+        timestamps = np.concatenate([starts[:, None], starts[:, None] + np.cumsum(stays, axis=1)], axis=1)
+
+        transitions = np.empty(shipments * 5, dtype=TRANSITION_DTYPE)
+        transitions['shipment'] = np.repeat(np.arange(1, shipments + 1), 5)
+        transitions['status'] = statuses.ravel()
+        transitions['at'] = timestamps.ravel()
+        transitions['courier'] = np.repeat(rng.integers(1, couriers + 1, shipments), 5)
+        return transitions
+
+    def row_by_row(self, rows):
+        """
+        Time-in-status percentiles computed with plain Python over row tuples,
+        as a loop over ORM rows would
+        """
+        codes = status_codes()
+        dwell = {}
+        previous = None
+        for shipment, status, at, courier in rows:
+            if previous is not None and previous[0] == shipment:
+                dwell.setdefault(codes[previous[1]], []).append(at - previous[2])
+            previous = (shipment, status, at)
+
+        results = {}
+        for status, values in dwell.items():
+            values.sort()
+            points = []
+            for percentile in PERCENTILES:
+                position = (len(values) - 1) * percentile / 100
+                lower = int(position)
+                upper = min(lower + 1, len(values) - 1)
+                points.append(values[lower] + (values[upper] - values[lower]) * (position - lower))
+            results[status] = points
+        return results
@@ -0,0 +1,133 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from core.models import Shipment, UserProfile
+from core.search import normalize_search_text, search_shipments
+
+FIRST_NAMES = ['Ada', 'Chidi', 'Kwame', 'Amara', 'Tunde', 'Zainab', 'Kofi', 'Ngozi', 'Emeka', 'Fatima']
+LAST_NAMES = ['Okafor', 'Mensah', 'Adeyemi', 'Boateng', 'Balogun', 'Nwosu', 'Owusu', 'Eze', 'Bello', 'Asante']
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare indexed shipment search against the icontains scan it replaces'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=0,
+            help='Synthetic shipments to add for the run (rolled back afterwards)'
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=50,
+            help='Number of search terms sampled from existing shipments'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Timed runs per search term and strategy'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=50,
+            help='Results fetched per search, as on the admin shipment list'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if options['rows']:
+                    self.create_synthetic_shipments(options['rows'])
+                self.run_benchmark(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def create_synthetic_shipments(self, count):
+        shipper = UserProfile.objects.filter(role='shipper').first() or UserProfile.objects.first()
+        if shipper is None:
+            shipper = UserProfile.objects.create(username='benchmark_shipper', role='shipper')
+
+        start = time.perf_counter()
+        batch = []
+        for index in range(count):
+            name = f'{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)}'
+            tracking_number = f'BM{index:010d}'
+            batch.append(Shipment(
+                shipper=shipper,
+                recipient_name=name,
+                pickup_address='Benchmark',
+                delivery_address='Benchmark',
+                weight=1,
+                tracking_number=tracking_number,
+                search_text=normalize_search_text(f'{tracking_number} {name} {shipper.username}'),
+            ))
+            if len(batch) >= 2000:
+                Shipment.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Shipment.objects.bulk_create(batch)
+
+        self.stdout.write(f'Created {count} synthetic shipments in {time.perf_counter() - start:.1f}s')
+
+    def sample_terms(self, count):
+        rows = list(
+            Shipment.objects.order_by('?').values_list('tracking_number', 'recipient_name', 'shipper__username')[:count]
+        )
+        terms = []
+        for tracking_number, recipient_name, username in rows:
+            source = random.choice([tracking_number, recipient_name, username]) or tracking_number
+            length = min(len(source), random.randint(4, 8))
+            offset = random.randint(0, len(source) - length)
+            terms.append(source[offset:offset + length])
+        return terms
+
+    def run_benchmark(self, options):
+        terms = self.sample_terms(options['queries'])
+        if not terms:
+            self.stdout.write(self.style.WARNING('No shipments to search'))
+            return
+
+        base = Shipment.objects.select_related('shipper', 'courier')
+        strategies = {
+            'icontains': lambda term: base.filter(
+                Q(tracking_number__icontains=term) |
+                Q(recipient_name__icontains=term) |
+                Q(shipper__username__icontains=term)
+            ).order_by('-created_at'),
+            'search index': lambda term: search_shipments(base, term),
+        }
+
+        results = {}
+        for name, build in strategies.items():
+            timings = []
+            for term in terms:
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    list(build(term)[:options['limit']])
+                    timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            results[name] = timings
+            self.stdout.write(
+                f'{name:>14}: mean {statistics.mean(timings):.2f} ms, '
+                f'p50 {timings[len(timings) // 2]:.2f} ms, '
+                f'p95 {timings[int(len(timings) * 0.95) - 1]:.2f} ms'
+            )
+
+        speedup = statistics.mean(results['icontains']) / statistics.mean(results['search index'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(terms)} terms x {options["repeat"]} runs over {Shipment.objects.count()} shipments: '
+            f'search index is {speedup:.1f}x the icontains scan'
+        ))
@@ -0,0 +1,71 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from core.models import Shipment
+from core.state_machine import NEXT_STATUSES, RULES, can_transition, compile_rules, next_statuses
+
+
+class Command(BaseCommand):
+    help = 'Time per-call transition validation with the compiled state machine tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--calls',
+            type=int,
+            default=1000000,
+            help='Validations to time per method'
+        )
+
+    def handle(self, *args, **options):
+        calls = options['calls']
+        statuses = [code for code, _ in Shipment.STATUS_CHOICES]
+        roles = sorted({role for role, _ in NEXT_STATUSES})
+        rng = random.Random(0)
+        samples = [(rng.choice(roles), rng.choice(statuses), rng.choice(statuses)) for _ in range(calls)]
+
+        start = time.perf_counter()
+        compile_rules(RULES, tuple(statuses))
+        self.stdout.write(f'Compiling {len(RULES)} rules: {(time.perf_counter() - start) * 1e6:.0f} us (once, at import)')
+
+        results = {}
+        for name, check in (
+            ('state machine table', can_transition),
+            ('state machine listing', lambda role, old, new: old == new or new in next_statuses(role, old)),
+            ('inline rules (previous)', self.inline_rules),
+        ):
+            start = time.perf_counter()
+            results[name] = [check(role, old, new) for role, old, new in samples]
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f'  {name}: {elapsed / calls * 1e9:.0f} ns per call')
+
+        if len({tuple(allowed) for allowed in results.values()}) != 1:
+            self.stdout.write(self.style.ERROR('Methods disagree on some transitions'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'All methods agree on {calls} transitions'))
+
+    def inline_rules(self, role, old_status, new_status):
+        """
+        The per-call logic Shipment.get_next_statuses used before the state
+        machine: a dict literal or list comprehension rebuilt on every call
+        """
+        if old_status == new_status:
+            return True
+        if role == 'admin':
+            allowed = [status for status, _ in Shipment.STATUS_CHOICES if status != old_status]
+        elif role == 'courier':
+            status_flow = {
+                'pending': ['accepted'],
+                'accepted': ['picked_up', 'hold'],
+                'picked_up': ['in_transit', 'hold', 'returned'],
+                'in_transit': ['hold', 'delivered', 'returned'],
+                'hold': ['picked_up', 'in_transit', 'delivered', 'returned'],
+                'delivered': [],
+                'returned': ['pending'],
+            }
+            allowed = status_flow.get(old_status, [])
+        elif role == 'system':
+            allowed = ['accepted'] if old_status == 'pending' else []
+        else:
+            allowed = []
+        return new_status in allowed
@@ -0,0 +1,77 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from core.exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, UnsupportedExportFormat, export_queryset, stream_export
+from core.models import Shipment
+
+
+class Command(BaseCommand):
+    help = 'Stream shipments with their status history to a CSV or Parquet file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=sorted(EXPORT_FORMATS),
+            default='csv',
+            help='Output format'
+        )
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='File to write; "-" writes CSV to stdout'
+        )
+        parser.add_argument(
+            '--start',
+            type=date.fromisoformat,
+            help='First creation date to export (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--end',
+            type=date.fromisoformat,
+            help='Last creation date to export (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--status',
+            choices=[code for code, _ in Shipment.STATUS_CHOICES],
+            help='Only export shipments with this status'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=EXPORT_CHUNK_SIZE,
+            help='Shipments read and encoded per chunk'
+        )
+
+    def handle(self, *args, **options):
+        export_format = options['format']
+        output = options['output']
+        if output == '-' and export_format != 'csv':
+            raise CommandError('Binary formats need an --output file')
+
+        exported = 0
+
+        def progress(count):
+            nonlocal exported
+            exported += count
+
+        queryset = export_queryset(start=options['start'], end=options['end'], status=options['status'])
+        try:
+            stream = stream_export(queryset, export_format, options['chunk_size'], progress)
+        except UnsupportedExportFormat as e:
+            raise CommandError(str(e))
+
+        if output == '-':
+            for data in stream:
+                self.stdout.write(data, ending='')
+            # Keep the summary out of the exported data
+            self.stderr.write(self.style.SUCCESS(f'Exported {exported} shipments'))
+            return
+
+        if export_format == 'csv':
+            with open(output, 'w', newline='', encoding='utf-8') as f:
+                f.writelines(stream)
+        else:
+            with open(output, 'wb') as f:
+                f.writelines(stream)
+
+        self.stdout.write(self.style.SUCCESS(f'Exported {exported} shipments to {output}'))
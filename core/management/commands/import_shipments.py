@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.imports import IMPORT_BATCH_SIZE, IMPORT_FORMATS, ImportFormatError, detect_format, import_shipments
+from core.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Create shipments for a shipper from a CSV, JSON Lines or JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument(
+            '--shipper',
+            required=True,
+            help='Username of the shipper the shipments are created for'
+        )
+        parser.add_argument(
+            '--format',
+            choices=sorted(set(IMPORT_FORMATS.values())),
+            help='Input format (default: from the file extension)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help='Rows validated and inserted per transaction'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            shipper = UserProfile.objects.get(username=options['shipper'])
+        except UserProfile.DoesNotExist:
+            raise CommandError(f'No user named {options["shipper"]}')
+
+        file_format = options['format'] or detect_format(options['path'])
+        if file_format is None:
+            raise CommandError('Cannot tell the format from the file name; pass --format')
+
+        def progress(report):
+            self.stdout.write(f'  {report["created"]} created, {report["failed"]} rejected')
+
+        try:
+            with open(options['path'], 'rb') as f:
+                report = import_shipments(
+                    f, file_format, shipper, actor=shipper, batch_size=options['batch_size'], progress=progress
+                )
+        except (OSError, ImportFormatError) as e:
+            raise CommandError(str(e))
+
+        for error in report['errors']:
+            details = '; '.join(
+                f'{field}: {" ".join(messages)}' for field, messages in error['errors'].items()
+            )
+            self.stdout.write(self.style.WARNING(f'Row {error["row"]}: {details}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {report["created"]} shipments, rejected {report["failed"]} rows'
+        ))
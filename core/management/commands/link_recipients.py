@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from core.models import UserProfile
+from core.recipients import LINK_BATCH_SIZE, link_recipient_shipments
+
+
+class Command(BaseCommand):
+    help = 'Link unlinked shipments to the recipient accounts registered with their emails'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=LINK_BATCH_SIZE,
+            help='Number of shipments linked per query'
+        )
+
+    def handle(self, *args, **options):
+        recipients = UserProfile.objects.filter(role='recipient').exclude(email='').order_by('pk')
+
+        linked = 0
+        for user in recipients.iterator(chunk_size=500):
+            count = link_recipient_shipments(user, batch_size=options['batch_size'])
+            if count:
+                self.stdout.write(f'{user.username}: linked {count} shipments')
+            linked += count
+
+        self.stdout.write(self.style.SUCCESS(f'Linked {linked} shipments to recipient accounts'))
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from core.addresses import apply_address_fields
+from core.models import Shipment
+from core.tracking import invalidate_tracking_cache
+
+ADDRESS_FIELDS = [
+    'pickup_city', 'pickup_region', 'pickup_postcode', 'pickup_country',
+    'delivery_city', 'delivery_region', 'delivery_postcode', 'delivery_country',
+]
+
+
+class Command(BaseCommand):
+    help = 'Parse shipment addresses into the normalized city/region/postcode/country columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of shipments updated per query'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Re-parse every shipment, not only those without a parsed city'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = Shipment.objects.only(
+            'pk', 'tracking_number', 'pickup_address', 'delivery_address', *ADDRESS_FIELDS
+        ).order_by('pk')
+        if not options['all']:
+            queryset = queryset.filter(pickup_city='', delivery_city='')
+
+        last_pk = 0
+        updated = 0
+
+        while True:
+            shipments = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            if not shipments:
+                break
+
+            for shipment in shipments:
+                apply_address_fields(shipment)
+
+            Shipment.objects.bulk_update(shipments, ADDRESS_FIELDS)
+            invalidate_tracking_cache(*[shipment.tracking_number for shipment in shipments])
+
+            last_pk = shipments[-1].pk
+            updated += len(shipments)
+            self.stdout.write(f'Normalized {updated} shipments...')
+
+        self.stdout.write(self.style.SUCCESS(f'Normalized addresses for {updated} shipments'))
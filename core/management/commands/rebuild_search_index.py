@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from core.models import Shipment
+from core.search import build_search_text, ensure_search_index
+
+
+class Command(BaseCommand):
+    help = 'Recompute shipment search text and rebuild the database search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of shipments updated per query'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = Shipment.objects.select_related('shipper').only(
+            'pk', 'tracking_number', 'recipient_name', 'search_text', 'shipper__username'
+        ).order_by('pk')
+
+        last_pk = 0
+        checked = 0
+        updated = 0
+
+        while True:
+            shipments = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            if not shipments:
+                break
+
+            stale = []
+            for shipment in shipments:
+                text = build_search_text(shipment)
+                if shipment.search_text != text:
+                    shipment.search_text = text
+                    stale.append(shipment)
+
+            if stale:
+                Shipment.objects.bulk_update(stale, ['search_text'])
+
+            last_pk = shipments[-1].pk
+            checked += len(shipments)
+            updated += len(stale)
+            self.stdout.write(f'Checked {checked} shipments...')
+
+        if ensure_search_index(connection, rebuild=True):
+            self.stdout.write(f'Rebuilt the {connection.vendor} search index')
+        else:
+            self.stdout.write(
+                self.style.WARNING(f'No search index for {connection.vendor}; searches use a substring scan')
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Updated search text for {updated} of {checked} shipments')
+        )
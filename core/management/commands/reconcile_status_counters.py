@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from core.models import ShipmentStatusCounter
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the shipment status counters from the shipment table'
+
+    def handle(self, *args, **options):
+        results = ShipmentStatusCounter.rebuild()
+
+        drifted = 0
+        for status, (previous, actual) in results.items():
+            if previous != actual:
+                drifted += 1
+                self.stdout.write(
+                    self.style.WARNING(f'{status}: {previous} -> {actual}')
+                )
+            else:
+                self.stdout.write(f'{status}: {actual}')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Reconciled {len(results)} status counters ({drifted} corrected)')
+        )
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from core.rollups import ROLLUP_CHUNK_DAYS, backfill, refresh_recent
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the hourly and daily shipment rollups (recent buckets, or all history with --backfill)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backfill',
+            action='store_true',
+            help='Rebuild every bucket from the first shipment onwards'
+        )
+        parser.add_argument(
+            '--chunk-days',
+            type=int,
+            default=ROLLUP_CHUNK_DAYS,
+            help='Days of history rebuilt per transaction during a backfill'
+        )
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=48,
+            help='Hours of recent buckets to rebuild when not backfilling'
+        )
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            def progress(chunk_start, chunk_end, counted):
+                self.stdout.write(f'{chunk_start:%Y-%m-%d} - {chunk_end:%Y-%m-%d}: {counted} shipments')
+
+            total = backfill(chunk_days=options['chunk_days'], progress=progress)
+            self.stdout.write(self.style.SUCCESS(f'Backfilled rollups for {total} shipments'))
+        else:
+            total = refresh_recent(hours=options['hours'])
+            self.stdout.write(
+                self.style.SUCCESS(f'Refreshed rollups for the last {options["hours"]} hours ({total} shipments)')
+            )
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-17 03:24
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_remove_userprofile_email_verification_token_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShipmentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('accepted', 'Accepted'), ('picked_up', 'Picked Up'), ('in_transit', 'In Transit'), ('hold', 'Hold'), ('delivered', 'Delivered'), ('returned', 'Returned')], help_text='Status the shipment moved to', max_length=20)),
+                ('location', models.CharField(blank=True, help_text='Where the transition happened', max_length=255)),
+                ('city', models.CharField(blank=True, help_text='City of the event location', max_length=255)),
+                ('description', models.CharField(blank=True, help_text='Human readable description of the event', max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, help_text='When the transition happened')),
+                ('actor', models.ForeignKey(blank=True, help_text='User who made the transition (empty for system events)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='shipment_events', to=settings.AUTH_USER_MODEL)),
+                ('shipment', models.ForeignKey(help_text='Shipment this event belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='events', to='core.shipment')),
+            ],
+            options={
+                'verbose_name': 'Shipment Event',
+                'verbose_name_plural': 'Shipment Events',
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['shipment', 'created_at'], name='core_event_shipment_time_idx')],
+            },
+        ),
+    ]
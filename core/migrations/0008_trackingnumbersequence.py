@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-17 03:26
+
+from django.db import migrations, models
+
+
+def create_tracking_number_sequence(apps, schema_editor):
+    TrackingNumberSequence = apps.get_model('core', 'TrackingNumberSequence')
+    TrackingNumberSequence.objects.get_or_create(name='tracking_number', defaults={'next_value': 1})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_shipmentevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackingNumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('next_value', models.BigIntegerField(default=1)),
+            ],
+            options={
+                'verbose_name': 'Tracking Number Sequence',
+                'verbose_name_plural': 'Tracking Number Sequences',
+            },
+        ),
+        migrations.RunPython(create_tracking_number_sequence, migrations.RunPython.noop),
+    ]
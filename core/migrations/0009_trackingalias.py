@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-17 03:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_current_aliases(apps, schema_editor):
+    Shipment = apps.get_model('core', 'Shipment')
+    TrackingAlias = apps.get_model('core', 'TrackingAlias')
+
+    aliases = [
+        TrackingAlias(shipment_id=pk, tracking_number=tracking_number)
+        for pk, tracking_number in Shipment.objects.values_list('pk', 'tracking_number').iterator(chunk_size=2000)
+    ]
+    TrackingAlias.objects.bulk_create(aliases, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_trackingnumbersequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackingAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tracking_number', models.CharField(help_text='Current or previous tracking number of the shipment', max_length=20, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('shipment', models.ForeignKey(help_text='Shipment this tracking number belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='core.shipment')),
+            ],
+            options={
+                'verbose_name': 'Tracking Alias',
+                'verbose_name_plural': 'Tracking Aliases',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.RunPython(create_current_aliases, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2 on 2026-10-17 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_trackingalias'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shipment',
+            name='delivery_city',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='City parsed from the delivery address', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='delivery_country',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Country parsed from the delivery address', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='delivery_postcode',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Postcode parsed from the delivery address', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='delivery_region',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Region parsed from the delivery address', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='pickup_city',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='City parsed from the pickup address', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='pickup_country',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Country parsed from the pickup address', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='pickup_postcode',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Postcode parsed from the pickup address', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='pickup_region',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Region parsed from the pickup address', max_length=100),
+        ),
+    ]
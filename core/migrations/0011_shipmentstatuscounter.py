@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-17 03:32
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def seed_status_counters(apps, schema_editor):
+    Shipment = apps.get_model('core', 'Shipment')
+    ShipmentStatusCounter = apps.get_model('core', 'ShipmentStatusCounter')
+
+    counts = dict(
+        Shipment.objects.order_by().values('status').annotate(total=Count('pk')).values_list('status', 'total')
+    )
+    statuses = [status for status, _ in Shipment._meta.get_field('status').choices]
+    ShipmentStatusCounter.objects.bulk_create([
+        ShipmentStatusCounter(status=status, count=counts.get(status, 0))
+        for status in dict.fromkeys(statuses + list(counts))
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_shipment_normalized_addresses'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShipmentStatusCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('accepted', 'Accepted'), ('picked_up', 'Picked Up'), ('in_transit', 'In Transit'), ('hold', 'Hold'), ('delivered', 'Delivered'), ('returned', 'Returned')], max_length=20, unique=True)),
+                ('count', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Shipment Status Counter',
+                'verbose_name_plural': 'Shipment Status Counters',
+                'ordering': ['status'],
+            },
+        ),
+        migrations.RunPython(seed_status_counters, migrations.RunPython.noop),
+    ]
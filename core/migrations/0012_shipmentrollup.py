@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-17 03:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_shipmentstatuscounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShipmentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('bucket_start', models.DateTimeField(help_text='Start of the hour or day (UTC)')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('accepted', 'Accepted'), ('picked_up', 'Picked Up'), ('in_transit', 'In Transit'), ('hold', 'Hold'), ('delivered', 'Delivered'), ('returned', 'Returned')], max_length=20)),
+                ('shipment_count', models.BigIntegerField(default=0)),
+                ('courier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='shipment_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Shipment Rollup',
+                'verbose_name_plural': 'Shipment Rollups',
+                'ordering': ['granularity', 'bucket_start'],
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'bucket_start', 'status', 'courier'), name='core_rollup_bucket_uniq'), models.UniqueConstraint(condition=models.Q(('courier__isnull', True)), fields=('granularity', 'bucket_start', 'status'), name='core_rollup_bucket_unassigned_uniq')],
+            },
+        ),
+    ]
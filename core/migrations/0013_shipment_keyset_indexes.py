@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-17 03:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_shipmentrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['created_at', 'id'], name='core_ship_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='core_ship_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['courier', 'created_at', 'id'], name='core_ship_courier_created_idx'),
+        ),
+    ]
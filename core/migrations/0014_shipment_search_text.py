@@ -0,0 +1,113 @@
+# Generated by Django 5.2 on 2026-10-17 03:37
+
+import re
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+WHITESPACE = re.compile(r'\s+')
+
+FTS_TABLE = 'core_shipment_fts'
+
+# SQLite search index as of this migration (core.search keeps the triggers current)
+SQLITE_FTS_STATEMENTS = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        search_text, content='core_shipment', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON core_shipment BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON core_shipment BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_text ON core_shipment BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+        INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text);
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+def populate_search_text(apps, schema_editor):
+    Shipment = apps.get_model('core', 'Shipment')
+
+    batch = []
+    rows = Shipment.objects.values_list('pk', 'tracking_number', 'recipient_name', 'shipper__username')
+    for pk, tracking_number, recipient_name, username in rows.iterator(chunk_size=2000):
+        text = ' '.join([tracking_number or '', recipient_name or '', username or ''])
+        batch.append(Shipment(pk=pk, search_text=WHITESPACE.sub(' ', text.lower()).strip()))
+        if len(batch) >= 1000:
+            Shipment.objects.bulk_update(batch, ['search_text'])
+            batch = []
+    if batch:
+        Shipment.objects.bulk_update(batch, ['search_text'])
+
+
+def create_sqlite_search_index(apps, schema_editor):
+    import sqlite3
+
+    # The FTS5 trigram tokenizer needs SQLite 3.34+; older versions search unindexed
+    if schema_editor.connection.vendor != 'sqlite' or sqlite3.sqlite_version_info < (3, 34, 0):
+        return
+    for statement in SQLITE_FTS_STATEMENTS:
+        schema_editor.execute(statement)
+
+
+def remove_sqlite_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for suffix in ('ai', 'ad', 'au'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class AddPostgresIndex(migrations.AddIndex):
+    """
+    AddIndex for a PostgreSQL-only index, skipped on other backends
+    The index is kept out of the model state: SQLite rebuilds tables from the
+    state's indexes and cannot create a GIN index
+    """
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            model = to_state.apps.get_model(app_label, self.model_name)
+            schema_editor.add_index(model, self.index)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            model = from_state.apps.get_model(app_label, self.model_name)
+            schema_editor.remove_index(model, self.index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_shipment_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shipment',
+            name='search_text',
+            field=models.TextField(blank=True, editable=False, help_text='Tracking number, recipient name and shipper username, indexed for search (see core.search)'),
+        ),
+        migrations.RunPython(populate_search_text, migrations.RunPython.noop),
+        TrigramExtension(),
+        AddPostgresIndex(
+            model_name='shipment',
+            index=GinIndex(OpClass('search_text', name='gin_trgm_ops'), name='core_ship_search_trgm_idx'),
+        ),
+        migrations.RunPython(create_sqlite_search_index, remove_sqlite_search_index),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2 on 2026-10-17 03:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def link_existing_recipients(apps, schema_editor):
+    Shipment = apps.get_model('core', 'Shipment')
+    UserProfile = apps.get_model('core', 'UserProfile')
+
+    batch = []
+    rows = Shipment.objects.exclude(recipient_email='').values_list('pk', 'recipient_email')
+    for pk, email in rows.iterator(chunk_size=2000):
+        batch.append(Shipment(pk=pk, recipient_email_normalized=email.strip().lower()))
+        if len(batch) >= 1000:
+            Shipment.objects.bulk_update(batch, ['recipient_email_normalized'])
+            batch = []
+    if batch:
+        Shipment.objects.bulk_update(batch, ['recipient_email_normalized'])
+
+    recipients = UserProfile.objects.filter(role='recipient').exclude(email='').order_by('pk')
+    for pk, email in recipients.values_list('pk', 'email').iterator(chunk_size=2000):
+        Shipment.objects.filter(
+            recipient_email_normalized=email.strip().lower(),
+            recipient_user__isnull=True
+        ).update(recipient_user_id=pk)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_shipment_search_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shipment',
+            name='recipient_email_normalized',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Lowercased recipient email, used to link recipient accounts', max_length=254),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='recipient_user',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Registered recipient account this shipment is addressed to', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='shipments_received', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['recipient_user', 'created_at', 'id'], name='core_ship_recip_created_idx'),
+        ),
+        migrations.RunPython(link_existing_recipients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-17 03:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_shipment_recipient_linkage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['courier', 'status'], name='core_ship_courier_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(condition=models.Q(('courier__isnull', True), ('status', 'pending')), fields=['created_at'], name='core_ship_unassigned_idx'),
+        ),
+    ]
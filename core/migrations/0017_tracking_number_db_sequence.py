@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# Upper bound of the allocator's 40-bit sequence space
+MAX_SEQUENCE = 1 << 40
+
+
+def create_tracking_number_db_sequence(apps, schema_editor):
+    """
+    On PostgreSQL, continue the tracking number counter in a real sequence,
+    whose values survive rolled back transactions
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    TrackingNumberSequence = apps.get_model('core', 'TrackingNumberSequence')
+    start = (
+        TrackingNumberSequence.objects.filter(name='tracking_number')
+        .values_list('next_value', flat=True).first()
+    ) or 1
+    schema_editor.execute(
+        'CREATE SEQUENCE IF NOT EXISTS core_tracking_number_seq '
+        'MINVALUE 1 MAXVALUE %s START WITH %s' % (MAX_SEQUENCE - 1, start)
+    )
+
+
+def drop_tracking_number_db_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP SEQUENCE IF EXISTS core_tracking_number_seq')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_shipment_core_ship_courier_status_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_tracking_number_db_sequence, drop_tracking_number_db_sequence),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2 on 2026-10-17 04:26
+
+from datetime import timezone as dt_timezone
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncHour
+
+
+def seed_shipment_rollups(apps, schema_editor):
+    """
+    Count existing shipments into the rollups, replacing whatever live writes
+    have accumulated since the table was created empty
+    """
+    Shipment = apps.get_model('core', 'Shipment')
+    ShipmentRollup = apps.get_model('core', 'ShipmentRollup')
+
+    ShipmentRollup.objects.all().delete()
+    rows = []
+    for granularity, trunc in (('hour', TruncHour), ('day', TruncDay)):
+        grouped = Shipment.objects.order_by().annotate(
+            bucket=trunc('created_at', tzinfo=dt_timezone.utc)
+        ).values('bucket', 'status', 'courier_id').annotate(total=Count('pk'))
+        rows.extend(
+            ShipmentRollup(
+                granularity=granularity,
+                bucket_start=group['bucket'],
+                status=group['status'],
+                courier_id=group['courier_id'],
+                shipment_count=group['total'],
+            )
+            for group in grouped
+        )
+    ShipmentRollup.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_tracking_number_db_sequence'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shipmentrollup',
+            name='courier',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='shipment_rollups', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(seed_shipment_rollups, migrations.RunPython.noop),
+    ]
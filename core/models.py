@@ -1,8 +1,11 @@
-from django.db import models
+from datetime import timezone as dt_timezone
+
+from django.db import connections, models, transaction
+from django.db.models import Q, Subquery
+from django.db.models.functions import Lower
+from django.db.models.sql import UpdateQuery
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
-import hashlib
-import uuid
 
 # Create your models here.
 
@@ -32,6 +35,70 @@ class UserProfile(AbstractUser):
     class Meta:
         verbose_name = 'User Profile'
         verbose_name_plural = 'User Profiles'
+        indexes = [
+            # Serves the case-insensitive recipient lookups in core.recipients
+            models.Index(Lower('email'), name='core_user_email_lower_idx'),
+        ]
+
+
+class ShipmentQuerySet(models.QuerySet):
+    def for_tracking_number(self, tracking_number):
+        """
+        Shipments whose current or any previous tracking number matches
+        Resolved in one query: the unique tracking_number index OR-ed with a
+        scalar subquery on the unique alias index
+        """
+        tracking_number = tracking_number.upper()
+        alias = TrackingAlias.objects.filter(
+            tracking_number=tracking_number
+        ).order_by().values('shipment_id')[:1]
+        return self.filter(Q(tracking_number=tracking_number) | Q(pk=Subquery(alias)))
+
+    def update_returning(self, **values):
+        """
+        UPDATE the matching rows and return them as loaded after the write
+        A filter on the expected current values acts as a compare-and-set:
+        only callers whose condition still held get rows back
+
+        Django has no public UPDATE ... RETURNING, so on PostgreSQL and SQLite
+        the statement is compiled with the ORM's UpdateQuery compiler and the
+        RETURNING clause appended. That compiler is internal API (checked
+        against Django 5.2); update_returning_locked() is the portable
+        equivalent, used on every other backend and covered by the same tests.
+        SQLite gained RETURNING for UPDATE and INSERT in the same release
+        (3.35), so the INSERT feature flag tells whether it is available
+        """
+        connection = connections[self.db]
+        if connection.vendor not in ('postgresql', 'sqlite') or not connection.features.can_return_columns_from_insert:
+            return self.update_returning_locked(**values)
+
+        query = self.query.chain(UpdateQuery)
+        query.add_update_values(values)
+        compiler = query.get_compiler(self.db)
+        sql, params = compiler.as_sql()
+
+        fields = self.model._meta.concrete_fields
+        sql += ' RETURNING ' + ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        converters = compiler.get_converters([field.get_col(self.model._meta.db_table) for field in fields])
+        if converters:
+            rows = compiler.apply_converters(rows, converters)
+        attnames = [field.attname for field in fields]
+        return [self.model.from_db(self.db, attnames, row) for row in rows]
+
+    def update_returning_locked(self, **values):
+        """
+        update_returning() with public ORM calls only: lock the matching rows,
+        update them with the same conditions, and re-read them
+        Costs three queries and holds row locks until the transaction ends
+        """
+        with transaction.atomic(using=self.db):
+            pks = list(self.select_for_update().values_list('pk', flat=True))
+            self.filter(pk__in=pks).update(**values)
+            return list(self.model._base_manager.using(self.db).filter(pk__in=pks))
 
 
 class Shipment(models.Model):
@@ -57,10 +124,84 @@ class Shipment(models.Model):
     recipient_name = models.CharField(max_length=255)
     recipient_phone = models.CharField(max_length=20, blank=True)
     recipient_email = models.EmailField(blank=True)
+    recipient_email_normalized = models.CharField(
+        max_length=254,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text='Lowercased recipient email, used to link recipient accounts'
+    )
+    recipient_user = models.ForeignKey(
+        'UserProfile',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='shipments_received',
+        help_text='Registered recipient account this shipment is addressed to'
+    )
 
     pickup_address = models.TextField(help_text='Address to pick up the package')
     delivery_address = models.TextField(help_text='Address to deliver the package')
 
+    # Normalized address components, parsed once on save (see core.addresses)
+    pickup_city = models.CharField(
+        max_length=100,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text='City parsed from the pickup address'
+    )
+    pickup_region = models.CharField(
+        max_length=100,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text='Region parsed from the pickup address'
+    )
+    pickup_postcode = models.CharField(
+        max_length=20,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text='Postcode parsed from the pickup address'
+    )
+    pickup_country = models.CharField(
+        max_length=100,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text='Country parsed from the pickup address'
+    )
+    delivery_city = models.CharField(
+        max_length=100,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text='City parsed from the delivery address'
+    )
+    delivery_region = models.CharField(
+        max_length=100,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text='Region parsed from the delivery address'
+    )
+    delivery_postcode = models.CharField(
+        max_length=20,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text='Postcode parsed from the delivery address'
+    )
+    delivery_country = models.CharField(
+        max_length=100,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text='Country parsed from the delivery address'
+    )
+
     weight = models.DecimalField(
         max_digits=10,
         decimal_places=2,
@@ -73,6 +214,11 @@ class Shipment(models.Model):
         editable=False,
         help_text='Unique tracking number for this shipment'
     )
+    search_text = models.TextField(
+        blank=True,
+        editable=False,
+        help_text='Tracking number, recipient name and shipper username, indexed for search (see core.search)'
+    )
 
     status = models.CharField(
         max_length=20,
@@ -108,52 +254,202 @@ class Shipment(models.Model):
         help_text='Previous status before current status'
     )
 
+    objects = ShipmentQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Shipment'
         verbose_name_plural = 'Shipments'
+        indexes = [
+            # Keyset pagination on (created_at, id), optionally scoped (see core.pagination)
+            models.Index(fields=['created_at', 'id'], name='core_ship_created_id_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='core_ship_status_created_idx'),
+            models.Index(fields=['courier', 'created_at', 'id'], name='core_ship_courier_created_idx'),
+            models.Index(fields=['recipient_user', 'created_at', 'id'], name='core_ship_recip_created_idx'),
+            # Courier workloads and dashboards filter on courier and status together
+            models.Index(fields=['courier', 'status'], name='core_ship_courier_status_idx'),
+            # Unassigned pending shipments, oldest first, for assignment
+            models.Index(
+                fields=['created_at'],
+                name='core_ship_unassigned_idx',
+                condition=Q(status='pending', courier__isnull=True)
+            ),
+        ]
 
     def __str__(self):
         return f"{self.tracking_number} - {self.get_status_display()}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Snapshot loaded column values so changes can be detected without a re-fetch
+        instance._loaded_values = instance._snapshot()
+        return instance
+
+    def _snapshot(self):
+        """
+        Current values of all loaded (non-deferred) columns, keyed by attname
+        """
+        return {
+            field.attname: self.__dict__[field.attname]
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        # Reloaded (e.g. previously deferred) columns are part of the snapshot
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or fields is None:
+            self._loaded_values = self._snapshot()
+        else:
+            for field_name in fields:
+                attname = self._meta.get_field(field_name).attname
+                loaded[attname] = self.__dict__.get(attname)
+
+    @property
+    def changed_fields(self):
+        """
+        Names of fields modified since the shipment was loaded or last saved
+        Unsaved shipments report every field as changed
+        """
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return [field.name for field in self._meta.concrete_fields]
+
+        changed = []
+        for field in self._meta.concrete_fields:
+            # Deferred fields that were never accessed cannot have changed
+            if field.attname not in self.__dict__:
+                continue
+            if field.attname not in loaded or loaded[field.attname] != self.__dict__[field.attname]:
+                changed.append(field.name)
+        return changed
+
+    def has_changed(self, field_name):
+        """
+        Check whether a field was modified since the shipment was loaded
+        """
+        return self._meta.get_field(field_name).name in self.changed_fields
+
+    def get_original_value(self, field_name):
+        """
+        Value of a field as it was loaded from the database (None if unknown)
+        """
+        loaded = getattr(self, '_loaded_values', None) or {}
+        return loaded.get(self._meta.get_field(field_name).attname)
+
     def save(self, *args, **kwargs):
+        """
+        Save the shipment and append a ShipmentEvent for every status transition
+        Pass actor=<user> to record who made the change
+        Updates of loaded shipments only write the modified columns
+        Raises DatabaseError if a loaded shipment's row has since been deleted
+        (a full save would have inserted it again); shipments built by hand
+        are read first and still inserted when their row does not exist
+        """
+        from .addresses import apply_address_fields
+        from .recipients import find_recipient_user, normalize_email
+        from .search import build_search_text
+        from .state_machine import role_for, run_transition_hooks, validate_transition
+        from .tracking import invalidate_tracking_cache, publish_tracking_update
+
+        actor = kwargs.pop('actor', None)
+        is_new = self.pk is None
+        old_tracking_number = self.tracking_number
+
+        # Shipments built by hand (not loaded from the database) have no snapshot
+        if not is_new and getattr(self, '_loaded_values', None) is None:
+            original = Shipment.objects.filter(pk=self.pk).values(
+                *[field.attname for field in self._meta.concrete_fields]
+            ).first()
+            if original is not None:
+                self._loaded_values = original
+
+        old_status = self.get_original_value('status')
+        old_courier_id = self.get_original_value('courier')
+
+        # Changes made on behalf of a user must follow the state machine
+        if actor is not None:
+            validate_transition(role_for(actor), None if is_new else old_status, self.status)
+
+        # Parse addresses into the normalized columns only when they change
+        if is_new or self.has_changed('pickup_address') or self.has_changed('delivery_address'):
+            apply_address_fields(self)
+
         # Generate tracking number if new shipment
         if not self.tracking_number:
             self.tracking_number = self.generate_tracking_number()
-        else:
-            # Check if status is being changed to 'returned'
-            if self.pk:  # Only check for existing shipments
-                try:
-                    old_shipment = Shipment.objects.get(pk=self.pk)
-                    # If status changed to 'returned', generate new tracking number
-                    if old_shipment.status != 'returned' and self.status == 'returned':
-                        self.tracking_number = self.generate_tracking_number()
-                except Shipment.DoesNotExist:
-                    pass
+        elif old_status is not None and old_status != 'returned' and self.status == 'returned':
+            # If status changed to 'returned', generate new tracking number
+            self.tracking_number = self.generate_tracking_number()
 
-        super().save(*args, **kwargs)
+        # Link the shipment to the recipient's account when the email changes
+        if is_new or self.has_changed('recipient_email'):
+            self.recipient_email_normalized = normalize_email(self.recipient_email)
+            recipient = find_recipient_user(self.recipient_email_normalized)
+            self.recipient_user_id = recipient.pk if recipient else None
+
+        # Keep the denormalized search column in step with its sources
+        if is_new or self.has_changed('tracking_number') or self.has_changed('recipient_name') or self.has_changed('shipper'):
+            self.search_text = build_search_text(self)
+
+        changed = set(self.changed_fields)
+        tracking_changed = not is_new and bool(changed & {'status', 'courier', 'hold_reason'})
+
+        # Narrow UPDATE of the modified columns (updated_at is always touched)
+        if not is_new and getattr(self, '_loaded_values', None) and 'update_fields' not in kwargs and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = changed | {'updated_at'}
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._loaded_values = self._snapshot()
+
+            # Every number a shipment has had keeps resolving to it
+            if is_new or self.tracking_number != old_tracking_number:
+                TrackingAlias.objects.create(shipment=self, tracking_number=self.tracking_number)
+
+            # Event log, counters, rollups and courier workloads follow the row
+            if is_new or (changed & {'status', 'courier'} and old_status is not None):
+                run_transition_hooks(
+                    [(self, None if is_new else old_status, None if is_new else old_courier_id, self.status)],
+                    role=role_for(actor), actor=actor
+                )
+
+        # Cached tracking payloads are stale for both the old and new number
+        invalidate_tracking_cache(old_tracking_number, self.tracking_number)
+
+        # Push the change to live tracking subscribers of the old and new number
+        if tracking_changed:
+            publish_tracking_update(self, old_tracking_number)
+
+    def delete(self, *args, **kwargs):
+        from .tracking import invalidate_tracking_cache
+
+        tracking_number = self.tracking_number
+        result = super().delete(*args, **kwargs)
+        invalidate_tracking_cache(tracking_number)
+        return result
 
     def generate_tracking_number(self):
         """
-        Generate a unique tracking number using FD prefix + timestamp hash
-        Format: FD-XXXXXXXXXX (12 characters total)
+        Allocate a unique tracking number from the tracking number sequence
+        Format: FDXXXXXXXXXXC (FD + 10 hex digits + hex check digit)
         """
-        timestamp = timezone.now().timestamp()
-        # Create a hash from timestamp and a random component
-        hash_input = f"{timestamp}{id(self)}"
-        hash_object = hashlib.sha256(hash_input.encode())
-        hash_hex = hash_object.hexdigest()[:10].upper()
-
-        tracking_code = f"FD{hash_hex}"
+        from .tracking_numbers import next_tracking_number
 
-        # Ensure uniqueness
-        while Shipment.objects.filter(tracking_number=tracking_code).exists():
-            hash_input = f"{timestamp}{id(self)}{tracking_code}"
-            hash_object = hashlib.sha256(hash_input.encode())
-            hash_hex = hash_object.hexdigest()[:10].upper()
-            tracking_code = f"FD{hash_hex}"
+        return next_tracking_number()
 
-        return tracking_code
+    def record_event(self, status, actor=None):
+        """
+        Append a ShipmentEvent for the given status to this shipment's timeline
+        """
+        return ShipmentEvent.objects.create(
+            **ShipmentEvent.describe(self, status),
+            shipment=self,
+            status=status,
+            actor=actor,
+        )
 
     def get_status_badge_class(self):
         """
@@ -200,7 +496,7 @@ class Shipment(models.Model):
         """
         if user.is_staff or user.role == 'admin':
             return True
-        if user.role == 'courier' and self.courier == user:
+        if user.role == 'courier' and self.courier_id == user.pk:
             return True
         return False
 
@@ -208,27 +504,57 @@ class Shipment(models.Model):
         """
         Get allowed statuses based on user role
         Admins can change to any status (including backwards)
-        Couriers can only move forward
+        Couriers can only move forward (see core.state_machine)
         """
+        from .state_machine import next_statuses, role_for
+
         if not self.can_update_status(user):
             return []
+        return list(next_statuses(role_for(user), self.status))
 
-        # Admin can change to any status
-        if user.is_staff or user.role == 'admin':
-            # Return all statuses except the current one
-            return [status for status, _ in self.STATUS_CHOICES if status != self.status]
-
-        # Courier can only move forward in the flow
-        status_flow = {
-            'pending': ['accepted'],
-            'accepted': ['picked_up', 'hold'],
-            'picked_up': ['in_transit', 'hold', 'returned'],
-            'in_transit': ['hold', 'delivered', 'returned'],
-            'hold': ['picked_up', 'in_transit', 'delivered', 'returned'],
-            'delivered': [],
-            'returned': ['pending'],  # Returned packages restart the flow
-        }
-        return status_flow.get(self.status, [])
+
+class TrackingNumberSequence(models.Model):
+    """
+    Counter backing the tracking number allocator on backends without
+    sequences (PostgreSQL uses core_tracking_number_seq instead)
+    Callers reserve blocks of values with a single F() update
+    """
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField(default=1)
+
+    class Meta:
+        verbose_name = 'Tracking Number Sequence'
+        verbose_name_plural = 'Tracking Number Sequences'
+
+    def __str__(self):
+        return f"{self.name} ({self.next_value})"
+
+
+class TrackingAlias(models.Model):
+    """
+    Every tracking number a shipment has had (including the current one)
+    Lets old numbers keep resolving after a return issues a new number
+    """
+    tracking_number = models.CharField(
+        max_length=20,
+        unique=True,
+        help_text='Current or previous tracking number of the shipment'
+    )
+    shipment = models.ForeignKey(
+        'Shipment',
+        on_delete=models.CASCADE,
+        related_name='aliases',
+        help_text='Shipment this tracking number belongs to'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Tracking Alias'
+        verbose_name_plural = 'Tracking Aliases'
+
+    def __str__(self):
+        return f"{self.tracking_number} -> {self.shipment_id}"
 
 
 class ShipmentStatusNote(models.Model):
@@ -269,3 +595,284 @@ class ShipmentStatusNote(models.Model):
 
     def __str__(self):
         return f"{self.shipment.tracking_number} - {self.get_status_display()} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
+
+    def save(self, *args, **kwargs):
+        from .tracking import invalidate_tracking_cache
+
+        super().save(*args, **kwargs)
+
+        # Status notes are part of the tracking validators (ETag)
+        invalidate_tracking_cache(self.shipment.tracking_number)
+
+
+class ShipmentEvent(models.Model):
+    """
+    Append-only log of shipment status transitions
+    One row is written per transition; the tracking timeline is read back
+    with a single range scan on the (shipment, created_at) index
+    """
+    # Default location and description shown on the timeline for each status
+    STATUS_LOCATIONS = {
+        'pending': ('Origin Facility', 'Package information received'),
+        'accepted': ('Pickup Location', 'Package accepted by courier'),
+        'picked_up': ('Pickup Location', 'Package picked up'),
+        'in_transit': ('Transit Hub', 'Package in transit to destination'),
+        'hold': ('Hold Facility', 'Package on hold'),
+        'delivered': ('Delivery Location', 'Package delivered successfully'),
+        'returned': ('Return Processing', 'Package returned to sender - new tracking number generated'),
+    }
+
+    shipment = models.ForeignKey(
+        'Shipment',
+        on_delete=models.CASCADE,
+        related_name='events',
+        help_text='Shipment this event belongs to'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=Shipment.STATUS_CHOICES,
+        help_text='Status the shipment moved to'
+    )
+    location = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text='Where the transition happened'
+    )
+    city = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text='City of the event location'
+    )
+    description = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text='Human readable description of the event'
+    )
+    actor = models.ForeignKey(
+        'UserProfile',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='shipment_events',
+        help_text='User who made the transition (empty for system events)'
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        help_text='When the transition happened'
+    )
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        verbose_name = 'Shipment Event'
+        verbose_name_plural = 'Shipment Events'
+        indexes = [
+            models.Index(fields=['shipment', 'created_at'], name='core_event_shipment_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.shipment_id} - {self.get_status_display()} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError('Shipment events are append-only and cannot be modified.')
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def describe(cls, shipment, status):
+        """
+        Return the default location, city and description for a status
+        Cities come from the shipment's normalized address columns
+        """
+        location, description = cls.STATUS_LOCATIONS.get(status, ('', ''))
+
+        if status == 'in_transit':
+            city = 'Distribution Center'
+        elif status == 'delivered':
+            city = shipment.delivery_city or 'Unknown City'
+        else:
+            city = shipment.pickup_city or 'Unknown City'
+
+        return {'location': location, 'city': city, 'description': description}
+
+
+class ShipmentStatusCounter(models.Model):
+    """
+    Number of shipments currently in each status
+    Maintained with F() increments on every create, delete and status change
+    so status counts are a single small read; rebuild() reconciles any drift
+    (e.g. after queryset.update() calls that bypass Shipment.save)
+    """
+    status = models.CharField(
+        max_length=20,
+        choices=Shipment.STATUS_CHOICES,
+        unique=True
+    )
+    count = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['status']
+        verbose_name = 'Shipment Status Counter'
+        verbose_name_plural = 'Shipment Status Counters'
+
+    def __str__(self):
+        return f"{self.get_status_display()}: {self.count}"
+
+    @classmethod
+    def adjust(cls, deltas):
+        """
+        Apply {status: delta} increments within the caller's transaction
+        Rows are updated in a fixed order so concurrent transitions in opposite
+        directions cannot deadlock
+        """
+        for status, delta in sorted(deltas.items()):
+            if not delta:
+                continue
+            updated = cls.objects.filter(status=status).update(
+                count=models.F('count') + delta,
+                updated_at=timezone.now()
+            )
+            if not updated:
+                cls.objects.get_or_create(status=status)
+                cls.objects.filter(status=status).update(
+                    count=models.F('count') + delta,
+                    updated_at=timezone.now()
+                )
+
+    @classmethod
+    def get_counts(cls):
+        """
+        Return {status: count} for every status in Shipment.STATUS_CHOICES
+        """
+        counts = dict(cls.objects.values_list('status', 'count'))
+        return {status: counts.get(status, 0) for status, _ in Shipment.STATUS_CHOICES}
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Recompute every counter from the shipment table
+        Returns {status: (previous count, actual count)}
+        """
+        from django.db.models import Count
+
+        with transaction.atomic():
+            previous = dict(cls.objects.select_for_update().values_list('status', 'count'))
+            actual = dict(
+                Shipment.objects.order_by().values('status').annotate(
+                    total=Count('pk')
+                ).values_list('status', 'total')
+            )
+            statuses = {status for status, _ in Shipment.STATUS_CHOICES} | set(actual) | set(previous)
+            for status in statuses:
+                cls.objects.update_or_create(status=status, defaults={'count': actual.get(status, 0)})
+
+        return {
+            status: (previous.get(status, 0), actual.get(status, 0))
+            for status in sorted(statuses)
+        }
+
+
+class ShipmentRollup(models.Model):
+    """
+    Shipment counts per hour / day of creation, split by current status and courier
+    Maintained with F() increments on every create, delete, status change and
+    courier change; core.rollups rebuilds ranges of buckets from raw rows
+    """
+    GRANULARITY_CHOICES = [
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+    ]
+
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField(help_text='Start of the hour or day (UTC)')
+    status = models.CharField(max_length=20, choices=Shipment.STATUS_CHOICES)
+    # A deleted courier's buckets are merged into the unassigned ones first
+    # (core.rollups.release_courier), as their shipments become unassigned
+    courier = models.ForeignKey(
+        'UserProfile',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='shipment_rollups'
+    )
+    shipment_count = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['granularity', 'bucket_start']
+        verbose_name = 'Shipment Rollup'
+        verbose_name_plural = 'Shipment Rollups'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['granularity', 'bucket_start', 'status', 'courier'],
+                name='core_rollup_bucket_uniq'
+            ),
+            # NULLs are distinct in unique indexes, so unassigned rows need their own
+            models.UniqueConstraint(
+                fields=['granularity', 'bucket_start', 'status'],
+                condition=Q(courier__isnull=True),
+                name='core_rollup_bucket_unassigned_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.granularity} {self.bucket_start:%Y-%m-%d %H:%M} {self.status}: {self.shipment_count}"
+
+    @staticmethod
+    def bucket_starts(created_at):
+        """
+        Return {granularity: bucket_start} for a creation time
+        """
+        hour = created_at.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+        return {'hour': hour, 'day': hour.replace(hour=0)}
+
+    @classmethod
+    def adjust(cls, created_at, deltas):
+        """
+        Apply {(status, courier_id): delta} increments to the hourly and daily
+        buckets of a creation time, within the caller's transaction
+        """
+        cls.adjust_many(
+            (created_at, status, courier_id, delta) for (status, courier_id), delta in deltas.items()
+        )
+
+    @classmethod
+    def adjust_many(cls, changes):
+        """
+        Apply (created_at, status, courier_id, delta) increments of many
+        shipments, within the caller's transaction
+        Changes falling in the same bucket are summed first, so a batch costs
+        one UPDATE per bucket touched rather than per shipment
+        """
+        totals = {}
+        for created_at, status, courier_id, delta in changes:
+            for granularity, bucket_start in cls.bucket_starts(created_at).items():
+                key = (granularity, bucket_start, status, courier_id)
+                totals[key] = totals.get(key, 0) + delta
+        cls.adjust_buckets(totals)
+
+    @classmethod
+    def adjust_buckets(cls, totals):
+        """
+        Apply {(granularity, bucket_start, status, courier_id): delta}
+        increments, within the caller's transaction
+        Buckets are updated in a fixed order so concurrent writers do not deadlock
+        """
+        for (granularity, bucket_start, status, courier_id), delta in sorted(
+            totals.items(), key=lambda item: (item[0][0], item[0][1], item[0][2], item[0][3] or 0)
+        ):
+            if not delta:
+                continue
+            rows = cls.objects.filter(
+                granularity=granularity,
+                bucket_start=bucket_start,
+                status=status,
+                courier_id=courier_id
+            )
+            if not rows.update(shipment_count=models.F('shipment_count') + delta):
+                cls.objects.get_or_create(
+                    granularity=granularity,
+                    bucket_start=bucket_start,
+                    status=status,
+                    courier_id=courier_id
+                )
+                rows.update(shipment_count=models.F('shipment_count') + delta)
@@ -0,0 +1,216 @@
+"""
+Keyset (cursor) pagination
+
+Pages are ordered newest first on (created_at, id) and located with a range
+condition on the last row seen instead of an OFFSET, so every page is a bounded
+scan of a (..., created_at, id) index no matter how deep it is, and no COUNT(*)
+is needed. Cursors are opaque URL-safe tokens carrying the direction and the
+boundary row.
+
+Search results are ordered by relevance rank, which has no stable keyset, so
+they are paged by offset instead (paginate_ranked), up to a bounded depth.
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 20
+
+CURSOR_PARAM = 'cursor'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(direction, created_at, pk):
+    """
+    Opaque cursor for the rows after ('n') or before ('p') a boundary row
+    """
+    raw = f'{direction}|{created_at.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Return (direction, created_at, pk) from a cursor, raising InvalidCursor
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        direction, created_at, pk = raw.split('|')
+        if direction not in ('n', 'p'):
+            raise ValueError(direction)
+        return direction, datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f'Invalid cursor: {cursor}') from e
+
+
+class KeysetPage:
+    """
+    One page of a keyset-paginated queryset
+    Exposes the parts of Django's Page used by templates (iteration, has_next,
+    has_previous, has_other_pages) plus the cursors of the adjacent pages
+    """
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next_page = has_next
+        self.has_previous_page = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
+
+    @property
+    def next_cursor(self):
+        if not self.has_next_page:
+            return None
+        last = self.object_list[-1]
+        return encode_cursor('n', last.created_at, last.pk)
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous_page:
+            return None
+        first = self.object_list[0]
+        return encode_cursor('p', first.created_at, first.pk)
+
+
+def keyset_filter(cursor):
+    """
+    Return (direction, condition, ordering) selecting the rows after a cursor
+    direction is None for the first page, 'n' for older and 'p' for newer rows;
+    rows for 'p' are read in ascending order and must be flipped by build_page
+    """
+    if not cursor:
+        return None, Q(), ('-created_at', '-id')
+
+    direction, created_at, pk = decode_cursor(cursor)
+
+    if direction == 'n':
+        # Older rows; the redundant created_at bound keeps the scan a single index range
+        condition = Q(created_at__lte=created_at) & (
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+        return direction, condition, ('-created_at', '-id')
+
+    condition = Q(created_at__gte=created_at) & (
+        Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+    )
+    return direction, condition, ('created_at', 'id')
+
+
+def build_page(rows, direction, page_size):
+    """
+    Build a KeysetPage from up to page_size + 1 rows fetched after keyset_filter
+    """
+    if direction == 'p':
+        return KeysetPage(rows[:page_size][::-1], has_next=True, has_previous=len(rows) > page_size)
+    return KeysetPage(rows[:page_size], has_next=len(rows) > page_size, has_previous=direction is not None)
+
+
+def paginate_keyset(queryset, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Return the KeysetPage of a queryset selected by a cursor (first page if None)
+    Fetches page_size + 1 rows to learn whether another page follows
+    """
+    direction, condition, ordering = keyset_filter(cursor)
+    rows = list(queryset.filter(condition).order_by(*ordering)[:page_size + 1])
+    return build_page(rows, direction, page_size)
+
+
+def encode_offset_cursor(offset):
+    """
+    Opaque cursor for the ranked results starting at an offset
+    """
+    return base64.urlsafe_b64encode(f'o|{offset}'.encode()).decode().rstrip('=')
+
+
+def decode_offset_cursor(cursor):
+    """
+    Return the offset of a ranked results cursor, raising InvalidCursor
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        kind, offset = raw.split('|')
+        offset = int(offset)
+        if kind != 'o' or offset < 0:
+            raise ValueError(raw)
+        return offset
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f'Invalid cursor: {cursor}') from e
+
+
+class RankedPage(KeysetPage):
+    """
+    One page of relevance-ranked results, with offset cursors
+    """
+
+    def __init__(self, object_list, offset, page_size, has_next):
+        super().__init__(object_list, has_next=has_next, has_previous=offset > 0)
+        self.offset = offset
+        self.page_size = page_size
+
+    @property
+    def next_cursor(self):
+        if not self.has_next_page:
+            return None
+        return encode_offset_cursor(self.offset + self.page_size)
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous_page:
+            return None
+        return encode_offset_cursor(max(0, self.offset - self.page_size))
+
+
+def paginate_ranked(queryset, cursor=None, page_size=DEFAULT_PAGE_SIZE, max_results=None):
+    """
+    Return the RankedPage of an already ordered queryset selected by an
+    offset cursor (first page if None); pages end after max_results rows so
+    deep OFFSETs stay bounded
+    """
+    offset = decode_offset_cursor(cursor) if cursor else 0
+    if max_results is not None:
+        offset = min(offset, max(0, max_results - page_size))
+    rows = list(queryset[offset:offset + page_size + 1])
+    has_next = len(rows) > page_size and (max_results is None or offset + page_size < max_results)
+    return RankedPage(rows[:page_size], offset, page_size, has_next)
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin replacing OFFSET pagination with keyset pagination
+    With paginate_by set, page_obj is a KeysetPage; paginate_keyset() pages any
+    other queryset of the view. An invalid cursor falls back to the first page
+    """
+    keyset_page_size = DEFAULT_PAGE_SIZE
+
+    def get_cursor(self):
+        return self.request.GET.get(CURSOR_PARAM) or None
+
+    def paginate_keyset(self, queryset, page_size=None):
+        page_size = page_size or self.keyset_page_size
+        try:
+            return paginate_keyset(queryset, self.get_cursor(), page_size)
+        except InvalidCursor:
+            return paginate_keyset(queryset, None, page_size)
+
+    def paginate_queryset(self, queryset, page_size):
+        page = self.paginate_keyset(queryset, page_size)
+        return None, page, page.object_list, page.has_other_pages()
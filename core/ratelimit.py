@@ -0,0 +1,255 @@
+"""
+Token-bucket rate limiting for the public tracking endpoints
+
+Each client gets a bucket per scope: recognized API keys (X-API-Key header) get
+their own, larger bucket; everyone else is limited per client IP. Buckets live
+in process memory by default. Setting RATELIMIT_CACHE_ALIAS shares them through
+a Django cache backend (e.g. Redis) so limits hold across workers; the shared
+store is best-effort (read-modify-write, no locking) which is fine for shedding
+scraper load.
+"""
+import json
+import math
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+
+DEFAULT_RATES = {
+    # scope: {bucket kind: (capacity, tokens refilled per second)}
+    'tracking': {'ip': (60, 1.0), 'api_key': (600, 10.0)},
+}
+
+# Idle buckets are pruned from process memory past this many entries
+MAX_LOCAL_BUCKETS = 10000
+
+
+class LocalBucketStore:
+    """
+    Buckets and counters kept in process memory
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._counters = {}
+
+    def consume(self, key, capacity, rate, cost):
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, _ = self._buckets.get(key, (capacity, now, None))
+            allowed, tokens, retry_after = _take(tokens, last, now, capacity, rate, cost)
+            # Each bucket remembers how long it takes to refill completely
+            self._buckets[key] = (tokens, now, capacity / rate)
+            if len(self._buckets) > MAX_LOCAL_BUCKETS:
+                self._prune(now)
+        return allowed, retry_after
+
+    def incr(self, counter):
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + 1
+
+    def counters(self, names):
+        with self._lock:
+            return {name: self._counters[name] for name in names if name in self._counters}
+
+    def _prune(self, now):
+        # A bucket idle long enough to refill completely is the same as no bucket
+        self._buckets = {
+            key: bucket for key, bucket in self._buckets.items()
+            if now - bucket[1] < bucket[2]
+        }
+
+
+class CacheBucketStore:
+    """
+    Buckets and counters kept in a shared Django cache backend
+    """
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def consume(self, key, capacity, rate, cost):
+        now = time.time()
+        cache_key = f'ratelimit:bucket:{key}'
+        tokens, last = self.cache.get(cache_key, (capacity, now))
+        allowed, tokens, retry_after = _take(tokens, last, now, capacity, rate, cost)
+        self.cache.set(cache_key, (tokens, now), math.ceil(capacity / rate) + 1)
+        return allowed, retry_after
+
+    def incr(self, counter):
+        cache_key = f'ratelimit:counter:{counter}'
+        if not self.cache.add(cache_key, 1, None):
+            self.cache.incr(cache_key)
+
+    def counters(self, names):
+        names = {f'ratelimit:counter:{name}': name for name in names}
+        values = self.cache.get_many(names.keys())
+        return {names[key]: value for key, value in values.items()}
+
+
+def _take(tokens, last, now, capacity, rate, cost):
+    """
+    Refill a bucket for the elapsed time and try to take `cost` tokens
+    Returns (allowed, remaining tokens, seconds until enough tokens are available)
+    """
+    tokens = min(capacity, tokens + max(0.0, now - last) * rate)
+    if tokens >= cost:
+        return True, tokens - cost, 0
+    return False, tokens, math.ceil((cost - tokens) / rate)
+
+
+class TokenBucketLimiter:
+    """
+    Per-IP / per-API-key token bucket limiter with load-shedding counters
+    """
+
+    def __init__(self, store, rates, api_keys=(), trust_forwarded_for=False):
+        self.store = store
+        self.rates = rates
+        self.api_keys = frozenset(api_keys)
+        self.trust_forwarded_for = trust_forwarded_for
+
+    def bucket_for(self, request):
+        """
+        Return (kind, identity) of the bucket a request draws from
+        Unknown API keys fall back to the IP bucket so rotating made-up keys
+        does not bypass the limit
+        """
+        api_key = request.headers.get('X-API-Key', '').strip()
+        if api_key and api_key in self.api_keys:
+            return 'api_key', api_key
+        return 'ip', self.client_ip(request)
+
+    def client_ip(self, request):
+        if self.trust_forwarded_for:
+            forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR', '')
+            if forwarded_for:
+                return forwarded_for.split(',')[0].strip()
+        return request.META.get('REMOTE_ADDR', '')
+
+    def capacity(self, request, scope):
+        """
+        Most tokens the request's bucket can ever hold
+        """
+        kind, _ = self.bucket_for(request)
+        return self.rates[scope][kind][0]
+
+    def check(self, request, scope, cost=1):
+        """
+        Take `cost` tokens for a request; returns (allowed, retry_after)
+        The cost must not exceed the bucket's capacity, or it could never be paid
+        """
+        kind, identity = self.bucket_for(request)
+        capacity, rate = self.rates[scope][kind]
+        if cost > capacity:
+            raise ValueError(f'Cost {cost} exceeds the {scope} {kind} bucket capacity of {capacity}')
+        allowed, retry_after = self.store.consume(f'{scope}:{kind}:{identity}', capacity, rate, cost)
+
+        self.store.incr(f'{scope}:{"allowed" if allowed else "throttled"}')
+        return allowed, retry_after
+
+    def stats(self):
+        """
+        Allowed / throttled request counts per configured scope
+        The counter names come from the rates, so a shared store reports the
+        requests of every worker, not only those this process has seen
+        """
+        outcomes = ('allowed', 'throttled')
+        counters = self.store.counters([f'{scope}:{outcome}' for scope in self.rates for outcome in outcomes])
+        return {
+            scope: {outcome: counters.get(f'{scope}:{outcome}', 0) for outcome in outcomes}
+            for scope in self.rates
+        }
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """
+    Process-wide limiter built from settings on first use
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            alias = getattr(settings, 'RATELIMIT_CACHE_ALIAS', None)
+            store = CacheBucketStore(alias) if alias else LocalBucketStore()
+            _limiter = TokenBucketLimiter(
+                store,
+                rates=getattr(settings, 'RATELIMIT_RATES', DEFAULT_RATES),
+                api_keys=getattr(settings, 'RATELIMIT_API_KEYS', ()),
+                trust_forwarded_for=getattr(settings, 'RATELIMIT_TRUST_X_FORWARDED_FOR', False),
+            )
+        return _limiter
+
+
+def rate_limit(scope, cost=1, json_response=True):
+    """
+    View decorator applying the token bucket limiter of a scope
+    `cost` may be a callable taking the request (e.g. items in a bulk request)
+    Rejected requests get 429 Too Many Requests with a Retry-After header;
+    requests costing more than the client's bucket can ever hold get 400 Bad
+    Request with the per-client limit, since retrying would never succeed
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped(request, *args, **kwargs):
+            if not getattr(settings, 'RATELIMIT_ENABLED', True):
+                return view_func(request, *args, **kwargs)
+
+            limiter = get_limiter()
+            request_cost = cost(request) if callable(cost) else cost
+            capacity = limiter.capacity(request, scope)
+            if request_cost > capacity:
+                message = (
+                    f'This request counts as {request_cost} requests, but at most {capacity} '
+                    f'are allowed at once. Please split it into smaller requests.'
+                )
+                if json_response:
+                    return JsonResponse({
+                        'success': False,
+                        'error': 'Request too large',
+                        'message': message,
+                        'max_cost': capacity,
+                    }, status=400)
+                return HttpResponse(message, status=400, content_type='text/plain')
+
+            allowed, retry_after = limiter.check(request, scope, request_cost)
+            if allowed:
+                return view_func(request, *args, **kwargs)
+
+            if json_response:
+                response = JsonResponse({
+                    'success': False,
+                    'error': 'Rate limit exceeded',
+                    'message': f'Too many requests. Please retry in {retry_after} seconds.',
+                    'retry_after': retry_after,
+                }, status=429)
+            else:
+                response = HttpResponse(
+                    f'Too many requests. Please retry in {retry_after} seconds.',
+                    status=429,
+                    content_type='text/plain'
+                )
+            response.headers['Retry-After'] = str(retry_after)
+            return response
+        return wrapped
+    return decorator
+
+
+def bulk_tracking_cost(request):
+    """
+    Charge bulk tracking requests one token per requested tracking number
+    """
+    try:
+        tracking_numbers = json.loads(request.body).get('tracking_numbers')
+    except (ValueError, AttributeError):
+        return 1
+    if not isinstance(tracking_numbers, list):
+        return 1
+    return max(1, len(tracking_numbers))
@@ -0,0 +1,112 @@
+"""
+Recipient linkage
+
+Shipments store the recipient email lowercased in an indexed column and point
+at the recipient's account through recipient_user, so recipient dashboards
+are a single indexed equality lookup instead of a case-insensitive scan.
+Accounts are looked up by LOWER(email), which core_user_email_lower_idx
+serves. Whenever a user is saved with a new email or role, however it was
+created or edited, their links are brought in line (sync_recipient_shipments),
+so shipments sent before the recipient registered are linked too.
+"""
+from django.db.models.functions import Lower
+
+# Shipments linked per UPDATE statement
+LINK_BATCH_SIZE = 500
+
+
+def normalize_email(email):
+    """
+    Canonical form used to match recipient emails to accounts
+    """
+    return (email or '').strip().lower()
+
+
+def find_recipient_user(email):
+    """
+    Return the recipient account registered with an email, or None
+    """
+    from .models import UserProfile
+
+    email = normalize_email(email)
+    if not email:
+        return None
+    return UserProfile.objects.annotate(email_lower=Lower('email')).filter(
+        role='recipient', email_lower=email
+    ).order_by('pk').first()
+
+
+def find_recipient_users(emails):
+    """
+    Map normalized emails to the pk of the recipient account registered with
+    each, in one query
+    """
+    from .models import UserProfile
+
+    emails = {normalize_email(email) for email in emails} - {''}
+    if not emails:
+        return {}
+    matches = {}
+    rows = UserProfile.objects.filter(role='recipient').annotate(
+        email_lower=Lower('email')
+    ).filter(email_lower__in=emails).order_by('-pk').values_list('email_lower', 'pk')
+    for email, pk in rows:
+        # Ordered newest first so the oldest account wins, as in find_recipient_user
+        matches[email] = pk
+    return matches
+
+
+def link_recipient_shipments(user, batch_size=LINK_BATCH_SIZE):
+    """
+    Point unlinked shipments addressed to a user's email at their account
+    Runs in batches of primary keys so no single UPDATE holds locks for long
+    Returns the number of shipments linked
+    """
+    from .models import Shipment
+
+    email = normalize_email(user.email)
+    if not email:
+        return 0
+
+    unlinked = Shipment.objects.filter(
+        recipient_email_normalized=email,
+        recipient_user__isnull=True
+    ).order_by('pk')
+
+    linked = 0
+    last_pk = 0
+    while True:
+        pks = list(unlinked.filter(pk__gt=last_pk).values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        linked += Shipment.objects.filter(pk__in=pks, recipient_user__isnull=True).update(recipient_user=user)
+        last_pk = pks[-1]
+
+    return linked
+
+
+def sync_recipient_shipments(user):
+    """
+    Bring the shipments linked to a user in line with their current email and
+    role: shipments linked to them but addressed to another email go to the
+    recipient account registered with that email (if any), and unlinked
+    shipments addressed to their email are linked
+    Returns the number of shipments newly linked to the user
+    """
+    from .models import Shipment
+
+    email = normalize_email(user.email) if user.role == 'recipient' else ''
+
+    stale = Shipment.objects.filter(recipient_user=user)
+    if email:
+        stale = stale.exclude(recipient_email_normalized=email)
+    stale_emails = set(stale.order_by().values_list('recipient_email_normalized', flat=True).distinct())
+    if stale_emails:
+        stale.update(recipient_user=None)
+        for other_email, pk in find_recipient_users(stale_emails).items():
+            Shipment.objects.filter(
+                recipient_email_normalized=other_email,
+                recipient_user__isnull=True
+            ).update(recipient_user_id=pk)
+
+    return link_recipient_shipments(user) if email else 0
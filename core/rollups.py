@@ -0,0 +1,197 @@
+"""
+Hourly and daily shipment rollups
+
+ShipmentRollup rows count shipments by the hour and day they were created,
+split by current status and courier. Shipment writes keep them current with
+F() increments; the functions here rebuild whole ranges of buckets from the
+shipment table (backfill, or periodic refresh to repair drift from bulk
+updates) and answer dashboard / trend queries from the rollups alone.
+
+A rebuild replaces buckets that live writers increment. On PostgreSQL it
+locks the rollup table against writes for the rebuild's transaction, so
+every change is counted exactly once: writers that already touched the
+rollups commit first and are counted, the rest wait and apply their deltas
+on top. Other backends have no table locks; rebuild there in a quiet window.
+"""
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+# Days of history rebuilt per transaction by the backfill
+ROLLUP_CHUNK_DAYS = 7
+
+
+def floor_day(value):
+    """
+    Start of the UTC day containing a datetime
+    """
+    return value.astimezone(dt_timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def rebuild_range(start, end):
+    """
+    Recompute every hourly and daily bucket in [start, end) from the shipment table
+    start and end are aligned outwards to whole UTC days so daily rows are complete
+    Returns the number of shipments counted
+    """
+    from .models import Shipment, ShipmentRollup
+
+    start = floor_day(start)
+    aligned_end = floor_day(end)
+    if aligned_end < end or aligned_end <= start:
+        aligned_end += timedelta(days=1)
+    end = aligned_end
+
+    shipments = Shipment.objects.filter(created_at__gte=start, created_at__lt=end).order_by()
+
+    with transaction.atomic():
+        lock_rollups()
+        ShipmentRollup.objects.filter(bucket_start__gte=start, bucket_start__lt=end).delete()
+
+        rows = []
+        total = 0
+        for granularity, trunc in (('hour', TruncHour), ('day', TruncDay)):
+            grouped = shipments.annotate(
+                bucket=trunc('created_at', tzinfo=dt_timezone.utc)
+            ).values('bucket', 'status', 'courier_id').annotate(total=Count('pk'))
+            for group in grouped:
+                rows.append(ShipmentRollup(
+                    granularity=granularity,
+                    bucket_start=group['bucket'],
+                    status=group['status'],
+                    courier_id=group['courier_id'],
+                    shipment_count=group['total'],
+                ))
+                if granularity == 'day':
+                    total += group['total']
+        ShipmentRollup.objects.bulk_create(rows, batch_size=1000)
+
+    return total
+
+
+def lock_rollups():
+    """
+    Block rollup writers until the current transaction ends (PostgreSQL only)
+    SHARE ROW EXCLUSIVE conflicts with the row locks of F() updates and
+    inserts but not with reads, so dashboards keep working
+    """
+    from .models import ShipmentRollup
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'LOCK TABLE {connection.ops.quote_name(ShipmentRollup._meta.db_table)} '
+                f'IN SHARE ROW EXCLUSIVE MODE'
+            )
+
+
+def release_courier(courier_id):
+    """
+    Move a courier's buckets to the unassigned ones, as a courier's
+    shipments become unassigned when the courier is deleted
+    """
+    from .models import ShipmentRollup
+
+    with transaction.atomic():
+        rows = ShipmentRollup.objects.select_for_update().filter(courier_id=courier_id)
+        totals = {}
+        for granularity, bucket_start, status, count in rows.values_list(
+            'granularity', 'bucket_start', 'status', 'shipment_count'
+        ):
+            key = (granularity, bucket_start, status, None)
+            totals[key] = totals.get(key, 0) + count
+        rows.delete()
+        ShipmentRollup.adjust_buckets(totals)
+
+
+def refresh_recent(hours=48, now=None):
+    """
+    Rebuild the buckets covering the last `hours` hours
+    """
+    now = now or timezone.now()
+    return rebuild_range(now - timedelta(hours=hours), now)
+
+
+def backfill(chunk_days=ROLLUP_CHUNK_DAYS, progress=None):
+    """
+    Rebuild all buckets from the first shipment to now, `chunk_days` days per
+    transaction so locks and memory stay bounded
+    progress(chunk_start, chunk_end, shipments) is called after each chunk
+    Returns the number of shipments counted
+    """
+    from .models import Shipment
+
+    first = Shipment.objects.order_by('created_at').values_list('created_at', flat=True).first()
+    if first is None:
+        return 0
+
+    chunk_start = floor_day(first)
+    end = timezone.now()
+    total = 0
+    while chunk_start <= end:
+        chunk_end = chunk_start + timedelta(days=chunk_days)
+        counted = rebuild_range(chunk_start, chunk_end)
+        total += counted
+        if progress:
+            progress(chunk_start, chunk_end, counted)
+        chunk_start = chunk_end
+
+    return total
+
+
+def get_period_totals(now=None):
+    """
+    Shipments created today and in the last 7 days, and unassigned pending
+    shipments, read with one aggregate over the rollups
+    The week window is aligned to the hour
+    """
+    from .models import ShipmentRollup
+
+    now = now or timezone.now()
+    today_start = floor_day(now)
+    week_start = (now - timedelta(days=7)).astimezone(dt_timezone.utc).replace(
+        minute=0, second=0, microsecond=0
+    )
+
+    row = ShipmentRollup.objects.aggregate(
+        today=Sum('shipment_count', filter=Q(granularity='day', bucket_start=today_start)),
+        week=Sum('shipment_count', filter=Q(granularity='hour', bucket_start__gte=week_start)),
+        unassigned=Sum('shipment_count', filter=Q(granularity='day', status='pending', courier__isnull=True)),
+    )
+    return {key: value or 0 for key, value in row.items()}
+
+
+def get_daily_trend(days=14, now=None):
+    """
+    Shipments created per day over the last `days` days, oldest first
+    Returns [{'day': date, 'total': n, 'statuses': {status: n}}], one entry per
+    day including days without shipments
+    """
+    from .models import ShipmentRollup
+
+    today_start = floor_day(now or timezone.now())
+    start = today_start - timedelta(days=days - 1)
+
+    trend = {
+        start + timedelta(days=offset): {'total': 0, 'statuses': {}}
+        for offset in range(days)
+    }
+    rows = ShipmentRollup.objects.filter(
+        granularity='day',
+        bucket_start__gte=start
+    ).values('bucket_start', 'status').annotate(total=Sum('shipment_count'))
+
+    for row in rows:
+        day = trend.get(row['bucket_start'])
+        if day is None or not row['total']:
+            continue
+        day['total'] += row['total']
+        day['statuses'][row['status']] = row['total']
+
+    return [
+        {'day': bucket_start.date(), **values}
+        for bucket_start, values in trend.items()
+    ]
@@ -0,0 +1,197 @@
+"""
+Batch courier scans
+
+A courier scanning a van-load of parcels sends every scan in one request as a
+list of {tracking_number, action, status} items. The batch is applied in one
+transaction:
+
+- one query fetches (and locks) every shipment the batch names, by current
+  or previous tracking number
+- items are validated against the state machine and applied in order, in
+  memory, so a parcel can be accepted and picked up in the same batch
+- one bulk_update writes the changed shipments, with one bulk_create for
+  the aliases of returned parcels
+
+The transition hooks then write the events, counters, rollups and workload
+changes that Shipment.save would have produced.
+Invalid items are reported and skipped without affecting the rest.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .state_machine import InvalidTransition, role_for, run_transition_hooks, validate_transition
+
+# Most items accepted in one batch request
+SCAN_BATCH_MAX_ITEMS = getattr(settings, 'SCAN_BATCH_MAX_ITEMS', 200)
+
+SCAN_ACTIONS = ('accept', 'update')
+
+
+class ScanBatchError(ValueError):
+    pass
+
+
+def apply_scans(courier, items):
+    """
+    Apply a batch of scans by a courier
+    Returns one result per item, in order: {'tracking_number', 'success',
+    'status', 'status_display'} or {'tracking_number', 'success', 'error'}
+    Raises ScanBatchError when the batch itself is malformed
+    """
+    if not isinstance(items, list):
+        raise ScanBatchError('Expected a list of scans')
+    if len(items) > SCAN_BATCH_MAX_ITEMS:
+        raise ScanBatchError(f'At most {SCAN_BATCH_MAX_ITEMS} scans can be sent at once')
+
+    scans = []
+    for item in items:
+        item = item if isinstance(item, dict) else {}
+        scans.append((str(item.get('tracking_number') or '').strip().upper(), item.get('action'), item.get('status')))
+
+    with transaction.atomic():
+        shipments = find_scanned_shipments({number for number, _, _ in scans if number})
+
+        results = []
+        transitions = []
+        for tracking_number, action, status in scans:
+            shipment = shipments.get(tracking_number)
+            error = validate_scan(shipment, courier, action, status)
+            if error:
+                results.append({'tracking_number': tracking_number, 'success': False, 'error': error})
+                continue
+
+            old_status, old_courier_id = shipment.status, shipment.courier_id
+            if action == 'accept':
+                status = 'accepted'
+            # Every shipment left in the batch belongs to the courier
+            shipment.courier = courier
+            shipment.status = status
+            transitions.append((shipment, old_status, old_courier_id, status))
+            results.append({'tracking_number': tracking_number, 'success': True, 'result': shipment})
+
+        commit_scans(transitions, actor=courier)
+
+    for result in results:
+        shipment = result.pop('result', None)
+        if shipment is not None:
+            # Report the shipment as it ended the batch (and its new number after a return)
+            result.update(
+                tracking_number=shipment.tracking_number,
+                status=shipment.status,
+                status_display=shipment.get_status_display(),
+            )
+    return results
+
+
+def find_scanned_shipments(tracking_numbers):
+    """
+    Map scanned tracking numbers, current or previous (e.g. the label of a
+    parcel from before its return), to their shipments, locked for update
+    One alias lookup and one shipment query, however many numbers are scanned
+    """
+    from .models import Shipment, TrackingAlias
+
+    if not tracking_numbers:
+        return {}
+    aliases = dict(
+        TrackingAlias.objects.filter(tracking_number__in=tracking_numbers).values_list('tracking_number', 'shipment_id')
+    )
+    by_pk = {
+        shipment.pk: shipment
+        for shipment in Shipment.objects.select_for_update().filter(
+            Q(tracking_number__in=tracking_numbers) | Q(pk__in=set(aliases.values()))
+        )
+    }
+    by_number = {shipment.tracking_number: shipment for shipment in by_pk.values()}
+    return {
+        number: by_number.get(number) or by_pk.get(aliases.get(number))
+        for number in tracking_numbers
+        if number in by_number or aliases.get(number) in by_pk
+    }
+
+
+def validate_scan(shipment, courier, action, status):
+    """
+    Error message for a scan the courier may not apply, or None
+    """
+    if shipment is None:
+        return 'Shipment not found'
+    if action not in SCAN_ACTIONS:
+        return 'Invalid action. Must be "accept" or "update"'
+
+    if action == 'accept':
+        if shipment.status != 'pending':
+            return 'Only pending shipments can be accepted'
+        if shipment.courier_id is not None:
+            return 'Shipment already assigned to another courier'
+        status = 'accepted'
+    elif shipment.courier_id != courier.pk:
+        return 'You are not assigned to this shipment'
+    elif status == shipment.status:
+        return f'Shipment is already {shipment.get_status_display()}'
+    try:
+        validate_transition(role_for(courier), shipment.status, status)
+    except InvalidTransition as e:
+        return str(e)
+    return None
+
+
+def commit_scans(transitions, actor=None):
+    """
+    Write [(shipment, old status, old courier id, new status)] transitions
+    applied in memory, within the caller's transaction
+    A shipment may appear more than once; each transition gets its event and
+    counter changes, and the shipment is written once in its final state
+    """
+    from .models import Shipment, TrackingAlias
+    from .search import build_search_text
+    from .tracking import invalidate_tracking_cache, publish_tracking_update
+    from .tracking_numbers import allocate_tracking_numbers
+
+    if not transitions:
+        return
+
+    now = timezone.now()
+
+    # Returned packages get a new tracking number, as in Shipment.save
+    returns = [
+        shipment for shipment, old_status, _, status in transitions
+        if status == 'returned' and old_status != 'returned'
+    ]
+    numbers = iter(allocate_tracking_numbers(len(returns)))
+    previous_numbers = {}
+
+    aliases = []
+    for shipment, old_status, _, status in transitions:
+        previous_numbers.setdefault(shipment.pk, shipment.get_original_value('tracking_number'))
+        shipment.previous_status = old_status
+        if status == 'returned' and old_status != 'returned':
+            shipment.tracking_number = next(numbers)
+            shipment.search_text = build_search_text(shipment)
+            aliases.append(TrackingAlias(shipment=shipment, tracking_number=shipment.tracking_number))
+
+    shipments = list({shipment.pk: shipment for shipment, _, _, _ in transitions}.values())
+    for shipment in shipments:
+        shipment.updated_at = now
+    Shipment.objects.bulk_update(
+        shipments, ['status', 'previous_status', 'courier', 'tracking_number', 'search_text', 'updated_at']
+    )
+    for shipment in shipments:
+        shipment._loaded_values = shipment._snapshot()
+
+    TrackingAlias.objects.bulk_create(aliases)
+    run_transition_hooks(transitions, role=role_for(actor), actor=actor, now=now)
+
+    invalidate_tracking_cache(*{
+        number
+        for shipment in shipments
+        for number in (previous_numbers[shipment.pk], shipment.tracking_number)
+    })
+    for shipment in shipments:
+        old_number = previous_numbers[shipment.pk]
+        if old_number != shipment.tracking_number:
+            publish_tracking_update(shipment, old_number)
+        else:
+            publish_tracking_update(shipment)
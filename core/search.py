@@ -0,0 +1,204 @@
+"""
+Shipment search
+
+Shipment.search_text holds the tracking number, recipient name and shipper
+username as one lowercased string, maintained on save and rebuilt for all of
+a shipper's shipments when their username changes. It is indexed per
+database backend:
+
+- PostgreSQL: a pg_trgm GIN index, so substring matches are index scans and
+  results are ranked by trigram word similarity
+- SQLite: an external-content FTS5 table using the trigram tokenizer, kept in
+  sync with core_shipment by triggers and ranked by bm25
+
+Other backends (and queries shorter than a trigram on SQLite) fall back to a
+substring match on search_text.
+"""
+import re
+
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'core_shipment_fts'
+
+TRIGRAM_INDEX = 'core_ship_search_trgm_idx'
+
+WHITESPACE = re.compile(r'\s+')
+
+SQLITE_FTS_STATEMENTS = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        search_text, content='core_shipment', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON core_shipment BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON core_shipment BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_text ON core_shipment BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+        INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text);
+    END
+    """,
+]
+
+
+def normalize_search_text(value):
+    """
+    Lowercase and collapse whitespace so stored text and queries compare alike
+    """
+    return WHITESPACE.sub(' ', (value or '').lower()).strip()
+
+
+def build_search_text(shipment):
+    """
+    Denormalized search string of a shipment
+    """
+    return normalize_search_text(' '.join([
+        shipment.tracking_number or '',
+        shipment.recipient_name or '',
+        shipment.shipper.username if shipment.shipper_id else '',
+    ]))
+
+
+def refresh_shipper_search_text(shipper_id, batch_size=1000):
+    """
+    Rebuild the search text of every shipment sent by a shipper, in batches
+    of primary keys; returns the number of shipments updated
+    """
+    from .models import Shipment
+
+    queryset = Shipment.objects.filter(shipper_id=shipper_id).select_related('shipper').only(
+        'pk', 'tracking_number', 'recipient_name', 'search_text', 'shipper__username'
+    ).order_by('pk')
+
+    updated = 0
+    last_pk = 0
+    while True:
+        shipments = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not shipments:
+            break
+        stale = []
+        for shipment in shipments:
+            text = build_search_text(shipment)
+            if shipment.search_text != text:
+                shipment.search_text = text
+                stale.append(shipment)
+        Shipment.objects.bulk_update(stale, ['search_text'])
+        updated += len(stale)
+        last_pk = shipments[-1].pk
+    return updated
+
+
+def ensure_search_index(connection, rebuild=False):
+    """
+    Create the backend's search index if it is missing (idempotent)
+    On SQLite this also restores the sync triggers, which are dropped whenever
+    a migration rebuilds core_shipment (see the post_migrate receiver);
+    rebuild=True repopulates the FTS table
+    Returns False if the backend has no dedicated search index
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} ON core_shipment '
+                f'USING gin (search_text gin_trgm_ops)'
+            )
+            return True
+
+        if connection.vendor == 'sqlite':
+            if not sqlite_supports_trigram():
+                return False
+            for statement in SQLITE_FTS_STATEMENTS:
+                cursor.execute(statement)
+            if rebuild:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            return True
+
+    return False
+
+
+def drop_search_index(connection):
+    """
+    Remove the backend's search index (reverse of ensure_search_index)
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'DROP INDEX IF EXISTS {TRIGRAM_INDEX}')
+        elif connection.vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def sqlite_supports_trigram():
+    """
+    The FTS5 trigram tokenizer needs SQLite 3.34+
+    """
+    import sqlite3
+
+    return sqlite3.sqlite_version_info >= (3, 34, 0)
+
+
+# Database aliases whose FTS table is known to exist
+_fts_ready = set()
+
+
+def has_fts_table(connection):
+    """
+    Check (once per database alias) whether the SQLite FTS table exists
+    """
+    if connection.alias in _fts_ready:
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+        )
+        if cursor.fetchone() is None:
+            return False
+    _fts_ready.add(connection.alias)
+    return True
+
+
+def search_shipments(queryset, query):
+    """
+    Filter a shipment queryset to matches of a search query, best matches first
+    One query using the backend's search index; results carry a search_rank
+    annotation where the backend provides one
+    """
+    query = normalize_search_text(query)
+    if not query:
+        return queryset
+
+    connection = connections[queryset.db]
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        return queryset.filter(search_text__contains=query).annotate(
+            search_rank=TrigramWordSimilarity(query, 'search_text')
+        ).order_by('-search_rank', '-created_at', '-id')
+
+    if connection.vendor == 'sqlite' and len(query) >= 3 and has_fts_table(connection):
+        match = '"' + query.replace('"', '""') + '"'
+        opts = queryset.model._meta
+        pk_column = f'{connection.ops.quote_name(opts.db_table)}.{connection.ops.quote_name(opts.pk.column)}'
+        # Matching rowids come from one FTS scan; bm25 rank (lower is better)
+        # is read per result by rowid
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {pk_column}', [match]
+            )
+        ).order_by('search_rank', '-created_at', '-id')
+
+    return queryset.filter(search_text__contains=query).order_by('-created_at', '-id')
@@ -0,0 +1,95 @@
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Shipment, UserProfile
+
+
+@receiver(post_delete, sender=Shipment)
+def update_shipment_aggregates(sender, instance, **kwargs):
+    """
+    Decrement the status counter, rollup buckets and courier workload of a
+    deleted shipment
+    A signal rather than Shipment.delete() so queryset deletes and cascades
+    (e.g. deleting the shipper) are counted too; it runs inside the delete's
+    transaction
+    """
+    from .state_machine import run_transition_hooks
+
+    run_transition_hooks([(instance, instance.status, instance.courier_id, None)])
+
+
+@receiver(pre_delete, sender=UserProfile)
+def release_courier_rollups(sender, instance, **kwargs):
+    """
+    Keep a deleted courier's shipments in the rollups, under the unassigned
+    buckets their shipments move to
+    """
+    from .rollups import release_courier
+
+    release_courier(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+def sync_recipient_links(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Link shipments to recipient accounts however the account was created or
+    its email changed (registration, admin, shell); saves that cannot change
+    the email or role (e.g. last_login updates) are skipped
+    """
+    from .recipients import sync_recipient_shipments
+
+    if update_fields is not None and not {'email', 'role'} & set(update_fields):
+        return
+    if created and not instance.email:
+        return
+    transaction.on_commit(lambda: sync_recipient_shipments(instance))
+
+
+@receiver(pre_save, sender=UserProfile)
+def note_username_change(sender, instance, update_fields=None, **kwargs):
+    """
+    Record whether a save renames the user or changes their email, both of
+    which are copied into their shipments' search text or tracking payloads
+    """
+    instance._username_changed = instance._email_changed = False
+    fields = {'username', 'email'}
+    if update_fields is not None:
+        fields &= set(update_fields)
+    if instance.pk is None or not fields:
+        return
+    old = UserProfile.objects.filter(pk=instance.pk).values_list('username', 'email').first()
+    if old is not None:
+        instance._username_changed = 'username' in fields and old[0] != instance.username
+        instance._email_changed = 'email' in fields and old[1] != instance.email
+
+
+@receiver(post_save, sender=UserProfile)
+def refresh_shipments_on_rename(sender, instance, **kwargs):
+    """
+    Shipment search text includes the shipper's username, and tracking
+    payloads the shipper's and courier's usernames and the shipper's email;
+    rebuild the search text once a rename commits and drop the cached payloads
+    """
+    from .search import refresh_shipper_search_text
+    from .tracking import invalidate_user_tracking_cache
+
+    username_changed = getattr(instance, '_username_changed', False)
+    email_changed = getattr(instance, '_email_changed', False)
+    instance._username_changed = instance._email_changed = False
+    if username_changed:
+        transaction.on_commit(lambda: refresh_shipper_search_text(instance.pk))
+    if username_changed or email_changed:
+        invalidate_user_tracking_cache(instance.pk)
+
+
+def ensure_search_index_after_migrate(sender, using, **kwargs):
+    """
+    Restore the SQLite FTS sync triggers after migrations, since rebuilding
+    core_shipment (e.g. to add a column) drops them
+    """
+    from .search import ensure_search_index, has_fts_table
+
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and has_fts_table(connection):
+        ensure_search_index(connection)
@@ -0,0 +1,306 @@
+"""
+Shipment state machine
+
+Who may move a shipment from which status to which is declared once, in
+RULES, as (role, from statuses, to statuses) rows. CREATED stands for a
+shipment that does not exist yet, and ANY for every existing status. At
+import the rules are compiled into frozen lookup tables keyed by
+(role, from_status):
+
+- NEXT_STATUSES: the allowed targets, in STATUS_CHOICES order, for listing
+- TRANSITIONS: every allowed (role, from, to) triple, for O(1) validation
+
+Every write path validates against these tables: Shipment.save (when given
+an actor), compare-and-set transitions, batch scans, bulk imports and
+automatic assignment. Afterwards each path hands its transitions to
+run_transition_hooks(). A transition is a (shipment, old status,
+old courier id, new status) tuple whose row is already written. The old
+status is None for a created shipment and the new status is None for a
+deleted one.
+
+Hooks are registered with @transition_hook and run in registration order,
+inside the caller's transaction, once per batch of transitions. Here that
+means the event log, the status counters and rollups, courier workloads and
+the status-change emails for admin updates. A hook can be limited to the
+roles whose changes it handles.
+"""
+import logging
+from collections import Counter
+from types import MappingProxyType
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Shipment, ShipmentEvent, ShipmentRollup, ShipmentStatusCounter
+
+logger = logging.getLogger(__name__)
+
+# Pseudo-status of a shipment that has not been created yet
+CREATED = None
+
+ANY = '*'
+
+# Role of changes made by the system itself (e.g. automatic assignment)
+SYSTEM_ROLE = 'system'
+
+RULES = [
+    # role, from statuses, to statuses
+    ('admin', [CREATED], ANY),
+    ('admin', ANY, ANY),
+    ('shipper', [CREATED], ['pending', 'accepted']),
+    ('courier', ['pending'], ['accepted']),
+    ('courier', ['accepted'], ['picked_up', 'hold']),
+    ('courier', ['picked_up'], ['in_transit', 'hold', 'returned']),
+    ('courier', ['in_transit'], ['hold', 'delivered', 'returned']),
+    ('courier', ['hold'], ['picked_up', 'in_transit', 'delivered', 'returned']),
+    # Returned packages restart the flow
+    ('courier', ['returned'], ['pending']),
+    (SYSTEM_ROLE, [CREATED], ['pending', 'accepted']),
+    (SYSTEM_ROLE, ['pending'], ['accepted']),
+]
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def compile_rules(rules, statuses):
+    """
+    Return (next statuses, transitions) lookup tables for a list of rules
+    Moving to the current status is not a transition and is never listed
+    """
+    allowed = {}
+    for role, from_statuses, to_statuses in rules:
+        sources = statuses if from_statuses == ANY else from_statuses
+        targets = statuses if to_statuses == ANY else to_statuses
+        for source in sources:
+            unknown = {source, *targets} - {CREATED, *statuses}
+            if unknown:
+                raise ValueError(f'Unknown statuses in state machine rules: {sorted(unknown, key=str)}')
+            allowed.setdefault((role, source), set()).update(
+                target for target in targets if target != source
+            )
+
+    next_statuses = MappingProxyType({
+        key: tuple(status for status in statuses if status in targets)
+        for key, targets in allowed.items()
+    })
+    transitions = frozenset(
+        (role, source, target)
+        for (role, source), targets in allowed.items()
+        for target in targets
+    )
+    return next_statuses, transitions
+
+
+NEXT_STATUSES, TRANSITIONS = compile_rules(RULES, tuple(code for code, _ in Shipment.STATUS_CHOICES))
+
+STATUS_LABELS = MappingProxyType(dict(Shipment.STATUS_CHOICES))
+
+
+def role_for(user):
+    """
+    State machine role of a user; changes without a user are the system's
+    """
+    if user is None:
+        return SYSTEM_ROLE
+    if user.is_staff or user.role == 'admin':
+        return 'admin'
+    return user.role
+
+
+def next_statuses(role, from_status):
+    """
+    Statuses a role may move a shipment in from_status to
+    """
+    return NEXT_STATUSES.get((role, from_status), ())
+
+
+def can_transition(role, from_status, to_status):
+    return from_status == to_status or (role, from_status, to_status) in TRANSITIONS
+
+
+def validate_transition(role, from_status, to_status):
+    """
+    Raise InvalidTransition unless the role may move a shipment from
+    from_status to to_status (staying put is always allowed)
+    """
+    if can_transition(role, from_status, to_status):
+        return
+    if from_status is CREATED:
+        raise InvalidTransition(f'Shipments cannot be created as {STATUS_LABELS.get(to_status, to_status)}')
+    allowed = next_statuses(role, from_status)
+    if not allowed:
+        raise InvalidTransition(f'No status change is allowed from {STATUS_LABELS[from_status]}')
+    raise InvalidTransition(f'Invalid status. Must be one of: {", ".join(allowed)}')
+
+
+_hooks = []
+
+
+def transition_hook(roles=None):
+    """
+    Register a function(transitions, role, actor, now) to run after
+    transitions are written; roles optionally limits it to changes made by
+    those roles
+    """
+    def register(hook):
+        _hooks.append((hook, frozenset(roles) if roles is not None else None))
+        return hook
+    return register
+
+
+def run_transition_hooks(transitions, role=SYSTEM_ROLE, actor=None, now=None):
+    """
+    Run the registered hooks for [(shipment, old status, old courier id,
+    new status)] transitions, within the caller's transaction
+    """
+    transitions = list(transitions)
+    if not transitions:
+        return
+    now = now or timezone.now()
+    for hook, roles in _hooks:
+        if roles is None or role in roles:
+            hook(transitions, role, actor, now)
+
+
+@transition_hook()
+def record_events(transitions, role, actor, now):
+    """
+    Append each status change to the shipment's event log
+    New shipments get a 'pending' event, plus one for their status if they
+    start further along
+    """
+    events = []
+    for shipment, old_status, _, status in transitions:
+        if status is None or status == old_status:
+            continue
+        statuses = [status]
+        if old_status is CREATED and status != 'pending':
+            statuses.insert(0, 'pending')
+        events.extend(
+            ShipmentEvent(
+                **ShipmentEvent.describe(shipment, event_status),
+                shipment=shipment,
+                status=event_status,
+                actor=actor,
+                created_at=now,
+            )
+            for event_status in statuses
+        )
+    ShipmentEvent.objects.bulk_create(events)
+
+
+@transition_hook()
+def adjust_status_aggregates(transitions, role, actor, now):
+    """
+    Move the status counters and rollup buckets with the shipments
+    """
+    counters = Counter()
+    rollups = []
+    for shipment, old_status, old_courier_id, status in transitions:
+        if old_status != status:
+            if old_status is not CREATED:
+                counters[old_status] -= 1
+            if status is not None:
+                counters[status] += 1
+        # Deleted shipments have left the rollup under their last courier
+        courier_id = shipment.courier_id if status is not None else old_courier_id
+        if (old_status, old_courier_id) != (status, courier_id):
+            if old_status is not CREATED:
+                rollups.append((shipment.created_at, old_status, old_courier_id, -1))
+            if status is not None:
+                rollups.append((shipment.created_at, status, courier_id, 1))
+
+    ShipmentStatusCounter.adjust({status: delta for status, delta in counters.items() if delta})
+    ShipmentRollup.adjust_many(rollups)
+
+
+@transition_hook()
+def adjust_courier_workloads(transitions, role, actor, now):
+    from .assignment import adjust_workload, workload_deltas
+
+    workload = Counter()
+    for shipment, old_status, old_courier_id, status in transitions:
+        courier_id = shipment.courier_id if status is not None else None
+        workload.update(workload_deltas(old_courier_id, old_status, courier_id, status))
+    adjust_workload({courier_id: delta for courier_id, delta in workload.items() if delta})
+
+
+@transition_hook(roles=['admin'])
+def notify_status_change(transitions, role, actor, now):
+    """
+    Email the shipper and recipient about status changes made by an admin,
+    once they commit
+    """
+    changed = [
+        (shipment, old_status, status)
+        for shipment, old_status, _, status in transitions
+        if old_status is not CREATED and status is not None and old_status != status
+    ]
+    if changed:
+        transaction.on_commit(lambda: [send_status_change_email(*change) for change in changed])
+
+
+def send_status_change_email(shipment, old_status, new_status):
+    """Send email notification about status change"""
+    # Prepare email recipients
+    recipients = []
+
+    # Add shipper email
+    if shipment.shipper.email:
+        recipients.append(shipment.shipper.email)
+
+    # Add recipient email if provided
+    if shipment.recipient_email:
+        recipients.append(shipment.recipient_email)
+
+    if not recipients:
+        return
+
+    # Prepare email content
+    subject = f'Shipment Update - {shipment.tracking_number}'
+
+    old_status_display = STATUS_LABELS.get(old_status, old_status)
+    new_status_display = STATUS_LABELS.get(new_status, new_status)
+
+    message = f'''
+Hello,
+
+Your shipment status has been updated:
+
+Tracking Number: {shipment.tracking_number}
+Previous Status: {old_status_display}
+New Status: {new_status_display}
+'''
+
+    # Add hold reason if status is hold
+    if new_status == 'hold' and shipment.hold_reason:
+        message += f'\nReason for Hold: {shipment.hold_reason}\n'
+
+    message += f'''
+Package Details:
+- From: {shipment.shipper.username}
+- To: {shipment.recipient_name}
+- Weight: {shipment.weight} kg
+
+You can track your shipment at any time using your tracking number.
+
+Thank you for using our service!
+
+Best regards,
+Nexpress Team
+    '''
+
+    try:
+        send_mail(
+            subject,
+            message,
+            getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@nexpress.com'),
+            recipients,
+            fail_silently=True,
+        )
+    except Exception:
+        logger.exception('Error sending status change email for %s', shipment.tracking_number)
@@ -11,3 +11,20 @@ def dict_get(dictionary, key):
     if dictionary is None:
         return None
     return dictionary.get(key, 0)
+
+
+@register.filter
+def duration(seconds):
+    """
+    Format a number of seconds compactly
+    Usage: {{ row.p50|duration }} -> "3h 20m", "2.5d"
+    """
+    if seconds is None:
+        return '-'
+    seconds = float(seconds)
+    if seconds < 3600:
+        return f'{seconds / 60:.0f}m'
+    if seconds < 86400:
+        hours, minutes = divmod(int(seconds) // 60, 60)
+        return f'{hours}h {minutes}m'
+    return f'{seconds / 86400:.1f}d'
@@ -1,3 +1,1883 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import re
+from collections import Counter
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pyarrow.parquet as pq
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core import mail
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from . import ratelimit, tracking_numbers
+from .analytics import (
+    PERCENTILES, compute_delivery_analytics, get_delivery_analytics, grouped_percentiles, load_transitions
+)
+from .assignment import LOCALITY_SLACK, assign_unassigned, build_workload_index, get_workload_index
+from .dashboard import get_dashboard_snapshot, get_shipment_stats, get_user_stats
+from .exports import EXPORT_COLUMNS, export_queryset, stream_export
+from .imports import ImportFormatError, import_shipments
+from .models import (
+    Shipment, ShipmentEvent, ShipmentQuerySet, ShipmentRollup, ShipmentStatusCounter, TrackingAlias, UserProfile
+)
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, encode_offset_cursor, keyset_filter
+from .recipients import find_recipient_user
+from .rollups import get_period_totals, rebuild_range
+from .routing import websocket_urlpatterns
+from .search import has_fts_table, search_shipments
+from .state_machine import NEXT_STATUSES, InvalidTransition, can_transition, next_statuses
+from .testutils import QueryPlanMixin
+from .tracking import (
+    TRACKING_BULK_CHUNK_SIZE, get_event_locations, get_tracking_payload, get_tracking_payloads,
+    get_tracking_validators, tracking_group_name
+)
+from .transitions import compare_and_set
+from .views import BulkTrackingAPIView, CourierDashboardView
+
+
+class TrackingNumberAllocationTests(TestCase):
+    """
+    Allocated numbers are unique, carry a check digit and can never match a
+    number issued before the allocator existed
+    """
+
+    def test_numbers_are_distinct_and_valid(self):
+        numbers = tracking_numbers.allocate_tracking_numbers(200) + [
+            tracking_numbers.next_tracking_number() for _ in range(5)
+        ]
+        self.assertEqual(len(set(numbers)), len(numbers))
+        for number in numbers:
+            self.assertTrue(tracking_numbers.is_valid_tracking_number(number))
+            # Legacy numbers are FD + 10 hex digits
+            self.assertNotEqual(len(number), 12)
+        self.assertFalse(tracking_numbers.is_valid_tracking_number('FD0123456789'))
+
+    def test_rolled_back_reservations_are_not_kept(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest('PostgreSQL sequence values are never rolled back')
+        tracking_numbers._block = iter(())
+        try:
+            with transaction.atomic():
+                first = tracking_numbers.next_tracking_number()
+                transaction.set_rollback(True)
+            self.assertIsNone(next(tracking_numbers._block, None))
+            # The rolled back value may be reissued; nothing was written with it
+            self.assertEqual(tracking_numbers.next_tracking_number(), first)
+        finally:
+            tracking_numbers._block = iter(())
+
+
+class AddressNormalizationTests(TestCase):
+    """
+    Addresses are parsed into columns that always fit their field
+    """
+
+    def test_long_components_fit_their_columns(self):
+        shipper = UserProfile.objects.create_user(username='shipper', password='x', role='shipper')
+        shipment = Shipment.objects.create(
+            shipper=shipper,
+            recipient_name='Recipient',
+            pickup_address=f'1 Marina Road, {"Victoria Island " * 10}, Lagos State, Nigeria',
+            delivery_address='2 Ring Road, Accra, GA, 00233, Ghana',
+            weight=1,
+        )
+        shipment.refresh_from_db()
+        self.assertEqual(len(shipment.pickup_city), 100)
+        self.assertTrue(shipment.pickup_city.startswith('Victoria Island'))
+        self.assertEqual((shipment.pickup_region, shipment.pickup_country), ('Lagos State', 'Nigeria'))
+        self.assertEqual(
+            (shipment.delivery_city, shipment.delivery_region, shipment.delivery_postcode, shipment.delivery_country),
+            ('Accra', 'GA', '00233', 'Ghana')
+        )
+
+
+class TrackingCacheTests(TestCase):
+    """
+    Tracking lookups, by current or previous number, are served from the
+    cache until a write to the shipment commits
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shipper = UserProfile.objects.create_user(username='shipper', password='x', role='shipper')
+        cls.courier = UserProfile.objects.create_user(username='courier', password='x', role='courier')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.shipment = Shipment.objects.create(
+            shipper=self.shipper,
+            courier=self.courier,
+            status='in_transit',
+            recipient_name='Recipient',
+            pickup_address='1 Marina Road, Lagos, Nigeria',
+            delivery_address='2 Ring Road, Accra, Ghana',
+            weight=1,
+        )
+
+    def update(self, **fields):
+        for field, value in fields.items():
+            setattr(self.shipment, field, value)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shipment.save()
+
+    def test_hit_after_miss(self):
+        number = self.shipment.tracking_number
+        with CaptureQueriesContext(connection) as miss:
+            payload = get_tracking_payload(number)
+        self.assertTrue(miss.captured_queries)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_tracking_payload(number.lower()), payload)
+            self.assertEqual(get_tracking_payloads([number]), {number: payload})
+
+    def test_commit_invalidates(self):
+        number = self.shipment.tracking_number
+        get_tracking_payload(number)
+        get_tracking_validators(number)
+
+        self.update(status='delivered')
+
+        self.assertEqual(get_tracking_payload(number)['status'], 'delivered')
+        self.assertEqual(get_tracking_validators(number)[1], self.shipment.updated_at)
+
+    def test_user_changes_invalidate(self):
+        number = self.shipment.tracking_number
+        get_tracking_payload(number)
+        etag = get_tracking_validators(number)[0]
+
+        for user, field, value in (
+            (self.courier, 'username', 'courier-renamed'),
+            (self.shipper, 'username', 'shipper-renamed'),
+            (self.shipper, 'email', 'shipper@example.com'),
+        ):
+            setattr(user, field, value)
+            with self.captureOnCommitCallbacks(execute=True):
+                user.save(update_fields=[field])
+
+            payload = get_tracking_payload(number)
+            self.assertNotEqual(get_tracking_validators(number)[0], etag, field)
+            etag = get_tracking_validators(number)[0]
+
+        self.assertEqual(payload['courier']['username'], 'courier-renamed')
+        self.assertEqual(payload['shipper'], {'username': 'shipper-renamed', 'email': 'shipper@example.com'})
+
+        # Saves that leave the names alone keep the cache
+        self.shipper.save(update_fields=['last_login'])
+        with self.assertNumQueries(0):
+            get_tracking_payload(number)
+
+    def test_previous_numbers_are_cached(self):
+        old_number = self.shipment.tracking_number
+        self.update(status='returned')
+        new_number = self.shipment.tracking_number
+
+        payload = get_tracking_payload(old_number)
+        validators = get_tracking_validators(old_number)
+        self.assertEqual(payload['tracking_number'], new_number)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_tracking_payload(old_number), payload)
+            self.assertEqual(get_tracking_payloads([old_number]), {old_number: payload})
+            self.assertEqual(get_tracking_validators(old_number), validators)
+
+        self.update(status='pending', courier=None)
+
+        self.assertEqual(get_tracking_payload(old_number)['status'], 'pending')
+        self.assertEqual(get_tracking_payloads([old_number])[old_number]['status'], 'pending')
+
+    def test_bulk_lookup_caches_previous_numbers(self):
+        old_number = self.shipment.tracking_number
+        self.update(status='returned')
+
+        payloads = get_tracking_payloads([old_number])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_tracking_payload(old_number), payloads[old_number])
+
+    def test_publish_errors_are_logged(self):
+        with mock.patch('core.tracking.get_channel_layer') as get_layer, \
+                self.assertLogs('core.tracking', level='ERROR') as logs:
+            get_layer.return_value.group_send = mock.AsyncMock(side_effect=RuntimeError('layer down'))
+            self.update(status='delivered')
+
+        self.assertIn(self.shipment.tracking_number, logs.output[0])
+
+
+@override_settings(RATELIMIT_ENABLED=False)
+class TrackingConditionalGetTests(TestCase):
+    """
+    Clients holding the current ETag get 304 Not Modified without the payload
+    being built, and a new ETag once the shipment changes
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shipper = UserProfile.objects.create_user(username='shipper', password='x', role='shipper')
+        cls.courier = UserProfile.objects.create_user(username='courier', password='x', role='courier')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.shipment = Shipment.objects.create(
+            shipper=self.shipper,
+            courier=self.courier,
+            status='in_transit',
+            recipient_name='Recipient',
+            pickup_address='1 Marina Road, Lagos, Nigeria',
+            delivery_address='2 Ring Road, Accra, Ghana',
+            weight=1,
+        )
+        self.url = f'/api/track/{self.shipment.tracking_number}/'
+
+    def test_matching_etag_is_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        self.assertIn('Last-Modified', response.headers)
+
+        with mock.patch('core.views.get_tracking_payload') as get_payload:
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.headers['ETag'], etag)
+        self.assertEqual(not_modified.content, b'')
+        get_payload.assert_not_called()
+
+        other = self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(other.status_code, 200)
+
+    def test_change_issues_new_etag(self):
+        etag = self.client.get(self.url).headers['ETag']
+
+        self.shipment.status = 'delivered'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shipment.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(response.json()['status'], 'delivered')
+
+    def test_unknown_number_is_not_found(self):
+        self.assertEqual(self.client.get('/api/track/FD0000000000/').status_code, 404)
+
+
+class LiveTrackingPushTests(TestCase):
+    """
+    Tracking changes are pushed to the shipment's group once they commit,
+    including to subscribers of its previous number
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shipper = UserProfile.objects.create_user(username='shipper', password='x', role='shipper')
+        cls.courier = UserProfile.objects.create_user(username='courier', password='x', role='courier')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.shipment = Shipment.objects.create(
+            shipper=self.shipper,
+            courier=self.courier,
+            status='in_transit',
+            recipient_name='Recipient',
+            pickup_address='1 Marina Road, Lagos, Nigeria',
+            delivery_address='2 Ring Road, Accra, Ghana',
+            weight=1,
+        )
+
+    def subscribe(self, tracking_number):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(tracking_group_name(tracking_number), channel)
+        return channel
+
+    def receive(self, channel, timeout=1):
+        async def receive():
+            return await asyncio.wait_for(get_channel_layer().receive(channel), timeout)
+        return async_to_sync(receive)()
+
+    def update(self, **fields):
+        for field, value in fields.items():
+            setattr(self.shipment, field, value)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shipment.save()
+
+    def test_changes_reach_current_and_previous_numbers(self):
+        old_number = self.shipment.tracking_number
+        channel = self.subscribe(old_number)
+
+        self.update(status='returned')
+
+        event = self.receive(channel)
+        self.assertEqual(event['type'], 'tracking_update')
+        self.assertEqual((event['tracking_number'], event['status']), (self.shipment.tracking_number, 'returned'))
+
+    def test_other_edits_are_not_pushed(self):
+        channel = self.subscribe(self.shipment.tracking_number)
+
+        self.update(notes='Leave at the door')
+
+        with self.assertRaises(asyncio.TimeoutError):
+            self.receive(channel, timeout=0.05)
+
+    def test_consumer_sends_snapshot_then_updates(self):
+        # Served from the cache, so the consumer's thread needs no database
+        get_tracking_payload(self.shipment.tracking_number)
+
+        async def session():
+            communicator = WebsocketCommunicator(
+                URLRouter(websocket_urlpatterns), f'/ws/track/{self.shipment.tracking_number.lower()}/'
+            )
+            connected, _ = await communicator.connect()
+            snapshot = await communicator.receive_json_from()
+            await get_channel_layer().group_send(
+                tracking_group_name(self.shipment.tracking_number),
+                {'type': 'tracking_update', 'tracking_number': self.shipment.tracking_number,
+                 'status': 'delivered', 'status_display': 'Delivered', 'courier': 'courier',
+                 'hold_reason': None, 'last_updated': None}
+            )
+            update = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return connected, snapshot, update
+
+        connected, snapshot, update = async_to_sync(session)()
+        self.assertTrue(connected)
+        self.assertEqual((snapshot['type'], snapshot['status']), ('snapshot', 'in_transit'))
+        self.assertEqual((update['type'], update['status']), ('update', 'delivered'))
+
+
+class TrackingAliasTests(TestCase):
+    """
+    Every number a shipment has had resolves to it in one query
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shipper = UserProfile.objects.create_user(username='shipper', password='x', role='shipper')
+        cls.courier = UserProfile.objects.create_user(username='courier', password='x', role='courier')
+
+    def test_previous_numbers_resolve(self):
+        shipment = Shipment.objects.create(
+            shipper=self.shipper,
+            courier=self.courier,
+            status='in_transit',
+            recipient_name='Recipient',
+            pickup_address='1 Marina Road, Lagos, Nigeria',
+            delivery_address='2 Ring Road, Accra, Ghana',
+            weight=1,
+        )
+        numbers = [shipment.tracking_number]
+        for status in ('returned', 'pending', 'accepted', 'in_transit', 'returned'):
+            shipment.status = status
+            shipment.save()
+            if shipment.tracking_number != numbers[-1]:
+                numbers.append(shipment.tracking_number)
+
+        self.assertEqual(len(numbers), 3)
+        self.assertEqual(
+            set(TrackingAlias.objects.filter(shipment=shipment).values_list('tracking_number', flat=True)),
+            set(numbers)
+        )
+        for number in numbers:
+            with self.assertNumQueries(1):
+                self.assertEqual(Shipment.objects.for_tracking_number(number.lower()).get(), shipment)
+        self.assertFalse(Shipment.objects.for_tracking_number('FD0000000000').exists())
+
+    @override_settings(RATELIMIT_ENABLED=False)
+    def test_api_answers_with_current_number(self):
+        shipment = Shipment.objects.create(
+            shipper=self.shipper,
+            courier=self.courier,
+            status='in_transit',
+            recipient_name='Recipient',
+            pickup_address='1 Marina Road, Lagos, Nigeria',
+            delivery_address='2 Ring Road, Accra, Ghana',
+            weight=1,
+        )
+        old_number = shipment.tracking_number
+        shipment.status = 'returned'
+        shipment.save()
+
+        response = self.client.get(f'/api/track/{old_number}/')
+        self.assertEqual(response.json()['tracking_number'], shipment.tracking_number)
+
+
+class ShipmentEventLogTests(TestCase):
+    """
+    Every status transition appends one event, and the tracking timeline is
+    read back from the log in order
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shipper = UserProfile.objects.create_user(username='shipper', password='x', role='shipper')
+        cls.courier = UserProfile.objects.create_user(username='courier', password='x', role='courier')
+
+    def test_transitions_are_logged_in_order(self):
+        shipment = Shipment.objects.create(
+            shipper=self.shipper,
+            courier=self.courier,
+            status='accepted',
+            recipient_name='Recipient',
+            pickup_address='1 Marina Road, Lagos, Nigeria',
+            delivery_address='2 Ring Road, Accra, Ghana',
+            weight=1,
+        )
+        shipment.status = 'picked_up'
+        shipment.save(actor=self.courier)
+        shipment.notes = 'Fragile'
+        shipment.save()
+
+        events = list(shipment.events.all())
+        self.assertEqual([event.status for event in events], ['pending', 'accepted', 'picked_up'])
+        self.assertEqual(events[-1].actor, self.courier)
+        self.assertEqual(
+            (events[-1].location, events[-1].description), ShipmentEvent.STATUS_LOCATIONS['picked_up']
+        )
+
+        shipment = Shipment.objects.get(pk=shipment.pk)
+        with self.assertNumQueries(1):
+            locations = get_event_locations(shipment)
+        self.assertEqual([location['status'] for location in locations], ['pending', 'accepted', 'picked_up'])
+
+    def test_events_are_append_only(self):
+        shipment = Shipment.objects.create(
+            shipper=self.shipper,
+            recipient_name='Recipient',
+            pickup_address='1 Marina Road, Lagos, Nigeria',
+            delivery_address='2 Ring Road, Accra, Ghana',
+            weight=1,
+        )
+        event = shipment.events.get()
+        event.description = 'Rewritten'
+        with self.assertRaises(ValueError):
+            event.save()
+
+
+class ShipmentDirtyFieldSaveTests(TestCase):
+    """
+    Saving a loaded shipment writes only its modified columns; a row deleted
+    in the meantime is reported instead of silently recreated
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shipper = UserProfile.objects.create_user(username='shipper', password='x', role='shipper')
+
+    def setUp(self):
+        self.shipment = Shipment.objects.create(
+            shipper=self.shipper,
+            recipient_name='Recipient',
+            pickup_address='1 Marina Road, Lagos, Nigeria',
+            delivery_address='2 Ring Road, Accra, Ghana',
+            weight=1,
+        )
+
+    def test_update_writes_changed_columns(self):
+        shipment = Shipment.objects.get(pk=self.shipment.pk)
+        shipment.notes = 'Leave at the door'
+        with CaptureQueriesContext(connection) as queries:
+            shipment.save()
+
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "core_shipment"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"notes"', updates[0])
+        self.assertNotIn('"recipient_name"', updates[0])
+        self.assertEqual(Shipment.objects.get(pk=shipment.pk).notes, 'Leave at the door')
+
+    def test_deleted_row_is_not_reinserted(self):
+        Shipment.objects.filter(pk=self.shipment.pk).delete()
+
+        self.shipment.notes = 'Changed'
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            self.shipment.save()
+        self.assertFalse(Shipment.objects.filter(pk=self.shipment.pk).exists())
+
+    def test_unloaded_shipment_without_row_is_inserted(self):
+        values = Shipment.objects.filter(pk=self.shipment.pk).values().get()
+        Shipment.objects.filter(pk=self.shipment.pk).delete()
+
+        Shipment(**values).save()
+
+        self.assertEqual(Shipment.objects.get(pk=self.shipment.pk).recipient_name, 'Recipient')
+
+
+class CourierDashboardQueryTests(TestCase):
+    """
+    The courier dashboard must not issue more queries as shipments grow
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shipper = UserProfile.objects.create_user(username='shipper', password='x', role='shipper')
+        cls.courier = UserProfile.objects.create_user(username='courier', password='x', role='courier')
+        for index in range(30):
+            Shipment.objects.create(
+                shipper=cls.shipper,
+                courier=cls.courier,
+                recipient_name=f'Recipient {index}',
+                pickup_address='1 Marina Road, Lagos, Nigeria',
+                delivery_address='2 Ring Road, Accra, Ghana',
+                weight=1,
+                status='delivered' if index % 3 == 0 else 'in_transit',
+            )
+
+    def render_dashboard(self, query='', **initkwargs):
+        request = RequestFactory().get(f'/courier/dashboard/{query}')
+        request.user = self.courier
+        response = CourierDashboardView.as_view(**initkwargs)(request)
+        response.render()
+        return response
+
+    def test_dashboard_uses_two_queries(self):
+        with self.assertNumQueries(2):
+            response = self.render_dashboard()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context_data['active_count'], 20)
+        self.assertEqual(response.context_data['completed_count'], 10)
+        self.assertEqual(len(response.context_data['my_shipments']), 20)
+        self.assertEqual(len(response.context_data['completed_shipments']), 10)
+
+    def test_completed_pages_use_two_queries(self):
+        first_page = self.render_dashboard(keyset_page_size=4).context_data['completed_shipments']
+        self.assertTrue(first_page.has_next())
+
+        with self.assertNumQueries(2):
+            response = self.render_dashboard(f'?cursor={first_page.next_cursor}', keyset_page_size=4)
+
+        second_page = response.context_data['completed_shipments']
+        self.assertEqual(len(response.context_data['my_shipments']), 20)
+        self.assertEqual(len(second_page), 4)
+        self.assertTrue(second_page.has_previous())
+        self.assertFalse({s.pk for s in first_page} & {s.pk for s in second_page})
+
+    def test_paging_back_keeps_newest_active_shipments(self):
+        newest_active = list(
+            Shipment.objects.filter(courier=self.courier).exclude(status='delivered')
+            .order_by('-created_at', '-id').values_list('pk', flat=True)[:5]
+        )
+        options = {'keyset_page_size': 4, 'active_limit': 5}
+
+        first = self.render_dashboard(**options).context_data
+        second = self.render_dashboard(f"?cursor={first['completed_shipments'].next_cursor}", **options).context_data
+        with self.assertNumQueries(2):
+            back = self.render_dashboard(f"?cursor={second['completed_shipments'].previous_cursor}", **options).context_data
+
+        for context in (first, second, back):
+            self.assertEqual([s.pk for s in context['my_shipments']], newest_active)
+            self.assertEqual(context['active_count'], 20)
+        self.assertEqual(
+            [s.pk for s in back['completed_shipments']],
+            [s.pk for s in first['completed_shipments']],
+        )
+        self.assertEqual(len(second['completed_shipments']), 4)
+        self.assertFalse(back['completed_shipments'].has_previous())
+        self.assertTrue(back['completed_shipments'].has_next())
+
+
+class ShipmentQueryPlanTests(QueryPlanMixin, TestCase):
+    """
+    Hot shipment queries must be served by an index
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shipper = UserProfile.objects.create_user(username='shipper', password='x', role='shipper')
+        cls.recipient = UserProfile.objects.create_user(username='recipient', password='x', role='recipient')
+        couriers = [
+            UserProfile.objects.create_user(username=f'courier{index}', password='x', role='courier')
+            for index in range(20)
+        ]
+        cls.courier = couriers[0]
+
+        statuses = ['pending', 'accepted', 'picked_up', 'in_transit', 'hold', 'delivered', 'delivered', 'returned']
+        shipments = []
+        for index in range(4000):
+            status = statuses[index % len(statuses)]
+            shipments.append(Shipment(
+                tracking_number=f'FDT{index:09d}',
+                shipper=cls.shipper,
+                courier=None if status == 'pending' and index % 3 else couriers[index % len(couriers)],
+                recipient_user=cls.recipient if index % 50 == 0 else None,
+                recipient_name=f'Recipient {index}',
+                search_text=f'fdt{index:09d} recipient {index} shipper',
+                pickup_address='1 Marina Road, Lagos, Nigeria',
+                delivery_address='2 Ring Road, Accra, Ghana',
+                weight=1,
+                status=status,
+            ))
+        Shipment.objects.bulk_create(shipments, batch_size=500)
+
+        first = Shipment.objects.order_by('pk').first()
+        ShipmentEvent.objects.bulk_create([
+            ShipmentEvent(shipment_id=first.pk + index % 500, status='in_transit', description='Scanned')
+            for index in range(2000)
+        ])
+        cls.analyze()
+
+    def test_courier_status_lookup(self):
+        self.assertUsesIndex(
+            Shipment.objects.filter(courier=self.courier, status='in_transit').order_by(),
+            'core_ship_courier_status_idx'
+        )
+
+    def test_courier_dashboard_counts(self):
+        self.assertUsesIndex(
+            Shipment.objects.filter(courier=self.courier).values('status').order_by()
+        )
+
+    def test_admin_list_by_status(self):
+        self.assertUsesIndex(
+            Shipment.objects.filter(status='in_transit').order_by('-created_at', '-id')[:21],
+            'core_ship_status_created_idx'
+        )
+
+    def test_admin_list_next_page(self):
+        boundary = Shipment.objects.filter(status='delivered').order_by('-created_at', '-id')[20]
+        _, condition, ordering = keyset_filter(encode_cursor('n', boundary.created_at, boundary.pk))
+        self.assertUsesIndex(
+            Shipment.objects.filter(condition, status='delivered').order_by(*ordering)[:21],
+            'core_ship_status_created_idx'
+        )
+
+    def test_unassigned_pending(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('SQLite cannot prove a bound status parameter matches the partial index')
+        self.assertUsesIndex(
+            Shipment.objects.filter(status='pending', courier__isnull=True).order_by('created_at')[:50],
+            'core_ship_unassigned_idx'
+        )
+
+    def test_recipient_shipments(self):
+        self.assertUsesIndex(
+            Shipment.objects.filter(recipient_user=self.recipient).order_by('-created_at', '-id')[:21],
+            'core_ship_recip_created_idx'
+        )
+
+    def test_tracking_lookup(self):
+        self.assertUsesIndex(Shipment.objects.for_tracking_number('FDT000000042'))
+
+    def test_recent_range(self):
+        since = timezone.now() - timedelta(hours=48)
+        self.assertUsesIndex(Shipment.objects.filter(created_at__gte=since).order_by('created_at'))
+
+    def test_shipment_events(self):
+        shipment = Shipment.objects.order_by('pk').first()
+        self.assertUsesIndex(ShipmentEvent.objects.filter(shipment=shipment))
+
+
+class ShipmentImportTests(TestCase):
+    """
+    Bulk imports validate every row and cost the same queries per batch
+    however many rows it holds
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shipper = UserProfile.objects.create_user(username='shipper', password='x', role='shipper')
+        cls.courier = UserProfile.objects.create_user(username='courier', password='x', role='courier')
+
+    def upload(self, rows):
+        lines = ['recipient_name,recipient_email,pickup_address,delivery_address,weight,courier']
+        lines += [','.join(row) for row in rows]
+        return io.BytesIO('\n'.join(lines).encode())
+
+    def valid_rows(self, count):
+        return [
+            (f'Recipient {index}', f'r{index}@example.com', '1 Marina Road Lagos', '2 Ring Road Accra', '1.5',
+             'courier' if index % 2 else '')
+            for index in range(count)
+        ]
+
+    def test_report_and_side_effects(self):
+        rows = self.valid_rows(2) + [
+            ('', 'not-an-email', 'short', '2 Ring Road Accra', '1.234', 'nobody'),
+            ('Heavy', '', '1 Marina Road Lagos', '2 Ring Road Accra', '1001', ''),
+        ]
+        report = import_shipments(self.upload(rows), 'csv', self.shipper, actor=self.shipper)
+
+        self.assertEqual(report['created'], 2)
+        self.assertEqual([error['row'] for error in report['errors']], [3, 4])
+        self.assertEqual(
+            set(report['errors'][0]['errors']),
+            {'recipient_name', 'recipient_email', 'pickup_address', 'weight', 'courier'}
+        )
+        self.assertEqual(list(report['errors'][1]['errors']), ['weight'])
+
+        shipments = Shipment.objects.filter(
+            tracking_number__in=[row['tracking_number'] for row in report['shipments']]
+        ).order_by('recipient_name')
+        self.assertEqual([s.status for s in shipments], ['pending', 'accepted'])
+        self.assertEqual(shipments[1].courier, self.courier)
+        self.assertEqual(ShipmentEvent.objects.filter(shipment__in=shipments).count(), 3)
+        self.assertEqual(ShipmentStatusCounter.get_counts()['accepted'], 1)
+
+    def test_unreadable_files_are_rejected(self):
+        self.client.force_login(self.shipper)
+        latin1 = io.BytesIO(
+            'recipient_name,pickup_address,delivery_address,weight\n'
+            'José Müller,1 Marina Road Lagos,2 Ring Road Accra,1\n'.encode('latin-1')
+        )
+        latin1.name = 'shipments.csv'
+        response = self.client.post('/shipment/import/?format=json', {'file': latin1})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('UTF-8', response.json()['error'])
+        self.assertFalse(Shipment.objects.exists())
+
+        oversized_field = io.BytesIO(b'recipient_name\n"' + b'x' * 200000 + b'"\n')
+        with self.assertRaises(ImportFormatError):
+            import_shipments(oversized_field, 'csv', self.shipper)
+
+    def test_json_lines_with_byte_order_mark(self):
+        row = {'recipient_name': 'Recipient', 'pickup_address': '1 Marina Road Lagos',
+               'delivery_address': '2 Ring Road Accra', 'weight': '2'}
+        upload = io.BytesIO(('\ufeff' + json.dumps(row) + '\n').encode())
+        self.assertEqual(import_shipments(upload, 'jsonl', self.shipper)['created'], 1)
+
+    def test_queries_do_not_grow_with_rows(self):
+        # The first import also creates the counter and rollup rows
+        import_shipments(self.upload(self.valid_rows(2)), 'csv', self.shipper)
+
+        with CaptureQueriesContext(connection) as small:
+            import_shipments(self.upload(self.valid_rows(4)), 'csv', self.shipper)
+        with CaptureQueriesContext(connection) as large:
+            # Small enough for SQLite to insert the batch in one statement
+            report = import_shipments(self.upload(self.valid_rows(20)), 'csv', self.shipper)
+
+        self.assertEqual(report['created'], 20)
+        self.assertEqual(len(large), len(small))
+
+
+class ShipmentScanBatchTests(TestCase):
+    """
+    Batch scans are validated per item and written with a fixed number of
+    queries however many parcels the batch holds
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shipper = UserProfile.objects.create_user(username='shipper', password='x', role='shipper')
+        cls.courier = UserProfile.objects.create_user(username='courier', password='x', role='courier')
+        cls.other = UserProfile.objects.create_user(username='other', password='x', role='courier')
+
+    def setUp(self):
+        self.client.force_login(self.courier)
+
+    def create(self, count, **kwargs):
+        return [
+            Shipment.objects.create(
+                shipper=self.shipper,
+                recipient_name=f'Recipient {index}',
+                pickup_address='1 Marina Road, Lagos, Nigeria',
+                delivery_address='2 Ring Road, Accra, Ghana',
+                weight=1,
+                **kwargs
+            )
+            for index in range(count)
+        ]
+
+    def scan(self, scans):
+        return self.client.post('/api/shipments/scan/', json.dumps({'scans': scans}), content_type='application/json')
+
+    def accept_and_pick_up(self, shipments):
+        return [
+            scan
+            for shipment in shipments
+            for scan in (
+                {'tracking_number': shipment.tracking_number, 'action': 'accept'},
+                {'tracking_number': shipment.tracking_number, 'action': 'update', 'status': 'picked_up'},
+            )
+        ]
+
+    def test_results_and_side_effects(self):
+        pending = self.create(2)
+        mine = self.create(1, courier=self.courier, status='in_transit')[0]
+        theirs = self.create(1, courier=self.other, status='accepted')[0]
+        old_number = mine.tracking_number
+
+        response = self.scan(self.accept_and_pick_up(pending) + [
+            {'tracking_number': mine.tracking_number, 'action': 'update', 'status': 'returned'},
+            {'tracking_number': theirs.tracking_number, 'action': 'update', 'status': 'picked_up'},
+            {'tracking_number': pending[0].tracking_number, 'action': 'update', 'status': 'delivered'},
+            {'tracking_number': 'FD0000000000', 'action': 'accept'},
+        ])
+        data = response.json()
+
+        self.assertEqual((data['updated'], data['failed']), (5, 3))
+        self.assertEqual(
+            [result.get('error') for result in data['results'][5:]],
+            ['You are not assigned to this shipment', 'Invalid status. Must be one of: in_transit, hold, returned',
+             'Shipment not found']
+        )
+        for shipment in pending:
+            shipment.refresh_from_db()
+            self.assertEqual((shipment.status, shipment.courier), ('picked_up', self.courier))
+            self.assertEqual(shipment.previous_status, 'accepted')
+            self.assertEqual(list(shipment.events.values_list('status', flat=True)), ['pending', 'accepted', 'picked_up'])
+
+        mine.refresh_from_db()
+        self.assertEqual((mine.status, mine.previous_status), ('returned', 'in_transit'))
+        self.assertNotEqual(mine.tracking_number, old_number)
+        self.assertEqual(data['results'][4]['tracking_number'], mine.tracking_number)
+        self.assertEqual(TrackingAlias.objects.filter(shipment=mine).count(), 2)
+
+        counts = ShipmentStatusCounter.get_counts()
+        self.assertEqual((counts['pending'], counts['picked_up'], counts['returned']), (0, 2, 1))
+
+    def test_previous_labels_resolve(self):
+        shipment = self.create(1, courier=self.courier, status='in_transit')[0]
+        old_number = shipment.tracking_number
+        self.scan([{'tracking_number': old_number, 'action': 'update', 'status': 'returned'}])
+
+        data = self.scan([{'tracking_number': old_number.lower(), 'action': 'update', 'status': 'pending'}]).json()
+
+        shipment.refresh_from_db()
+        self.assertEqual(data['updated'], 1)
+        self.assertEqual(shipment.status, 'pending')
+        self.assertNotEqual(shipment.tracking_number, old_number)
+        self.assertEqual(data['results'][0]['tracking_number'], shipment.tracking_number)
+
+    def test_queries_do_not_grow_with_scans(self):
+        # The first batch also creates the counter and rollup rows
+        self.scan(self.accept_and_pick_up(self.create(1)))
+
+        small, large = self.create(2), self.create(20)
+        with CaptureQueriesContext(connection) as few:
+            self.scan(self.accept_and_pick_up(small))
+        with CaptureQueriesContext(connection) as many:
+            response = self.scan(self.accept_and_pick_up(large))
+
+        self.assertEqual(response.json()['updated'], 40)
+        self.assertEqual(len(many), len(few))
+
+    def test_rejects_malformed_batches(self):
+        self.assertEqual(self.scan('not a list').status_code, 400)
+        self.client.force_login(self.shipper)
+        self.assertEqual(self.scan([]).status_code, 403)
+
+
+class CourierAssignmentTests(TestCase):
+    """
+    Automatic assignment spreads pending shipments over the least loaded
+    couriers, prefers local ones within the slack, skips full couriers and
+    leaves the same side effects as one save per shipment
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shipper = UserProfile.objects.create_user(username='shipper', password='x', role='shipper')
+        cls.admin = UserProfile.objects.create_user(username='admin', password='x', role='admin')
+        cls.couriers = [
+            UserProfile.objects.create_user(
+                username=f'courier{index}', password='x', role='courier',
+                email=f'courier{index}@example.com', address=f'{index} Broad Street, {city}, Nigeria'
+            )
+            for index, city in enumerate(['Lagos', 'Abuja', 'Ibadan'])
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def create(self, count, city='Kano', **kwargs):
+        return [
+            Shipment.objects.create(
+                shipper=self.shipper,
+                recipient_name=f'Recipient {index}',
+                pickup_address=f'{index} Market Road, {city}, Nigeria',
+                delivery_address='2 Ring Road, Accra, Ghana',
+                weight=1,
+                **kwargs
+            )
+            for index in range(count)
+        ]
+
+    def loads(self):
+        return Counter(
+            Shipment.objects.filter(courier__isnull=False, status='accepted').values_list('courier__username', flat=True)
+        )
+
+    def test_load_is_spread_in_batches(self):
+        self.create(2, courier=self.couriers[0], status='in_transit')
+        self.create(7)
+
+        batches = []
+        with self.captureOnCommitCallbacks(execute=True):
+            assigned = assign_unassigned(batch_size=3, progress=lambda pairs: batches.append(len(pairs)))
+
+        self.assertEqual((assigned, batches), (7, [3, 3, 1]))
+        # courier0 starts two shipments ahead, so everyone ends on three active shipments
+        self.assertEqual(self.loads(), {'courier0': 1, 'courier1': 3, 'courier2': 3})
+        index = get_workload_index()
+        self.assertEqual([index[courier.pk]['load'] for courier in self.couriers], [3, 3, 3])
+
+    def test_local_courier_preferred_within_slack(self):
+        self.create(5, city='Lagos')
+
+        assign_unassigned()
+
+        # Lagos keeps winning until it carries LOCALITY_SLACK more than the others
+        self.assertEqual(self.loads(), {'courier0': LOCALITY_SLACK + 1, 'courier1': 1})
+
+    def test_full_couriers_are_skipped(self):
+        self.create(2, courier=self.couriers[0], status='in_transit')
+        pending = self.create(5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(assign_unassigned(max_load=2), 4)
+
+        self.assertEqual(self.loads(), {'courier1': 2, 'courier2': 2})
+        self.assertEqual(Shipment.objects.get(pk=pending[-1].pk).status, 'pending')
+        self.assertEqual(assign_unassigned(max_load=2), 0)
+
+    def test_side_effects_match_rebuild(self):
+        pending = self.create(6)
+        get_workload_index()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(assign_unassigned(actor=self.admin, batch_size=4), 6)
+
+        for shipment in Shipment.objects.filter(pk__in=[shipment.pk for shipment in pending]):
+            self.assertEqual((shipment.status, shipment.previous_status), ('accepted', 'pending'))
+            self.assertEqual(list(shipment.events.values_list('status', flat=True)), ['pending', 'accepted'])
+
+        self.assertTrue(all(previous == actual for previous, actual in ShipmentStatusCounter.rebuild().values()))
+        rollups = set(ShipmentRollup.objects.filter(shipment_count__gt=0).values_list(
+            'granularity', 'bucket_start', 'status', 'courier_id', 'shipment_count'
+        ))
+        now = timezone.now()
+        rebuild_range(now - timedelta(days=1), now + timedelta(days=1))
+        self.assertEqual(rollups, set(ShipmentRollup.objects.filter(shipment_count__gt=0).values_list(
+            'granularity', 'bucket_start', 'status', 'courier_id', 'shipment_count'
+        )))
+        self.assertEqual(get_workload_index(), build_workload_index())
+
+        # One summary email per courier and batch, listing their shipments
+        self.assertEqual(
+            Counter(message.to[0] for message in mail.outbox),
+            {'courier0@example.com': 1, 'courier1@example.com': 2, 'courier2@example.com': 2}
+        )
+        first = next(message for message in mail.outbox if message.to == ['courier0@example.com'])
+        self.assertEqual(first.subject, '2 new shipment(s) assigned to you')
+
+    def test_command_and_view(self):
+        self.create(3)
+        out = io.StringIO()
+        call_command('assign_shipments', '--limit', '2', '--refresh-index', stdout=out)
+        self.assertIn('Assigned 2 shipments to couriers', out.getvalue())
+
+        self.client.force_login(self.admin)
+        response = self.client.post('/manage/shipments/auto-assign/')
+        self.assertRedirects(response, '/manage/shipments/', fetch_redirect_response=False)
+        self.assertFalse(Shipment.objects.filter(status='pending').exists())
+
+
+class CompareAndSetTransitionTests(TestCase):
+    """
+    Accepting and admin updates are one conditional UPDATE; whoever loses a
+    race is told so instead of overwriting the winner
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shipper = UserProfile.objects.create_user(username='shipper', password='x', role='shipper')
+        cls.courier = UserProfile.objects.create_user(username='courier', password='x', role='courier')
+        cls.rival = UserProfile.objects.create_user(username='rival', password='x', role='courier')
+        cls.admin = UserProfile.objects.create_user(username='admin', password='x', role='admin')
+
+    def setUp(self):
+        self.shipment = Shipment.objects.create(
+            shipper=self.shipper,
+            recipient_name='Recipient',
+            pickup_address='1 Marina Road, Lagos, Nigeria',
+            delivery_address='2 Ring Road, Accra, Ghana',
+            weight=1,
+        )
+
+    def accept(self, courier):
+        self.client.force_login(courier)
+        return self.client.post(
+            f'/api/shipment/{self.shipment.tracking_number}/update/',
+            json.dumps({'action': 'accept'}),
+            content_type='application/json'
+        )
+
+    def test_accept_reads_nothing_before_writing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.accept(self.courier)
+
+        self.assertTrue(response.json()['success'])
+        shipment_queries = [q['sql'] for q in queries if re.search(r'\bFROM "core_shipment"|UPDATE "core_shipment"', q['sql'])]
+        self.assertEqual(len(shipment_queries), 1)
+        self.assertTrue(shipment_queries[0].startswith('UPDATE'))
+
+    def test_second_accept_loses(self):
+        self.assertTrue(self.accept(self.courier).json()['success'])
+        response = self.accept(self.rival)
+
+        self.assertEqual(response.status_code, 400)
+        self.shipment.refresh_from_db()
+        self.assertEqual(self.shipment.courier, self.courier)
+        self.assertEqual(list(self.shipment.events.values_list('status', flat=True)), ['pending', 'accepted'])
+        counts = ShipmentStatusCounter.get_counts()
+        self.assertEqual((counts['pending'], counts['accepted']), (0, 1))
+
+    def test_stale_admin_update_is_rejected(self):
+        self.accept(self.courier)
+        self.client.force_login(self.admin)
+        url = f'/manage/shipment/{self.shipment.tracking_number}/update/'
+
+        # Form opened while the shipment was still pending
+        self.client.post(url, {'status': 'hold', 'hold_reason': 'Weather', 'expected_status': 'pending', 'expected_courier': ''})
+        self.shipment.refresh_from_db()
+        self.assertEqual(self.shipment.status, 'accepted')
+
+        self.client.post(url, {
+            'status': 'hold', 'hold_reason': 'Weather', 'courier': self.rival.pk,
+            'expected_status': 'accepted', 'expected_courier': self.courier.pk,
+        })
+        self.shipment.refresh_from_db()
+        self.assertEqual(
+            (self.shipment.status, self.shipment.previous_status, self.shipment.hold_reason, self.shipment.courier),
+            ('hold', 'accepted', 'Weather', self.rival)
+        )
+
+
+    def test_previous_tracking_numbers_resolve(self):
+        self.shipment.status, self.shipment.courier = 'in_transit', self.courier
+        self.shipment.save()
+        old_number = self.shipment.tracking_number
+
+        returned = compare_and_set(old_number, 'in_transit', self.courier.pk, actor=self.courier, status='returned')
+        self.assertNotEqual(returned.tracking_number, old_number)
+
+        restarted = compare_and_set(old_number, 'returned', self.courier.pk, actor=self.courier, status='pending')
+        self.assertEqual((restarted.pk, restarted.status), (self.shipment.pk, 'pending'))
+        self.assertEqual(restarted.tracking_number, returned.tracking_number)
+
+    def test_lost_return_allocates_no_number(self):
+        with mock.patch('core.tracking_numbers.next_tracking_number') as next_number:
+            result = compare_and_set(
+                self.shipment.tracking_number, 'in_transit', self.courier.pk, actor=self.courier, status='returned'
+            )
+        self.assertIsNone(result)
+        next_number.assert_not_called()
+
+    def test_locked_fallback_matches_returning(self):
+        # The path used on backends without UPDATE ... RETURNING
+        with mock.patch.object(ShipmentQuerySet, 'update_returning', ShipmentQuerySet.update_returning_locked):
+            self.assertTrue(self.accept(self.courier).json()['success'])
+            self.assertEqual(self.accept(self.rival).status_code, 400)
+
+        self.shipment.refresh_from_db()
+        self.assertEqual((self.shipment.status, self.shipment.courier), ('accepted', self.courier))
+        self.assertEqual(ShipmentStatusCounter.get_counts()['accepted'], 1)
+
+
+class ShipmentStateMachineTests(TestCase):
+    """
+    The compiled transition tables drive every write path
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shipper = UserProfile.objects.create_user(
+            username='shipper', password='x', role='shipper', email='shipper@example.com'
+        )
+        cls.courier = UserProfile.objects.create_user(username='courier', password='x', role='courier')
+        cls.admin = UserProfile.objects.create_user(username='admin', password='x', role='admin')
+
+    def create(self, **kwargs):
+        return Shipment.objects.create(
+            shipper=self.shipper,
+            recipient_name='Recipient',
+            pickup_address='1 Marina Road, Lagos, Nigeria',
+            delivery_address='2 Ring Road, Accra, Ghana',
+            weight=1,
+            **kwargs
+        )
+
+    def test_tables_are_frozen(self):
+        with self.assertRaises(TypeError):
+            NEXT_STATUSES[('courier', 'delivered')] = ('pending',)
+        self.assertEqual(next_statuses('courier', 'in_transit'), ('hold', 'delivered', 'returned'))
+        self.assertEqual(next_statuses('recipient', 'pending'), ())
+        self.assertTrue(can_transition('admin', 'delivered', 'pending'))
+        self.assertFalse(can_transition('courier', 'delivered', 'pending'))
+
+    def test_get_next_statuses(self):
+        shipment = self.create(courier=self.courier, status='picked_up')
+        self.assertEqual(shipment.get_next_statuses(self.courier), ['in_transit', 'hold', 'returned'])
+        self.assertEqual(len(shipment.get_next_statuses(self.admin)), len(Shipment.STATUS_CHOICES) - 1)
+        self.assertEqual(shipment.get_next_statuses(self.shipper), [])
+
+    def test_save_validates_user_changes(self):
+        shipment = self.create(courier=self.courier, status='delivered')
+        shipment.status = 'pending'
+        with self.assertRaises(InvalidTransition):
+            shipment.save(actor=self.courier)
+
+        shipment.save(actor=self.admin)
+        shipment.refresh_from_db()
+        self.assertEqual(shipment.status, 'pending')
+
+    def test_courier_update_follows_flow(self):
+        shipment = self.create(courier=self.courier, status='accepted')
+        self.client.force_login(self.courier)
+        url = f'/api/shipment/{shipment.tracking_number}/update/'
+
+        response = self.client.post(url, json.dumps({'action': 'update', 'status': 'delivered'}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Invalid status. Must be one of: picked_up, hold')
+
+        response = self.client.post(url, json.dumps({'action': 'update', 'status': 'picked_up'}), content_type='application/json')
+        self.assertEqual(response.json()['status'], 'picked_up')
+
+    def test_admin_status_change_emails_once(self):
+        shipment = self.create(status='pending')
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/manage/shipment/{shipment.tracking_number}/update/', {'status': 'delivered'})
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['shipper@example.com'])
+        self.assertIn('New Status: Delivered', mail.outbox[0].body)
+
+    def test_delete_runs_hooks(self):
+        shipment = self.create(courier=self.courier, status='in_transit')
+        self.assertEqual(ShipmentStatusCounter.get_counts()['in_transit'], 1)
+        shipment.delete()
+        self.assertEqual(ShipmentStatusCounter.get_counts()['in_transit'], 0)
+
+
+@override_settings(RATELIMIT_ENABLED=False)
+class BulkTrackingAPITests(TestCase):
+    """
+    Bulk tracking answers once per distinct number, in request order, with
+    not-found entries, and resolves misses with a bounded query per chunk
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shipper = UserProfile.objects.create_user(username='shipper', password='x', role='shipper')
+        cls.courier = UserProfile.objects.create_user(username='courier', password='x', role='courier')
+        cls.shipments = [
+            Shipment.objects.create(
+                shipper=cls.shipper,
+                courier=cls.courier,
+                status='in_transit',
+                recipient_name=f'Recipient {index}',
+                pickup_address='1 Marina Road, Lagos, Nigeria',
+                delivery_address='2 Ring Road, Accra, Ghana',
+                weight=1,
+            )
+            for index in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def track(self, body):
+        return self.client.post('/api/track/bulk/', json.dumps(body), content_type='application/json')
+
+    def test_found_and_missing(self):
+        first, second = (shipment.tracking_number for shipment in self.shipments)
+        response = self.track({'tracking_numbers': [second, 'FD0000000000', first]})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['count'], data['found'], data['not_found']), (3, 2, 1))
+        self.assertEqual([result['tracking_number'] for result in data['results']], [second, 'FD0000000000', first])
+        self.assertEqual(data['results'][1], {
+            'success': False, 'error': 'Shipment not found', 'tracking_number': 'FD0000000000',
+        })
+        self.assertEqual(data['results'][0]['recipient']['name'], 'Recipient 1')
+
+    def test_previous_number(self):
+        shipment = Shipment.objects.get(pk=self.shipments[0].pk)
+        old_number = shipment.tracking_number
+        shipment.status = 'returned'
+        shipment.save()
+        self.assertNotEqual(shipment.tracking_number, old_number)
+
+        for attempt in ('miss', 'hit'):
+            data = self.track({'tracking_numbers': [old_number, shipment.tracking_number]}).json()
+            self.assertEqual(data['found'], 2, attempt)
+            self.assertEqual([result['tracking_number'] for result in data['results']], [shipment.tracking_number] * 2)
+            self.assertEqual(data['results'][0]['status'], 'returned')
+
+    def test_duplicates_and_case_variants(self):
+        number = self.shipments[0].tracking_number
+        data = self.track({'tracking_numbers': [number, number.lower(), f' {number} ', number]}).json()
+
+        self.assertEqual((data['count'], data['found']), (1, 1))
+        self.assertEqual(data['results'][0]['tracking_number'], number)
+
+    def test_numbers_beyond_one_chunk(self):
+        missing = [f'FD{index:010d}' for index in range(TRACKING_BULK_CHUNK_SIZE)]
+        numbers = [self.shipments[0].tracking_number] + missing + [self.shipments[1].tracking_number]
+
+        # Alias lookup, shipment fetch and event prefetch per chunk
+        with self.assertNumQueries(6):
+            data = self.track({'tracking_numbers': numbers}).json()
+
+        self.assertEqual(data['count'], len(numbers))
+        self.assertEqual(data['found'], 2)
+        self.assertEqual(data['results'][-1]['tracking_number'], self.shipments[1].tracking_number)
+
+    def test_invalid_bodies_are_rejected(self):
+        number = self.shipments[0].tracking_number
+        for body in ({'tracking_numbers': number}, {'tracking_numbers': [number, 1]}, {}):
+            response = self.track(body)
+            self.assertEqual(response.status_code, 400, body)
+            self.assertEqual(response.json()['error'], 'tracking_numbers must be a list of strings')
+
+        response = self.client.post('/api/track/bulk/', '{', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_too_many_numbers_are_rejected(self):
+        limit = BulkTrackingAPIView.MAX_TRACKING_NUMBERS
+        with self.assertNumQueries(0):
+            response = self.track({'tracking_numbers': [f'FD{index:010d}' for index in range(limit + 1)]})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(limit), response.json()['error'])
+
+
+@override_settings(
+    RATELIMIT_ENABLED=True,
+    RATELIMIT_CACHE_ALIAS=None,
+    RATELIMIT_API_KEYS=['partner-key'],
+    RATELIMIT_RATES={'tracking': {'ip': (5, 0.1), 'api_key': (10, 1.0)}},
+)
+class BulkTrackingRateLimitTests(TestCase):
+    """
+    Bulk tracking is charged per tracking number; a batch the client's bucket
+    could never pay for is rejected outright instead of throttled forever
+    """
+
+    def setUp(self):
+        ratelimit._limiter = None
+        self.addCleanup(setattr, ratelimit, '_limiter', None)
+
+    def track(self, count, **headers):
+        return self.client.post(
+            '/api/track/bulk/',
+            json.dumps({'tracking_numbers': [f'FD{index:010d}' for index in range(count)]}),
+            content_type='application/json',
+            **headers
+        )
+
+    def test_throttled_batch_gets_retry_after(self):
+        self.assertEqual(self.track(4).status_code, 200)
+
+        response = self.track(3)
+        self.assertEqual(response.status_code, 429)
+        # 1 token left, 2 more at 0.1 tokens per second
+        self.assertEqual(response.headers['Retry-After'], '20')
+        self.assertEqual(response.json()['retry_after'], 20)
+
+    def test_oversized_batch_is_rejected(self):
+        response = self.track(6)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['max_cost'], 5)
+        self.assertNotIn('Retry-After', response.headers)
+
+        # Nothing was charged, and API keys get their larger bucket
+        self.assertEqual(self.track(5).status_code, 200)
+        self.assertEqual(self.track(6, HTTP_X_API_KEY='partner-key').status_code, 200)
+
+    def test_admin_stats(self):
+        self.track(4)
+        self.track(3)
+        admin = UserProfile.objects.create_user(username='admin', password='x', role='admin')
+        self.client.force_login(admin)
+
+        response = self.client.get('/manage/ratelimit/')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['enabled'])
+        self.assertEqual(data['scopes']['tracking'], {'allowed': 1, 'throttled': 1})
+
+
+class RateLimitStoreTests(TestCase):
+    """
+    Bucket stores keep partially drained buckets until they would have
+    refilled, and shared stores report every worker's counters
+    """
+
+    rates = {'tracking': {'ip': (5, 1.0), 'api_key': (10, 0.1)}}
+
+    def test_prune_keeps_slow_buckets_until_refilled(self):
+        store = ratelimit.LocalBucketStore()
+        with mock.patch.object(ratelimit, 'MAX_LOCAL_BUCKETS', 1), \
+                mock.patch.object(ratelimit.time, 'monotonic') as monotonic:
+            monotonic.return_value = 0
+            store.consume('tracking:api_key:partner', 10, 0.1, 10)
+
+            # An IP bucket (full again after 5 s) triggers the prune 50 s later;
+            # the API key bucket needs 100 s to refill and must survive it
+            monotonic.return_value = 50
+            store.consume('tracking:ip:10.0.0.1', 5, 1.0, 1)
+            self.assertEqual(store.consume('tracking:api_key:partner', 10, 0.1, 10), (False, 50))
+
+            monotonic.return_value = 200
+            store.consume('tracking:ip:10.0.0.2', 5, 1.0, 1)
+            self.assertEqual(set(store._buckets), {'tracking:ip:10.0.0.2'})
+
+    def test_shared_counters_are_read_by_every_worker(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+        worker = ratelimit.TokenBucketLimiter(ratelimit.CacheBucketStore('default'), self.rates)
+        for _ in range(6):
+            worker.check(request, 'tracking')
+
+        other = ratelimit.TokenBucketLimiter(ratelimit.CacheBucketStore('default'), self.rates)
+        self.assertEqual(other.stats(), {'tracking': {'allowed': 5, 'throttled': 1}})
+
+
+class ShipmentStatusCounterTests(TestCase):
+    """
+    Status counters follow every create, transition and delete, however the
+    write is made, and agree with a rebuild
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shipper = UserProfile.objects.create_user(username='shipper', password='x', role='shipper')
+        cls.courier = UserProfile.objects.create_user(username='courier', password='x', role='courier')
+
+    def create(self, shipper=None, **kwargs):
+        return Shipment.objects.create(
+            shipper=shipper or self.shipper,
+            recipient_name='Recipient',
+            pickup_address='1 Marina Road, Lagos, Nigeria',
+            delivery_address='2 Ring Road, Accra, Ghana',
+            weight=1,
+            **kwargs
+        )
+
+    def assertCounts(self, **expected):
+        counts = ShipmentStatusCounter.get_counts()
+        self.assertEqual({status: count for status, count in counts.items() if count}, expected)
+        self.assertEqual(Counter(Shipment.objects.values_list('status', flat=True)), Counter(expected))
+        self.assertTrue(all(previous == actual for previous, actual in ShipmentStatusCounter.rebuild().values()))
+
+    def test_create_transition_and_delete(self):
+        first = self.create()
+        second = self.create(courier=self.courier, status='accepted')
+        self.assertCounts(pending=1, accepted=1)
+
+        second.status = 'picked_up'
+        second.save(actor=self.courier)
+        compare_and_set(first.tracking_number, 'pending', None, actor=self.courier, status='accepted', courier=self.courier)
+        self.assertCounts(accepted=1, picked_up=1)
+
+        # Unchanged statuses move nothing
+        second.notes = 'Fragile'
+        second.save()
+        self.assertCounts(accepted=1, picked_up=1)
+
+        second.delete()
+        self.assertCounts(accepted=1)
+
+    def test_queryset_and_cascade_deletes(self):
+        other = UserProfile.objects.create_user(username='other', password='x', role='shipper')
+        self.create()
+        self.create(status='hold')
+        self.create(shipper=other, status='delivered')
+        self.create(shipper=other)
+
+        Shipment.objects.filter(status='hold').delete()
+        self.assertCounts(pending=2, delivered=1)
+
+        other.delete()
+        self.assertCounts(pending=1)
+
+
+class KeysetPaginationTests(TestCase):
+    """
+    Cursors walk every shipment exactly once in both directions, ties on
+    created_at included, and tampered cursors are rejected
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = UserProfile.objects.create_user(username='admin', password='x', role='admin')
+        shipper = UserProfile.objects.create_user(username='shipper', password='x', role='shipper')
+        for index in range(45):
+            Shipment.objects.create(
+                shipper=shipper,
+                recipient_name=f'Recipient {index}',
+                pickup_address='1 Marina Road, Lagos, Nigeria',
+                delivery_address='2 Ring Road, Accra, Ghana',
+                weight=1,
+            )
+        # Page boundaries fall inside runs of equal timestamps
+        start = timezone.now() - timedelta(days=1)
+        for index, pk in enumerate(Shipment.objects.order_by('pk').values_list('pk', flat=True)):
+            Shipment.objects.filter(pk=pk).update(created_at=start + timedelta(minutes=index // 7))
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def page(self, cursor=None):
+        response = self.client.get('/api/shipments/', {'cursor': cursor} if cursor else {})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def numbers(self, page):
+        return [result['tracking_number'] for result in page['results']]
+
+    def test_round_trip(self):
+        expected = list(Shipment.objects.order_by('-created_at', '-id').values_list('tracking_number', flat=True))
+
+        pages = [self.page()]
+        while pages[-1]['next_cursor']:
+            pages.append(self.page(pages[-1]['next_cursor']))
+        self.assertEqual([page['count'] for page in pages], [20, 20, 5])
+        self.assertEqual([number for page in pages for number in self.numbers(page)], expected)
+        self.assertIsNone(pages[0]['previous_cursor'])
+
+        back = self.page(pages[-1]['previous_cursor'])
+        self.assertEqual(self.numbers(back), self.numbers(pages[1]))
+        self.assertEqual(self.numbers(self.page(back['previous_cursor'])), self.numbers(pages[0]))
+
+    def test_tampered_cursor(self):
+        cursor = self.page()['next_cursor']
+        direction, created_at, pk = decode_cursor(cursor)
+        self.assertEqual(encode_cursor(direction, created_at, pk), cursor)
+
+        for tampered in (cursor[:-3], 'not-a-cursor', encode_offset_cursor(20), encode_cursor('x', created_at, pk)):
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(tampered)
+            response = self.client.get('/api/shipments/', {'cursor': tampered})
+            self.assertEqual(response.status_code, 400)
+
+        # HTML lists fall back to the first page
+        page = self.client.get('/manage/shipments/', {'cursor': 'not-a-cursor'}).context['page_obj']
+        self.assertFalse(page.has_previous())
+
+
+class ShipmentExportTests(TestCase):
+    """
+    Exports hold every shipment in the date range with its status history,
+    whatever the chunk size, in CSV and Parquet alike
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = UserProfile.objects.create_user(username='admin', password='x', role='admin')
+        cls.shipper = UserProfile.objects.create_user(username='shipper', password='x', role='shipper')
+        cls.courier = UserProfile.objects.create_user(username='courier', password='x', role='courier')
+        for index in range(5):
+            shipment = Shipment.objects.create(
+                shipper=cls.shipper,
+                recipient_name=f'Recipient {index}',
+                pickup_address='1 Marina Road, Lagos, Nigeria',
+                delivery_address='2 Ring Road, Accra, Ghana',
+                weight='1.25',
+            )
+        shipment.courier = cls.courier
+        shipment.status = 'accepted'
+        shipment.save()
+        cls.shipment = shipment
+        cls.old = Shipment.objects.create(
+            shipper=cls.shipper,
+            recipient_name='Old Recipient',
+            pickup_address='1 Marina Road, Lagos, Nigeria',
+            delivery_address='2 Ring Road, Accra, Ghana',
+            weight=1,
+        )
+        Shipment.objects.filter(pk=cls.old.pk).update(created_at=timezone.now() - timedelta(days=30))
+
+    def recent(self):
+        return export_queryset(start=timezone.localdate() - timedelta(days=7))
+
+    def test_csv(self):
+        rows = list(csv.DictReader(io.StringIO(''.join(stream_export(self.recent(), 'csv', chunk_size=2)))))
+
+        self.assertEqual(list(rows[0]), EXPORT_COLUMNS)
+        self.assertEqual([row['recipient_name'] for row in rows], [f'Recipient {index}' for index in range(5)])
+        row = rows[-1]
+        self.assertEqual(
+            (row['tracking_number'], row['status'], row['shipper'], row['courier'], row['weight']),
+            (self.shipment.tracking_number, 'accepted', 'shipper', 'courier', '1.25')
+        )
+        self.assertEqual(row['pickup_city'], 'Lagos')
+        self.assertEqual([entry.split('@')[0] for entry in row['status_history'].split('; ')], ['pending', 'accepted'])
+        self.assertEqual(rows[0]['courier'], '')
+
+    def test_parquet(self):
+        table = pq.read_table(io.BytesIO(b''.join(stream_export(self.recent(), 'parquet', chunk_size=2))))
+
+        self.assertEqual(table.column_names, EXPORT_COLUMNS)
+        self.assertEqual(table.num_rows, 5)
+        row = table.to_pylist()[-1]
+        self.assertEqual(
+            (row['tracking_number'], row['courier'], row['weight']), (self.shipment.tracking_number, 'courier', 1.25)
+        )
+        self.assertEqual(row['created_at'], Shipment.objects.get(pk=self.shipment.pk).created_at)
+
+    def test_view_streams_filtered_export(self):
+        self.client.force_login(self.admin)
+        response = self.client.get('/manage/shipments/export/', {'format': 'csv', 'status': 'pending'})
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment;', response.headers['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 5)
+        self.assertIn(self.old.tracking_number, {row['tracking_number'] for row in rows})
+
+        self.assertEqual(self.client.get('/manage/shipments/export/', {'format': 'xlsx'}).status_code, 400)
+        self.assertEqual(self.client.get('/manage/shipments/export/', {'start': 'yesterday'}).status_code, 400)
+
+
+class DeliveryAnalyticsTests(TestCase):
+    """
+    Vectorized delivery metrics agree with a per-shipment computation
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        shipper = UserProfile.objects.create_user(username='shipper', password='x', role='shipper')
+        cls.couriers = [
+            UserProfile.objects.create_user(username=f'courier{index}', password='x', role='courier')
+            for index in range(2)
+        ]
+        start = timezone.now() - timedelta(days=2)
+        # (courier, [(status, hours after start)])
+        cls.timelines = [
+            (0, [('pending', 0), ('accepted', 1), ('picked_up', 2), ('in_transit', 3), ('delivered', 10)]),
+            (0, [('pending', 0), ('accepted', 1), ('picked_up', 4), ('hold', 5), ('in_transit', 8), ('delivered', 9)]),
+            (1, [('pending', 0), ('accepted', 2), ('picked_up', 3), ('hold', 4), ('picked_up', 6), ('delivered', 30)]),
+            (1, [('pending', 0), ('accepted', 1), ('picked_up', 2)]),
+            (None, [('pending', 0)]),
+        ]
+        events = []
+        for courier, timeline in cls.timelines:
+            shipment = Shipment.objects.create(
+                shipper=shipper,
+                courier=None if courier is None else cls.couriers[courier],
+                status=timeline[-1][0],
+                recipient_name='Recipient',
+                pickup_address='1 Marina Road, Lagos, Nigeria',
+                delivery_address='2 Ring Road, Accra, Ghana',
+                weight=1,
+            )
+            events.extend(
+                ShipmentEvent(shipment=shipment, status=status, created_at=start + timedelta(hours=hours))
+                for status, hours in timeline
+            )
+        ShipmentEvent.objects.all().delete()
+        ShipmentEvent.objects.bulk_create(events)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_grouped_percentiles_match_numpy(self):
+        rng = np.random.default_rng(0)
+        keys = rng.integers(0, 7, 500)
+        values = rng.exponential(3600, 500)
+
+        groups, counts, matrix = grouped_percentiles(keys, values)
+        for group, count, row in zip(groups, counts, matrix):
+            self.assertEqual(count, (keys == group).sum())
+            np.testing.assert_allclose(row, np.percentile(values[keys == group], PERCENTILES))
+
+    def test_metrics_match_timelines(self):
+        analytics = compute_delivery_analytics(load_transitions())
+
+        self.assertEqual(analytics['event_count'], sum(len(timeline) for _, timeline in self.timelines))
+        self.assertEqual(analytics['shipment_count'], 5)
+
+        delivery = {}
+        dwell = {}
+        for courier, timeline in self.timelines:
+            for (status, hours), (_, next_hours) in zip(timeline, timeline[1:]):
+                dwell.setdefault(status, []).append((next_hours - hours) * 3600)
+            picked = [hours for status, hours in timeline if status == 'picked_up']
+            delivered = [hours for status, hours in timeline if status == 'delivered']
+            if picked and delivered:
+                delivery.setdefault(self.couriers[courier].pk, []).append((delivered[-1] - picked[0]) * 3600)
+
+        self.assertEqual(
+            {row['status']: (row['count'], row['p50']) for row in analytics['time_in_status']},
+            {status: (len(seconds), np.percentile(seconds, 50)) for status, seconds in dwell.items()}
+        )
+        self.assertEqual(
+            {row['courier_id']: (row['count'], row['p50']) for row in analytics['courier_delivery']},
+            {courier: (len(seconds), np.percentile(seconds, 50)) for courier, seconds in delivery.items()}
+        )
+        self.assertEqual(analytics['hold']['count'], 2)
+        self.assertEqual(sum(bucket['count'] for bucket in analytics['delivery_histogram']), 3)
+
+    def test_results_are_cached_per_window(self):
+        analytics = get_delivery_analytics('7d')
+        self.assertEqual(analytics['window'], '7d')
+        self.assertEqual(
+            {row['courier'] for row in analytics['courier_delivery']}, {'courier0', 'courier1'}
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(get_delivery_analytics('7d'), analytics)
+        self.assertEqual(get_delivery_analytics('unknown')['window'], '30d')
+
+
+class AdminDashboardStatsTests(TestCase):
+    """
+    Dashboard counters match the shipment and user tables, with a fixed
+    number of queries, and are served from the cached snapshot
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = UserProfile.objects.create_user(username='admin', password='x', role='admin')
+        cls.shipper = UserProfile.objects.create_user(username='shipper', password='x', role='shipper')
+        cls.couriers = [
+            UserProfile.objects.create_user(username=f'courier{index}', password='x', role='courier')
+            for index in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def create(self, count, **kwargs):
+        return [
+            Shipment.objects.create(
+                shipper=self.shipper,
+                recipient_name=f'Recipient {index}',
+                pickup_address='1 Marina Road, Lagos, Nigeria',
+                delivery_address='2 Ring Road, Accra, Ghana',
+                weight=1,
+                **kwargs
+            )
+            for index in range(count)
+        ]
+
+    def stats(self):
+        with CaptureQueriesContext(connection) as queries:
+            stats = {**get_shipment_stats(), **get_user_stats()}
+        return stats, len(queries)
+
+    def test_counters_follow_writes(self):
+        pending = self.create(3)
+        self.create(2, courier=self.couriers[0], status='in_transit')
+        self.create(1, courier=self.couriers[1], status='delivered')
+        _, few = self.stats()
+
+        pending[0].delete()
+        pending[1].courier = self.couriers[2]
+        pending[1].status = 'accepted'
+        pending[1].save()
+        self.create(20, courier=self.couriers[1], status='picked_up')
+
+        stats, many = self.stats()
+        self.assertEqual(many, few)
+        self.assertEqual(
+            {code: entry['count'] for code, entry in stats['status_counts'].items() if entry['count']},
+            {'pending': 1, 'accepted': 1, 'picked_up': 20, 'in_transit': 2, 'delivered': 1}
+        )
+        self.assertEqual(stats['total_shipments'], Shipment.objects.count())
+        self.assertEqual(stats['today_shipments'], 25)
+        self.assertEqual(stats['week_shipments'], 25)
+        self.assertEqual(stats['unassigned_count'], 1)
+        self.assertEqual((stats['total_users'], stats['courier_count'], stats['shipper_count']), (5, 3, 1))
+        self.assertEqual(stats['active_couriers'], 3)
+
+    def test_cold_snapshot_queries(self):
+        for count in (2, 20):
+            self.create(count, courier=self.couriers[0], status='delivered')
+            cache.clear()
+            with self.assertNumQueries(6):
+                snapshot = get_dashboard_snapshot()
+
+        self.assertEqual(snapshot['total_shipments'], 22)
+        self.assertEqual([user.delivered_count for user in snapshot['top_couriers']], [22])
+        self.assertEqual(len(snapshot['daily_trend']), 14)
+
+    def test_snapshot_is_cached(self):
+        self.create(2)
+        self.client.force_login(self.admin)
+        response = self.client.get('/manage/dashboard/')
+        self.assertEqual(response.context['total_shipments'], 2)
+
+        with self.assertNumQueries(0):
+            get_dashboard_snapshot()
+
+
+class ShipmentRollupTests(TestCase):
+    """
+    Rollup buckets follow shipments incrementally and agree with a rebuild
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shipper = UserProfile.objects.create_user(username='shipper', password='x', role='shipper')
+        cls.courier = UserProfile.objects.create_user(username='courier', password='x', role='courier')
+
+    def create(self, **kwargs):
+        return Shipment.objects.create(
+            shipper=self.shipper,
+            recipient_name='Recipient',
+            pickup_address='1 Marina Road, Lagos, Nigeria',
+            delivery_address='2 Ring Road, Accra, Ghana',
+            weight=1,
+            **kwargs
+        )
+
+    def buckets(self):
+        """
+        {(granularity, status, courier id): shipments}, summed over bucket starts
+        """
+        totals = Counter()
+        for granularity, status, courier_id, count in ShipmentRollup.objects.values_list(
+            'granularity', 'status', 'courier_id', 'shipment_count'
+        ):
+            totals[(granularity, status, courier_id)] += count
+        return {key: count for key, count in totals.items() if count}
+
+    def assertMatchesRebuild(self):
+        incremental = self.buckets()
+        now = timezone.now()
+        rebuild_range(now - timedelta(days=1), now + timedelta(days=1))
+        self.assertEqual(incremental, self.buckets())
+        return incremental
+
+    def test_deleted_courier_buckets_become_unassigned(self):
+        self.create(courier=self.courier, status='in_transit')
+        self.create(courier=self.courier, status='delivered')
+        self.create()
+
+        self.courier.delete()
+
+        buckets = self.assertMatchesRebuild()
+        self.assertEqual(buckets, {
+            (granularity, status, None): 1
+            for granularity in ('hour', 'day')
+            for status in ('pending', 'in_transit', 'delivered')
+        })
+        self.assertEqual(get_period_totals()['today'], 3)
+
+
+class RecipientLinkTests(QueryPlanMixin, TestCase):
+    """
+    Shipments follow their recipient's account however it is created or edited
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shipper = UserProfile.objects.create_user(username='shipper', password='x', role='shipper')
+
+    def create(self, email):
+        return Shipment.objects.create(
+            shipper=self.shipper,
+            recipient_name='Recipient',
+            recipient_email=email,
+            pickup_address='1 Marina Road, Lagos, Nigeria',
+            delivery_address='2 Ring Road, Accra, Ghana',
+            weight=1,
+        )
+
+    def test_accounts_created_and_edited_outside_registration(self):
+        first = self.create('Ada@Example.com')
+        second = self.create('ada@work.example.com')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ada = UserProfile.objects.create_user(username='ada', password='x', email='ADA@example.com')
+        first.refresh_from_db()
+        self.assertEqual(first.recipient_user, ada)
+        self.assertEqual(find_recipient_user('ada@EXAMPLE.com'), ada)
+        self.assertEqual(self.create('ada@example.com').recipient_user, ada)
+
+        ada.email = 'ada@work.example.com'
+        with self.captureOnCommitCallbacks(execute=True):
+            ada.save()
+        self.assertEqual(
+            list(Shipment.objects.filter(recipient_user=ada).values_list('pk', flat=True)), [second.pk]
+        )
+
+    def test_email_lookup_uses_index(self):
+        UserProfile.objects.bulk_create([
+            UserProfile(username=f'user{index}', email=f'user{index}@example.com', role='recipient')
+            for index in range(500)
+        ])
+        self.analyze()
+        self.assertUsesIndex(
+            UserProfile.objects.annotate(email_lower=Lower('email')).filter(
+                role='recipient', email_lower='ada@example.com'
+            ),
+            'core_user_email_lower_idx'
+        )
+
+
+class ShipmentSearchTests(TestCase):
+    """
+    Admin search stays current with shipper renames and pages through results
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shipper = UserProfile.objects.create_user(username='acme', password='x', role='shipper')
+        cls.admin = UserProfile.objects.create_user(username='admin', password='x', role='admin')
+        for index in range(60):
+            Shipment.objects.create(
+                shipper=cls.shipper,
+                recipient_name=f'Searchable Recipient {index}',
+                pickup_address='1 Marina Road, Lagos, Nigeria',
+                delivery_address='2 Ring Road, Accra, Ghana',
+                weight=1,
+            )
+
+    def test_rename_refreshes_search_text(self):
+        self.shipper.username = 'globex'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shipper.save()
+
+        self.assertEqual(search_shipments(Shipment.objects.all(), 'globex').count(), 60)
+        self.assertFalse(search_shipments(Shipment.objects.all(), 'acme').exists())
+
+    def test_matches_are_ranked(self):
+        if connection.vendor not in ('sqlite', 'postgresql') or (
+            connection.vendor == 'sqlite' and not has_fts_table(connection)
+        ):
+            self.skipTest('No search index to rank with')
+        results = list(search_shipments(Shipment.objects.filter(shipper=self.shipper), 'recipient 1'))
+
+        self.assertEqual(len(results), 11)
+        self.assertEqual(results[0].recipient_name, 'Searchable Recipient 1')
+        ranks = [shipment.search_rank for shipment in results]
+        self.assertEqual(ranks, sorted(ranks, reverse=connection.vendor == 'postgresql'))
+
+    def test_results_are_paginated(self):
+        self.client.force_login(self.admin)
+        first = self.client.get('/manage/shipments/', {'search': 'searchable'}).context['page_obj']
+        self.assertEqual(len(first), 50)
+        self.assertTrue(first.has_next())
+
+        second = self.client.get(
+            '/manage/shipments/', {'search': 'searchable', 'cursor': first.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(second), 10)
+        self.assertFalse(second.has_next())
+        self.assertTrue(second.has_previous())
+        self.assertFalse({s.pk for s in first} & {s.pk for s in second})
+
+        tampered = self.client.get('/manage/shipments/', {'search': 'searchable', 'cursor': 'bm90LWEtY3Vyc29y'})
+        self.assertEqual(len(tampered.context['page_obj']), 50)
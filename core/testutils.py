@@ -0,0 +1,41 @@
+"""
+Test helpers shared by the core and chat test suites
+"""
+import re
+
+from django.db import connection
+
+
+class QueryPlanMixin:
+    """
+    Assertions on the database's plan for a queryset
+    SQLite must SEARCH (or walk an index of) each table instead of a bare
+    SCAN; PostgreSQL must not fall back to a Seq Scan. Sequential scans are
+    disabled while explaining on PostgreSQL, so a Seq Scan in the plan means
+    no index can serve the query, not that the test table is small
+    """
+
+    @classmethod
+    def analyze(cls):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, index=None):
+        plan = self.explain(queryset)
+        if connection.vendor == 'sqlite':
+            full_scans = [
+                line for line in plan.splitlines()
+                if re.search(r'\bSCAN \w+$', line.strip())
+            ]
+            self.assertEqual(full_scans, [], f'Full table scan in plan:\n{plan}')
+        elif connection.vendor == 'postgresql':
+            self.assertNotIn('Seq Scan', plan, f'Sequential scan in plan:\n{plan}')
+        if index is not None:
+            self.assertIn(index, plan, f'{index} not used:\n{plan}')
+        return plan
@@ -0,0 +1,337 @@
+import hashlib
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the shape of the tracking payload changes so that entries
+# written by an older deploy are never served to clients
+TRACKING_PAYLOAD_VERSION = 3
+
+TRACKING_CACHE_TIMEOUT = getattr(settings, 'TRACKING_CACHE_TIMEOUT', 300)
+
+# Upper bound on the number of values in a single tracking_number__in query
+TRACKING_BULK_CHUNK_SIZE = 500
+
+
+def tracking_cache_key(tracking_number):
+    """
+    Cache key for the serialized tracking payload of a shipment
+    """
+    return f'tracking:v{TRACKING_PAYLOAD_VERSION}:{tracking_number.upper()}'
+
+
+def tracking_validators_cache_key(tracking_number):
+    """
+    Cache key for the conditional-GET validators of a shipment
+    """
+    return f'tracking:v{TRACKING_PAYLOAD_VERSION}:validators:{tracking_number.upper()}'
+
+
+def tracking_alias_cache_key(tracking_number):
+    """
+    Cache key mapping a previous tracking number to the shipment's current one
+    """
+    return f'tracking:v{TRACKING_PAYLOAD_VERSION}:alias:{tracking_number.upper()}'
+
+
+def invalidate_tracking_cache(*tracking_numbers):
+    """
+    Drop cached tracking payloads, validators and alias mappings for the given
+    tracking numbers
+    Payloads and validators are only cached under a shipment's current number,
+    so an alias mapping left pointing at a number that has since been
+    replaced finds nothing cached there and is resolved again
+    Runs again once the surrounding transaction commits so a reader that
+    repopulated the cache with pre-commit data cannot leave it stale
+    """
+    keys = []
+    for number in tracking_numbers:
+        if number:
+            keys.append(tracking_cache_key(number))
+            keys.append(tracking_validators_cache_key(number))
+            keys.append(tracking_alias_cache_key(number))
+    if not keys:
+        return
+
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_user_tracking_cache(user_id):
+    """
+    Drop the cached tracking payloads of every shipment a user ships or
+    carries, since payloads embed the shipper's and courier's usernames
+    """
+    from .models import Shipment
+
+    invalidate_tracking_cache(*Shipment.objects.filter(
+        Q(shipper_id=user_id) | Q(courier_id=user_id)
+    ).values_list('tracking_number', flat=True))
+
+
+def tracking_group_name(tracking_number):
+    """
+    Channel layer group joined by live tracking subscribers of a shipment
+    """
+    return f'tracking_{tracking_number.upper()}'
+
+
+def publish_tracking_update(shipment, *previous_tracking_numbers):
+    """
+    Fan a shipment change out to live tracking subscribers once the
+    surrounding transaction commits
+    Subscribers of a previous tracking number (e.g. before a return) receive
+    the update too, so they can follow the new number
+    """
+    event = {
+        'type': 'tracking_update',
+        'tracking_number': shipment.tracking_number,
+        'status': shipment.status,
+        'status_display': shipment.get_status_display(),
+        'courier': shipment.courier.username if shipment.courier else None,
+        'hold_reason': shipment.hold_reason or None,
+        'last_updated': shipment.updated_at.isoformat(),
+    }
+    groups = {
+        tracking_group_name(number)
+        for number in (shipment.tracking_number, *previous_tracking_numbers)
+        if number
+    }
+
+    def send():
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        try:
+            for group in groups:
+                async_to_sync(channel_layer.group_send)(group, event)
+        except Exception:
+            logger.exception('Error publishing tracking update for %s', shipment.tracking_number)
+
+    transaction.on_commit(send)
+
+
+def _cached_by_alias(tracking_number, key_func):
+    """
+    Cached value stored under the current number a previous tracking number
+    maps to, or None
+    """
+    current = cache.get(tracking_alias_cache_key(tracking_number))
+    if current is None:
+        return None
+    return cache.get(key_func(current))
+
+
+def _cache_resolved(tracking_number, current_number, key, value):
+    """
+    Cache a value under the shipment's current number, and map the requested
+    number to it when it is a previous one
+    """
+    values = {key: value}
+    if current_number != tracking_number.upper():
+        values[tracking_alias_cache_key(tracking_number)] = current_number
+    cache.set_many(values, TRACKING_CACHE_TIMEOUT)
+
+
+def get_tracking_payload(tracking_number):
+    """
+    Read-through lookup of the tracking payload for a tracking number
+    Previous tracking numbers resolve to the shipment's current payload,
+    cached under the current number
+    Returns None if no shipment exists with this tracking number
+    """
+    from .models import Shipment
+
+    payload = cache.get(tracking_cache_key(tracking_number))
+    if payload is None:
+        payload = _cached_by_alias(tracking_number, tracking_cache_key)
+    if payload is not None:
+        return payload
+
+    shipment = Shipment.objects.select_related('shipper', 'courier').for_tracking_number(
+        tracking_number
+    ).first()
+    if shipment is None:
+        return None
+
+    payload = build_tracking_payload(shipment)
+    _cache_resolved(tracking_number, shipment.tracking_number, tracking_cache_key(shipment.tracking_number), payload)
+    return payload
+
+
+def get_tracking_validators(tracking_number):
+    """
+    Return (etag, last_modified) for conditional GETs of a tracking payload
+    The strong ETag covers updated_at, the status note count and the shipper's
+    and courier's names shown in the payload, read with one aggregate query on
+    the unique tracking_number index instead of loading the shipment and its
+    relations
+    Returns None if no shipment exists with this tracking number
+    """
+    from .models import Shipment
+
+    validators = cache.get(tracking_validators_cache_key(tracking_number))
+    if validators is None:
+        validators = _cached_by_alias(tracking_number, tracking_validators_cache_key)
+    if validators is not None:
+        return validators
+
+    row = Shipment.objects.for_tracking_number(
+        tracking_number
+    ).annotate(
+        note_count=Count('status_notes')
+    ).values_list(
+        'tracking_number', 'updated_at', 'note_count', 'shipper__username', 'shipper__email', 'courier__username'
+    ).first()
+
+    if row is None:
+        return None
+
+    number, updated_at, note_count, *names = row
+    etag_source = ':'.join(
+        [f'{TRACKING_PAYLOAD_VERSION}:{number}:{updated_at.isoformat()}:{note_count}'] + [name or '' for name in names]
+    )
+    validators = (hashlib.sha1(etag_source.encode()).hexdigest(), updated_at)
+    _cache_resolved(tracking_number, number, tracking_validators_cache_key(number), validators)
+    return validators
+
+
+def get_tracking_payloads(tracking_numbers, chunk_size=TRACKING_BULK_CHUNK_SIZE):
+    """
+    Bulk read-through lookup of tracking payloads
+    Cache hits are served with a single get_many (two more for previous
+    numbers); misses are resolved with one alias lookup and one
+    tracking_number__in query (plus one event prefetch) per chunk
+    Returns a dict mapping each normalized tracking number to its payload,
+    or None when no shipment exists with that number
+    """
+    from .models import Shipment, TrackingAlias
+
+    numbers = list(dict.fromkeys(number.strip().upper() for number in tracking_numbers if number))
+    keys = {tracking_cache_key(number): number for number in numbers}
+
+    cached = cache.get_many(keys.keys())
+    payloads = {keys[key]: payload for key, payload in cached.items()}
+    missing = [number for number in numbers if number not in payloads]
+
+    # Previous numbers served from the payload cached under their current number
+    if missing:
+        aliases = cache.get_many([tracking_alias_cache_key(number) for number in missing])
+        current = {
+            number: aliases[tracking_alias_cache_key(number)]
+            for number in missing if tracking_alias_cache_key(number) in aliases
+        }
+        cached = cache.get_many({tracking_cache_key(number) for number in current.values()})
+        for number, current_number in current.items():
+            payload = cached.get(tracking_cache_key(current_number))
+            if payload is not None:
+                payloads[number] = payload
+        missing = [number for number in missing if number not in payloads]
+
+    fresh = {}
+    for start in range(0, len(missing), chunk_size):
+        chunk = missing[start:start + chunk_size]
+        requested = set(chunk)
+        alias_map = dict(
+            TrackingAlias.objects.filter(tracking_number__in=chunk).values_list('tracking_number', 'shipment_id')
+        )
+        shipments = Shipment.objects.select_related('shipper', 'courier').prefetch_related(
+            'events'
+        ).filter(
+            Q(tracking_number__in=chunk) | Q(pk__in=set(alias_map.values()))
+        )
+
+        by_pk = {}
+        for shipment in shipments:
+            payload = build_tracking_payload(shipment)
+            by_pk[shipment.pk] = payload
+            if shipment.tracking_number in requested:
+                payloads[shipment.tracking_number] = payload
+                fresh[tracking_cache_key(shipment.tracking_number)] = payload
+
+        # Previous tracking numbers resolve to the shipment's current payload
+        for number, shipment_pk in alias_map.items():
+            if number not in payloads and shipment_pk in by_pk:
+                payload = by_pk[shipment_pk]
+                payloads[number] = payload
+                fresh[tracking_cache_key(payload['tracking_number'])] = payload
+                fresh[tracking_alias_cache_key(number)] = payload['tracking_number']
+
+    if fresh:
+        cache.set_many(fresh, TRACKING_CACHE_TIMEOUT)
+
+    return {number: payloads.get(number) for number in numbers}
+
+
+def build_tracking_payload(shipment):
+    """
+    Serialize a shipment into the public tracking JSON payload
+    Expects shipper and courier to be loaded with select_related and events
+    to be prefetched when serializing many shipments
+    """
+    locations = get_event_locations(shipment)
+
+    return {
+        'success': True,
+        'tracking_number': shipment.tracking_number,
+        'status': shipment.status,
+        'status_display': shipment.get_status_display(),
+        'created_at': shipment.created_at.isoformat(),
+        'last_updated': shipment.updated_at.isoformat(),
+        'weight': float(shipment.weight),
+        'recipient': {
+            'name': shipment.recipient_name,
+            'phone': shipment.recipient_phone or None,
+            'email': shipment.recipient_email or None,
+        },
+        'addresses': {
+            'pickup': shipment.pickup_address,
+            'delivery': shipment.delivery_address,
+            'pickup_location': {
+                'city': shipment.pickup_city or None,
+                'region': shipment.pickup_region or None,
+                'postcode': shipment.pickup_postcode or None,
+                'country': shipment.pickup_country or None,
+            },
+            'delivery_location': {
+                'city': shipment.delivery_city or None,
+                'region': shipment.delivery_region or None,
+                'postcode': shipment.delivery_postcode or None,
+                'country': shipment.delivery_country or None,
+            },
+        },
+        'shipper': {
+            'username': shipment.shipper.username,
+            'email': shipment.shipper.email,
+        },
+        'courier': {
+            'username': shipment.courier.username if shipment.courier else None,
+            'assigned': shipment.courier is not None,
+        } if shipment.courier else None,
+        'locations': locations,
+        'notes': shipment.notes or None,
+    }
+
+
+def get_event_locations(shipment):
+    """
+    Build the tracking timeline from the shipment's event log
+    Uses prefetched events when available, otherwise one indexed range scan
+    """
+    return [
+        {
+            'timestamp': event.created_at.isoformat(),
+            'location': event.location,
+            'city': event.city,
+            'description': event.description,
+            'status': event.status,
+        }
+        for event in shipment.events.all()
+    ]
@@ -0,0 +1,177 @@
+"""
+Collision-free tracking number allocation
+
+Numbers are drawn from a database sequence in blocks, passed through a keyed
+Feistel permutation so consecutive shipments do not get guessable numbers, and
+encoded as FD + 10 hex digits + 1 hex check digit. Because the permutation is
+a bijection over the sequence range, distinct sequence values always produce
+distinct tracking numbers and no uniqueness probe against the shipment table
+is needed. Numbers issued before the allocator existed are FD + 10 hex digits,
+one character shorter, so they can never collide with allocated ones.
+
+Reserved values must never be handed out twice, even when the transaction
+that reserved them rolls back. On PostgreSQL they come from a real SEQUENCE,
+whose nextval() is not transactional. Other backends bump a counter row; a
+bump made inside an outer transaction can be rolled back, so only blocks
+reserved in autocommit mode are kept for later callers.
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+TRACKING_PREFIX = 'FD'
+
+SEQUENCE_NAME = 'tracking_number'
+
+# PostgreSQL sequence backing the allocator (created by migration 0017)
+DB_SEQUENCE_NAME = 'core_tracking_number_seq'
+
+# 10 hex digits of payload = 40 bits, split into two 20-bit Feistel halves
+PAYLOAD_DIGITS = 10
+HALF_BITS = 20
+HALF_MASK = (1 << HALF_BITS) - 1
+MAX_SEQUENCE = 1 << (2 * HALF_BITS)
+FEISTEL_ROUNDS = 4
+
+# Numbers reserved per database round trip for single-shipment callers
+TRACKING_NUMBER_BLOCK_SIZE = getattr(settings, 'TRACKING_NUMBER_BLOCK_SIZE', 50)
+
+_block_lock = threading.Lock()
+_block = iter(())
+
+
+def reserve_sequence_block(count):
+    """
+    Reserve `count` sequence values and return them in ascending order
+    Concurrent callers always receive disjoint values
+    """
+    from .models import TrackingNumberSequence
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(%s) FROM generate_series(1, %s)', [DB_SEQUENCE_NAME, count]
+            )
+            values = sorted(value for value, in cursor.fetchall())
+    else:
+        with transaction.atomic():
+            TrackingNumberSequence.objects.filter(name=SEQUENCE_NAME).update(
+                next_value=F('next_value') + count
+            )
+            end = TrackingNumberSequence.objects.values_list('next_value', flat=True).get(
+                name=SEQUENCE_NAME
+            )
+        values = range(end - count, end)
+
+    if values[-1] >= MAX_SEQUENCE:
+        raise OverflowError('Tracking number space exhausted.')
+    return values
+
+
+def _reservations_are_durable():
+    """
+    Whether values reserved now stay reserved if the caller's transaction
+    rolls back
+    """
+    return connection.vendor == 'postgresql' or not connection.in_atomic_block
+
+
+def allocate_tracking_numbers(count):
+    """
+    Allocate `count` tracking numbers with one sequence round trip
+    Intended for bulk callers that create many shipments at once
+    """
+    if count <= 0:
+        return []
+    return [encode_tracking_number(value) for value in reserve_sequence_block(count)]
+
+
+def next_tracking_number():
+    """
+    Return one tracking number from the process-local block, reserving a new
+    block from the database only when the current one is used up
+    A reservation that could be rolled back is never kept as a block: it
+    takes a single value, which rolls back together with its shipment
+    """
+    global _block
+
+    with _block_lock:
+        value = next(_block, None)
+        if value is None:
+            if _reservations_are_durable():
+                _block = iter(reserve_sequence_block(TRACKING_NUMBER_BLOCK_SIZE))
+                value = next(_block)
+            else:
+                value = reserve_sequence_block(1)[0]
+
+    return encode_tracking_number(value)
+
+
+def encode_tracking_number(value):
+    """
+    Encode a counter value as FD + permuted hex payload + check digit
+    """
+    payload = f'{_permute(value):0{PAYLOAD_DIGITS}X}'
+    return f'{TRACKING_PREFIX}{payload}{_check_digit(payload)}'
+
+
+def is_valid_tracking_number(tracking_number):
+    """
+    Cheap format and check digit validation, without touching the database
+    Numbers issued before the allocator existed have no check digit and are
+    not valid allocator numbers
+    """
+    tracking_number = tracking_number.upper()
+    if len(tracking_number) != len(TRACKING_PREFIX) + PAYLOAD_DIGITS + 1:
+        return False
+    if not tracking_number.startswith(TRACKING_PREFIX):
+        return False
+
+    payload = tracking_number[len(TRACKING_PREFIX):-1]
+    try:
+        int(payload, 16)
+    except ValueError:
+        return False
+    return tracking_number[-1] == _check_digit(payload)
+
+
+def _round_keys():
+    key = getattr(settings, 'TRACKING_NUMBER_KEY', 'nexpress-tracking').encode()
+    return [
+        hashlib.blake2b(f'round-{i}'.encode(), key=key[:64], digest_size=8).digest()
+        for i in range(FEISTEL_ROUNDS)
+    ]
+
+
+_ROUND_KEYS = _round_keys()
+
+
+def _round_function(half, round_key):
+    digest = hashlib.blake2b(half.to_bytes(3, 'big'), key=round_key, digest_size=4).digest()
+    return int.from_bytes(digest, 'big') & HALF_MASK
+
+
+def _permute(value):
+    """
+    Keyed Feistel permutation over the 40-bit sequence space
+    """
+    left, right = value >> HALF_BITS, value & HALF_MASK
+    for round_key in _ROUND_KEYS:
+        left, right = right, left ^ _round_function(right, round_key)
+    return (left << HALF_BITS) | right
+
+
+def _check_digit(payload):
+    """
+    Luhn mod 16 check digit over the hex payload
+    """
+    total = 0
+    factor = 2
+    for char in reversed(payload):
+        addend = factor * int(char, 16)
+        total += addend // 16 + addend % 16
+        factor = 1 if factor == 2 else 2
+    return f'{(16 - total % 16) % 16:X}'
@@ -0,0 +1,78 @@
+"""
+Compare-and-set shipment transitions
+
+A transition is written as one conditional UPDATE that only matches while
+the shipment still has the status and courier the caller expects:
+
+    UPDATE core_shipment SET status = 'accepted', courier_id = 7, ...
+    WHERE (tracking_number = 'FD...' OR id = (SELECT shipment_id FROM core_trackingalias ...))
+    AND status = 'pending' AND courier_id IS NULL
+    RETURNING ...
+
+Whoever loses a race (say, two couriers accepting the same parcel) gets no
+row back. They are not blocked behind a row lock, and nothing needs reading
+first. Previous tracking numbers resolve through TrackingAlias within the
+same statement. The target status is checked against the state machine
+before the write. The returned row, together with the expected old values,
+is all the transition hooks need (events, counters, rollups, workloads,
+notifications). New numbers for returned parcels are only allocated once
+the transition has won, then their aliases, tracking cache invalidation and
+live updates are handled here, as Shipment.save would.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+
+def compare_and_set(tracking_number, expected_status, expected_courier_id, actor=None, **changes):
+    """
+    Apply changes to the shipment with this current or previous tracking
+    number if its status and courier are still the expected ones
+    Returns the updated shipment, or None when it is missing or no longer
+    matches (the caller lost the race); raises InvalidTransition when the
+    actor may not make the status change at all
+    """
+    from .models import Shipment, TrackingAlias
+    from .search import build_search_text
+    from .state_machine import role_for, run_transition_hooks, validate_transition
+    from .tracking import invalidate_tracking_cache, publish_tracking_update
+    from .tracking_numbers import next_tracking_number
+
+    role = role_for(actor)
+    status = changes.get('status', expected_status)
+    validate_transition(role, expected_status, status)
+
+    now = timezone.now()
+    changes['updated_at'] = now
+
+    with transaction.atomic():
+        updated = Shipment.objects.for_tracking_number(tracking_number).filter(
+            status=expected_status, courier_id=expected_courier_id
+        ).update_returning(**changes)
+        if not updated:
+            return None
+        shipment = updated[0]
+        previous_number = shipment.tracking_number
+
+        if status == 'returned' and expected_status != 'returned':
+            # Returned packages get a new tracking number, as in Shipment.save
+            shipment.tracking_number = next_tracking_number()
+            shipment.search_text = build_search_text(shipment)
+            Shipment.objects.filter(pk=shipment.pk).update(
+                tracking_number=shipment.tracking_number, search_text=shipment.search_text
+            )
+            shipment._loaded_values = shipment._snapshot()
+            TrackingAlias.objects.create(shipment=shipment, tracking_number=shipment.tracking_number)
+
+        if (shipment.status, shipment.courier_id) != (expected_status, expected_courier_id):
+            run_transition_hooks(
+                [(shipment, expected_status, expected_courier_id, shipment.status)],
+                role=role, actor=actor, now=now
+            )
+
+    invalidate_tracking_cache(tracking_number, previous_number, shipment.tracking_number)
+    if set(changes) & {'status', 'courier', 'courier_id', 'hold_reason'}:
+        if shipment.tracking_number != previous_number:
+            publish_tracking_update(shipment, previous_number)
+        else:
+            publish_tracking_update(shipment)
+    return shipment
@@ -1,10 +1,12 @@
 from django.urls import path
 from .views import (
-    HomeView, RegisterView, CreateShipmentView, ShipmentSuccessView,
-    TrackShipmentView, TrackFormView, TrackingAPIView, CourierDashboardView,
-    ShipmentStatusUpdateView, AdminDashboardView, AdminShipmentListView,
-    AdminShipmentUpdateView, ContactView, RecipientDashboardView
+    HomeView, RegisterView, CreateShipmentView, BulkShipmentImportView, ShipmentSuccessView,
+    TrackShipmentView, TrackFormView, TrackingAPIView, BulkTrackingAPIView, CourierDashboardView,
+    ShipmentStatusUpdateView, ShipmentScanBatchView, AdminDashboardView, AdminShipmentListView, AdminAutoAssignView,
+    AdminShipmentExportView, AdminShipmentUpdateView, AdminRateLimitStatsView, ContactView, RecipientDashboardView,
+    ShipmentListAPIView
 )
+from .ratelimit import rate_limit, bulk_tracking_cost
 
 app_name = 'core'
 
@@ -12,15 +14,22 @@ urlpatterns = [
     path('', HomeView.as_view(), name='home'),
     path('register/', RegisterView.as_view(), name='register'),
     path('shipment/create/', CreateShipmentView.as_view(), name='create_shipment'),
+    path('shipment/import/', BulkShipmentImportView.as_view(), name='import_shipments'),
     path('shipment/success/', ShipmentSuccessView.as_view(), name='shipment_success'),
-    path('track/', TrackFormView.as_view(), name='track_form'),
-    path('track/<str:tracking_number>/', TrackShipmentView.as_view(), name='track_shipment'),
-    path('api/track/<str:tracking_number>/', TrackingAPIView.as_view(), name='api_track_shipment'),
+    path('track/', rate_limit('tracking', json_response=False)(TrackFormView.as_view()), name='track_form'),
+    path('track/<str:tracking_number>/', rate_limit('tracking', json_response=False)(TrackShipmentView.as_view()), name='track_shipment'),
+    path('api/track/bulk/', rate_limit('tracking', cost=bulk_tracking_cost)(BulkTrackingAPIView.as_view()), name='api_bulk_track_shipments'),
+    path('api/track/<str:tracking_number>/', rate_limit('tracking')(TrackingAPIView.as_view()), name='api_track_shipment'),
     path('courier/dashboard/', CourierDashboardView.as_view(), name='courier_dashboard'),
     path('recipient/dashboard/', RecipientDashboardView.as_view(), name='recipient_dashboard'),
+    path('api/shipments/', ShipmentListAPIView.as_view(), name='api_shipment_list'),
+    path('api/shipments/scan/', ShipmentScanBatchView.as_view(), name='shipment_scan_batch'),
     path('api/shipment/<str:tracking_number>/update/', ShipmentStatusUpdateView.as_view(), name='shipment_status_update'),
     path('contact/', ContactView.as_view(), name='contact'),
     path('manage/dashboard/', AdminDashboardView.as_view(), name='admin_dashboard'),
     path('manage/shipments/', AdminShipmentListView.as_view(), name='admin_shipment_list'),
+    path('manage/shipments/auto-assign/', AdminAutoAssignView.as_view(), name='admin_auto_assign'),
+    path('manage/shipments/export/', AdminShipmentExportView.as_view(), name='admin_shipment_export'),
     path('manage/shipment/<str:tracking_number>/update/', AdminShipmentUpdateView.as_view(), name='admin_shipment_update'),
+    path('manage/ratelimit/', AdminRateLimitStatsView.as_view(), name='admin_ratelimit_stats'),
 ]
@@ -1,24 +1,37 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth import login, authenticate
+from django.contrib.auth import authenticate
 from django.contrib import messages
-from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.views.generic import CreateView, TemplateView, FormView, ListView
+from django.views.generic import CreateView, TemplateView, ListView
 from django.urls import reverse_lazy
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from django.db.models import Q, Count
+from django.db.models import Q, F, Count, Case, When, IntegerField, OrderBy, Value, Window
+from django.db.models.functions import RowNumber
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date
 import json
-from django.core.mail import send_mail
 from django.conf import settings
 from django.contrib.auth.views import LoginView as DjangoLoginView
-from django.contrib.auth.forms import AuthenticationForm
 from .forms import UserRegistrationForm, ShipmentForm, ContactForm
-from .models import Shipment, UserProfile, ShipmentStatusNote
+from .models import Shipment, UserProfile, ShipmentStatusNote, ShipmentStatusCounter
+from .analytics import ANALYTICS_WINDOWS, get_delivery_analytics
+from .assignment import assign_unassigned
+from .dashboard import get_dashboard_snapshot
+from .exports import EXPORT_FORMATS, UnsupportedExportFormat, export_queryset, stream_export
+from .imports import ImportFormatError, detect_format, import_shipments
+from .scans import ScanBatchError, apply_scans
+from .pagination import (
+    InvalidCursor, KeysetPaginationMixin, build_page, keyset_filter, paginate_keyset, paginate_ranked
+)
+from .search import search_shipments
+from .state_machine import InvalidTransition, role_for, validate_transition
+from .tracking import get_tracking_payload, get_tracking_payloads, get_tracking_validators
+from .transitions import compare_and_set
 
 # Create your views here.
 
@@ -69,6 +82,8 @@ class RegisterView(CreateView):
         user.is_staff = False
         user.is_superuser = False
 
+        # Shipments sent to this email before the account existed are linked
+        # once it is saved (core.signals.sync_recipient_links)
         user.save()
 
         messages.success(
@@ -121,7 +136,7 @@ class CreateShipmentView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
         if courier:
             shipment.courier = courier
             shipment.status = 'accepted'
-            shipment.save()
+            shipment.save(actor=self.request.user)
 
             # Send email notification to courier
             self.send_courier_notification(shipment, courier)
@@ -131,7 +146,7 @@ class CreateShipmentView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
                 f'Shipment created and assigned to {courier.username}! Tracking number: {shipment.tracking_number}'
             )
         else:
-            shipment.save()
+            shipment.save(actor=self.request.user)
             messages.success(
                 self.request,
                 f'Shipment created successfully! Your tracking number is: {shipment.tracking_number}'
@@ -185,6 +200,57 @@ Nexpress Team
         return super().form_invalid(form)
 
 
+class BulkShipmentImportView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
+    """
+    Create many shipments from an uploaded CSV, JSON Lines or JSON file
+    Only accessible by admin and shipper roles
+    Responds with a per-row report (JSON when ?format=json)
+    """
+    template_name = 'core/import_shipments.html'
+
+    def test_func(self):
+        user = self.request.user
+        return user.is_staff or user.role in ['admin', 'shipper']
+
+    def handle_no_permission(self):
+        messages.error(
+            self.request,
+            'Access denied. Only shippers and administrators can create shipments.'
+        )
+        return redirect('core:home')
+
+    def post(self, request):
+        wants_json = request.GET.get('format') == 'json'
+        upload = request.FILES.get('file')
+
+        error = None
+        file_format = detect_format(upload.name) if upload else None
+        if upload is None:
+            error = 'Please choose a file to upload.'
+        elif file_format is None:
+            error = 'Unsupported file type. Upload a .csv, .json or .jsonl file.'
+
+        report = None
+        if error is None:
+            try:
+                report = import_shipments(upload, file_format, shipper=request.user, actor=request.user)
+            except ImportFormatError as e:
+                error = str(e)
+
+        if wants_json:
+            if error:
+                return JsonResponse({'success': False, 'error': error}, status=400)
+            return JsonResponse({'success': True, **report})
+
+        if error:
+            messages.error(request, error)
+        elif report['created']:
+            messages.success(request, f"Created {report['created']} shipments.")
+        if report and report['failed']:
+            messages.error(request, f"{report['failed']} rows were rejected; see the report below.")
+        return self.render_to_response(self.get_context_data(report=report))
+
+
 class ShipmentSuccessView(LoginRequiredMixin, TemplateView):
     """
     Success page displaying the tracking number after shipment creation
@@ -214,17 +280,27 @@ class TrackShipmentView(TemplateView):
     """
     template_name = 'core/track_shipment.html'
 
+    def get(self, request, *args, **kwargs):
+        tracking_number = kwargs.get('tracking_number')
+        self.shipment = Shipment.objects.select_related('shipper', 'courier').for_tracking_number(
+            tracking_number
+        ).first()
+
+        # Previous tracking numbers (e.g. before a return) redirect to the current one
+        if self.shipment is not None and self.shipment.tracking_number != tracking_number:
+            return redirect('core:track_shipment', tracking_number=self.shipment.tracking_number)
+
+        return super().get(request, *args, **kwargs)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         tracking_number = kwargs.get('tracking_number')
 
-        try:
-            shipment = Shipment.objects.select_related('shipper', 'courier').get(
-                tracking_number=tracking_number
-            )
-            context['shipment'] = shipment
+        if self.shipment is not None:
+            context['shipment'] = self.shipment
+            context['events'] = list(self.shipment.events.all())
             context['found'] = True
-        except Shipment.DoesNotExist:
+        else:
             context['found'] = False
             context['tracking_number'] = tracking_number
 
@@ -250,54 +326,108 @@ class TrackingAPIView(View):
     """
     JSON API endpoint for tracking shipments
     Returns shipment status, timestamps, and location data
+    Payloads are served from the tracking cache and rebuilt only after a write
+    Supports conditional GET: unchanged shipments get 304 Not Modified
     """
     def get(self, request, tracking_number):
         try:
-            shipment = Shipment.objects.select_related('shipper', 'courier').get(
-                tracking_number=tracking_number.upper()
-            )
+            validators = get_tracking_validators(tracking_number)
+
+            if validators is None:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Shipment not found',
+                    'tracking_number': tracking_number,
+                    'message': 'No shipment found with this tracking number.'
+                }, status=404)
+
+            etag, last_modified = validators
+            etag = quote_etag(etag)
+            last_modified = int(last_modified.timestamp())
+
+            # Answer from the validators alone when the client is up to date
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                not_modified.headers['ETag'] = etag
+                return not_modified
+
+            response_data = get_tracking_payload(tracking_number)
+            if response_data is None:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Shipment not found',
+                    'tracking_number': tracking_number,
+                    'message': 'No shipment found with this tracking number.'
+                }, status=404)
 
-            # Stubbed location data - would come from real tracking system
-            locations = self._get_stub_locations(shipment)
+            response = JsonResponse(response_data, status=200)
+            response.headers['ETag'] = etag
+            response.headers['Last-Modified'] = http_date(last_modified)
+            return response
 
-            response_data = {
-                'success': True,
-                'tracking_number': shipment.tracking_number,
-                'status': shipment.status,
-                'status_display': shipment.get_status_display(),
-                'created_at': shipment.created_at.isoformat(),
-                'last_updated': shipment.updated_at.isoformat(),
-                'weight': float(shipment.weight),
-                'recipient': {
-                    'name': shipment.recipient_name,
-                    'phone': shipment.recipient_phone or None,
-                    'email': shipment.recipient_email or None,
-                },
-                'addresses': {
-                    'pickup': shipment.pickup_address,
-                    'delivery': shipment.delivery_address,
-                },
-                'shipper': {
-                    'username': shipment.shipper.username,
-                    'email': shipment.shipper.email,
-                },
-                'courier': {
-                    'username': shipment.courier.username if shipment.courier else None,
-                    'assigned': shipment.courier is not None,
-                } if shipment.courier else None,
-                'locations': locations,
-                'notes': shipment.notes or None,
-            }
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'error': 'Server error',
+                'message': str(e)
+            }, status=500)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BulkTrackingAPIView(View):
+    """
+    JSON API endpoint for tracking many shipments in one request
+    POST /api/track/bulk/
+    Expects JSON: {"tracking_numbers": ["FD...", "FD...", ...]}
+    Returns one result per requested tracking number, including not-found entries
+    """
+    MAX_TRACKING_NUMBERS = 1000
+
+    def post(self, request):
+        try:
+            data = json.loads(request.body)
+            tracking_numbers = data.get('tracking_numbers')
+
+            if not isinstance(tracking_numbers, list) or not all(isinstance(n, str) for n in tracking_numbers):
+                return JsonResponse({
+                    'success': False,
+                    'error': 'tracking_numbers must be a list of strings'
+                }, status=400)
+
+            if len(tracking_numbers) > self.MAX_TRACKING_NUMBERS:
+                return JsonResponse({
+                    'success': False,
+                    'error': f'At most {self.MAX_TRACKING_NUMBERS} tracking numbers can be requested at once'
+                }, status=400)
+
+            payloads = get_tracking_payloads(tracking_numbers)
+
+            results = []
+            for tracking_number, payload in payloads.items():
+                if payload is None:
+                    results.append({
+                        'success': False,
+                        'error': 'Shipment not found',
+                        'tracking_number': tracking_number,
+                    })
+                else:
+                    results.append(payload)
 
-            return JsonResponse(response_data, status=200)
+            found = sum(1 for payload in payloads.values() if payload is not None)
 
-        except Shipment.DoesNotExist:
+            return JsonResponse({
+                'success': True,
+                'count': len(results),
+                'found': found,
+                'not_found': len(results) - found,
+                'results': results,
+            }, status=200)
+
+        except json.JSONDecodeError:
             return JsonResponse({
                 'success': False,
-                'error': 'Shipment not found',
-                'tracking_number': tracking_number,
-                'message': 'No shipment found with this tracking number.'
-            }, status=404)
+                'error': 'Invalid JSON in request body'
+            }, status=400)
 
         except Exception as e:
             return JsonResponse({
@@ -306,90 +436,18 @@ class TrackingAPIView(View):
                 'message': str(e)
             }, status=500)
 
-    def _get_stub_locations(self, shipment):
-        """
-        Generate stubbed location data based on shipment status
-        In production, this would query a real tracking/GPS system
-        """
-        locations = []
-
-        # Always show origin (pickup location)
-        locations.append({
-            'timestamp': shipment.created_at.isoformat(),
-            'location': 'Origin Facility',
-            'city': self._extract_city(shipment.pickup_address),
-            'description': 'Package information received',
-            'status': 'pending'
-        })
-
-        # Add locations based on status
-        if shipment.status in ['accepted', 'picked_up', 'in_transit', 'delivered']:
-            locations.append({
-                'timestamp': shipment.updated_at.isoformat(),
-                'location': 'Pickup Location',
-                'city': self._extract_city(shipment.pickup_address),
-                'description': 'Package accepted by courier',
-                'status': 'accepted'
-            })
-
-        if shipment.status in ['picked_up', 'in_transit', 'delivered']:
-            locations.append({
-                'timestamp': shipment.updated_at.isoformat(),
-                'location': 'Pickup Location',
-                'city': self._extract_city(shipment.pickup_address),
-                'description': 'Package picked up',
-                'status': 'picked_up'
-            })
-
-        if shipment.status in ['in_transit', 'delivered']:
-            locations.append({
-                'timestamp': shipment.updated_at.isoformat(),
-                'location': 'Transit Hub',
-                'city': 'Distribution Center',
-                'description': 'Package in transit to destination',
-                'status': 'in_transit'
-            })
-
-        if shipment.status == 'delivered':
-            locations.append({
-                'timestamp': shipment.updated_at.isoformat(),
-                'location': 'Delivery Location',
-                'city': self._extract_city(shipment.delivery_address),
-                'description': 'Package delivered successfully',
-                'status': 'delivered'
-            })
-
-        if shipment.status == 'returned':
-            locations.append({
-                'timestamp': shipment.updated_at.isoformat(),
-                'location': 'Return Processing',
-                'city': self._extract_city(shipment.pickup_address),
-                'description': 'Package returned to sender - new tracking number generated',
-                'status': 'returned'
-            })
-
-        return locations
-
-    def _extract_city(self, address):
-        """
-        Stub function to extract city from address
-        In production, would use proper address parsing
-        """
-        lines = address.split(',')
-        if len(lines) >= 2:
-            return lines[-2].strip()
-        return 'Unknown City'
-
 
-class CourierDashboardView(LoginRequiredMixin, ListView):
+class CourierDashboardView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """
     Dashboard for courier users to view and manage shipments
     Shows only shipments assigned to the current courier
+    Completed deliveries are paginated with keyset cursors
     """
     model = Shipment
     template_name = 'core/courier_dashboard.html'
     context_object_name = 'shipments'
-    paginate_by = 20
+    # Upper bound on active shipments listed at once
+    active_limit = 200
 
     def dispatch(self, request, *args, **kwargs):
         # Verify user has courier role
@@ -405,22 +463,55 @@ class CourierDashboardView(LoginRequiredMixin, ListView):
         user = self.request.user
         return Shipment.objects.filter(
             courier=user
-        ).select_related('shipper', 'courier').order_by('-created_at')
+        ).select_related('shipper', 'courier').order_by('-created_at', '-id')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        user = self.request.user
-
-        # Separate shipments into categories for easier template rendering
         all_shipments = self.get_queryset()
-        context['pending_shipments'] = []  # Couriers don't see unassigned shipments
-        context['my_shipments'] = all_shipments.exclude(status='delivered')
-        context['completed_shipments'] = all_shipments.filter(status='delivered')
 
-        # Add counts for quick stats
-        context['active_count'] = all_shipments.exclude(status='delivered').count()
-        context['completed_count'] = all_shipments.filter(status='delivered').count()
-        context['total_assigned'] = all_shipments.count()
+        # Query 1: counts for quick stats
+        counts = all_shipments.aggregate(
+            total=Count('pk'),
+            active=Count('pk', filter=~Q(status='delivered')),
+            completed=Count('pk', filter=Q(status='delivered')),
+        )
+        context['active_count'] = counts['active']
+        context['completed_count'] = counts['completed']
+        context['total_assigned'] = counts['total']
+
+        # Query 2: active shipments and one page of completed deliveries in a
+        # single bounded fetch, partitioned in Python. Each group is numbered in
+        # its own order (active rows newest first, completed rows in the
+        # cursor's direction) and cut to its own bound inside the query
+        try:
+            direction, keyset, ordering = keyset_filter(self.get_cursor())
+        except InvalidCursor:
+            direction, keyset, ordering = keyset_filter(None)
+
+        page_size = self.keyset_page_size
+        delivered = Q(status='delivered')
+        is_completed = Case(When(delivered, then=1), default=0, output_field=IntegerField())
+        position_order = [
+            OrderBy(Case(When(delivered, then=F(field.lstrip('-')))), descending=field.startswith('-'))
+            for field in ordering
+        ] + [
+            OrderBy(Case(When(~delivered, then=F(field))), descending=True)
+            for field in ('created_at', 'id')
+        ]
+        rows = list(
+            all_shipments.filter(~delivered | (delivered & keyset)).annotate(
+                is_completed=is_completed,
+                bound=Case(When(delivered, then=Value(page_size + 1)), default=Value(self.active_limit)),
+                position=Window(RowNumber(), partition_by=[is_completed], order_by=position_order),
+            ).filter(position__lte=F('bound')).order_by('is_completed', 'position')
+        )
+
+        active = [shipment for shipment in rows if shipment.status != 'delivered']
+        completed = [shipment for shipment in rows if shipment.status == 'delivered']
+
+        context['pending_shipments'] = []  # Couriers don't see unassigned shipments
+        context['my_shipments'] = active
+        context['completed_shipments'] = build_page(completed, direction, page_size)
 
         return context
 
@@ -454,28 +545,30 @@ class ShipmentStatusUpdateView(View):
             action = data.get('action')
             new_status = data.get('status')
 
-            # Get shipment
-            shipment = get_object_or_404(Shipment, tracking_number=tracking_number.upper())
+            tracking_number = tracking_number.upper()
 
             # Handle "accept" action - courier accepts pending shipment
             if action == 'accept':
-                if shipment.status != 'pending':
-                    return JsonResponse({
-                        'success': False,
-                        'error': 'Only pending shipments can be accepted'
-                    }, status=400)
+                # Claim the shipment only if it is still pending and unassigned;
+                # of two couriers racing for it, exactly one gets it back
+                shipment = compare_and_set(
+                    tracking_number, 'pending', None, actor=request.user,
+                    status='accepted', courier=request.user
+                )
+                if shipment is None:
+                    # Lost the race, or the shipment was never acceptable
+                    shipment = get_object_or_404(Shipment.objects.for_tracking_number(tracking_number))
+                    if shipment.status != 'pending':
+                        return JsonResponse({
+                            'success': False,
+                            'error': 'Only pending shipments can be accepted'
+                        }, status=400)
 
-                if shipment.courier is not None:
                     return JsonResponse({
                         'success': False,
                         'error': 'Shipment already assigned to another courier'
                     }, status=400)
 
-                # Assign courier and update status
-                shipment.courier = request.user
-                shipment.status = 'accepted'
-                shipment.save()
-
                 return JsonResponse({
                     'success': True,
                     'message': 'Shipment accepted successfully',
@@ -486,24 +579,35 @@ class ShipmentStatusUpdateView(View):
 
             # Handle "update" action - update status of assigned shipment
             elif action == 'update':
+                shipment = get_object_or_404(Shipment.objects.for_tracking_number(tracking_number))
+
                 # Verify courier is assigned to this shipment
-                if shipment.courier != request.user:
+                if shipment.courier_id != request.user.pk:
                     return JsonResponse({
                         'success': False,
                         'error': 'You are not assigned to this shipment'
                     }, status=403)
 
-                # Validate status progression
-                valid_statuses = ['accepted', 'picked_up', 'in_transit', 'delivered']
-                if new_status not in valid_statuses:
+                # Validate status progression against the state machine
+                try:
+                    validate_transition(role_for(request.user), shipment.status, new_status)
+                except InvalidTransition as e:
                     return JsonResponse({
                         'success': False,
-                        'error': f'Invalid status. Must be one of: {", ".join(valid_statuses)}'
+                        'error': str(e)
                     }, status=400)
 
-                # Update status
-                shipment.status = new_status
-                shipment.save()
+                # Update status unless someone else changed the shipment since it was read
+                updated = compare_and_set(
+                    tracking_number, shipment.status, shipment.courier_id, actor=request.user,
+                    status=new_status
+                )
+                if updated is None:
+                    return JsonResponse({
+                        'success': False,
+                        'error': 'Shipment was updated by someone else. Please refresh and try again.'
+                    }, status=409)
+                shipment = updated
 
                 return JsonResponse({
                     'success': True,
@@ -533,15 +637,64 @@ class ShipmentStatusUpdateView(View):
             }, status=500)
 
 
-class RecipientDashboardView(LoginRequiredMixin, ListView):
+@method_decorator(csrf_exempt, name='dispatch')
+class ShipmentScanBatchView(View):
+    """
+    API endpoint for couriers to apply many scans in one request
+    POST /api/shipments/scan/
+    Expects JSON: {"scans": [{"tracking_number": "...", "action": "accept" | "update", "status": "..."}]}
+    Scans are applied in order in one transaction; invalid ones are reported
+    per item and skipped
+    """
+
+    def post(self, request):
+        if not request.user.is_authenticated:
+            return JsonResponse({
+                'success': False,
+                'error': 'Authentication required'
+            }, status=401)
+
+        if request.user.role != 'courier':
+            return JsonResponse({
+                'success': False,
+                'error': 'Courier role required'
+            }, status=403)
+
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({
+                'success': False,
+                'error': 'Invalid JSON in request body'
+            }, status=400)
+
+        scans = data.get('scans') if isinstance(data, dict) else data
+        try:
+            results = apply_scans(request.user, scans)
+        except ScanBatchError as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=400)
+
+        updated = sum(1 for result in results if result['success'])
+        return JsonResponse({
+            'success': True,
+            'updated': updated,
+            'failed': len(results) - updated,
+            'results': results
+        })
+
+
+class RecipientDashboardView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """
     Dashboard for recipients to track their expected shipments
-    Shows shipments where the recipient email matches the user's email
+    Shows shipments linked to the user's account by recipient email
+    Delivered shipments are paginated with keyset cursors
     """
     model = Shipment
     template_name = 'core/recipient_dashboard.html'
     context_object_name = 'shipments'
-    paginate_by = 20
 
     def dispatch(self, request, *args, **kwargs):
         # Verify user has recipient role
@@ -552,12 +705,12 @@ class RecipientDashboardView(LoginRequiredMixin, ListView):
 
     def get_queryset(self):
         """
-        Return shipments where recipient email matches user's email
+        Return shipments linked to the current recipient (indexed FK lookup)
         """
         user = self.request.user
         return Shipment.objects.filter(
-            recipient_email__iexact=user.email
-        ).select_related('shipper', 'courier').order_by('-created_at')
+            recipient_user=user
+        ).select_related('shipper', 'courier').order_by('-created_at', '-id')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -568,17 +721,81 @@ class RecipientDashboardView(LoginRequiredMixin, ListView):
         context['in_transit_shipments'] = all_shipments.filter(
             status__in=['accepted', 'picked_up', 'in_transit']
         )
-        context['delivered_shipments'] = all_shipments.filter(status='delivered')
+        context['delivered_shipments'] = self.paginate_keyset(all_shipments.filter(status='delivered'))
         context['pending_shipments'] = all_shipments.filter(status='pending')
 
         # Add counts
         context['total_expected'] = all_shipments.count()
         context['in_transit_count'] = context['in_transit_shipments'].count()
-        context['delivered_count'] = context['delivered_shipments'].count()
+        context['delivered_count'] = all_shipments.filter(status='delivered').count()
 
         return context
 
 
+class ShipmentListAPIView(LoginRequiredMixin, View):
+    """
+    JSON variant of the shipment lists, paginated with keyset cursors
+    GET /api/shipments/?cursor=<cursor>&status=<status>
+    Admins see every shipment, couriers their assigned shipments and
+    recipients the shipments addressed to them
+    """
+    page_size = 20
+
+    def handle_no_permission(self):
+        return JsonResponse({
+            'success': False,
+            'error': 'Authentication required'
+        }, status=401)
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = Shipment.objects.select_related('shipper', 'courier')
+
+        if user.is_staff or user.role == 'admin':
+            pass
+        elif user.role == 'courier':
+            queryset = queryset.filter(courier=user)
+        elif user.role == 'recipient':
+            queryset = queryset.filter(recipient_user=user)
+        else:
+            queryset = queryset.filter(shipper=user)
+
+        status_filter = self.request.GET.get('status')
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+
+        return queryset
+
+    def get(self, request):
+        try:
+            page = paginate_keyset(self.get_queryset(), request.GET.get('cursor'), self.page_size)
+        except InvalidCursor:
+            return JsonResponse({
+                'success': False,
+                'error': 'Invalid cursor'
+            }, status=400)
+
+        return JsonResponse({
+            'success': True,
+            'count': len(page),
+            'next_cursor': page.next_cursor,
+            'previous_cursor': page.previous_cursor,
+            'results': [
+                {
+                    'tracking_number': shipment.tracking_number,
+                    'status': shipment.status,
+                    'status_display': shipment.get_status_display(),
+                    'recipient_name': shipment.recipient_name,
+                    'shipper': shipment.shipper.username,
+                    'courier': shipment.courier.username if shipment.courier else None,
+                    'created_at': shipment.created_at.isoformat(),
+                    'last_updated': shipment.updated_at.isoformat(),
+                }
+                for shipment in page
+            ],
+        })
+
+
 class ContactView(TemplateView):
     """
     Contact page with a form. Since email isn't configured, submissions are printed to
@@ -620,14 +837,17 @@ class ContactView(TemplateView):
 
 
 
-class AdminShipmentListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
+class AdminShipmentListView(LoginRequiredMixin, UserPassesTestMixin, KeysetPaginationMixin, ListView):
     """
     Admin view to list and manage all shipments
+    Paginated with keyset cursors (see core.pagination)
     """
     model = Shipment
     template_name = 'core/admin_shipment_list.html'
     context_object_name = 'shipments'
     paginate_by = 20
+    search_page_size = 50
+    search_max_results = 1000
 
     def test_func(self):
         return self.request.user.is_staff or self.request.user.role == 'admin'
@@ -637,24 +857,31 @@ class AdminShipmentListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
         return redirect('core:home')
 
     def get_queryset(self):
-        queryset = Shipment.objects.select_related('shipper', 'courier').order_by('-created_at')
+        queryset = Shipment.objects.select_related('shipper', 'courier').order_by('-created_at', '-id')
 
         # Filter by status if provided
         status_filter = self.request.GET.get('status')
         if status_filter:
             queryset = queryset.filter(status=status_filter)
 
-        # Search by tracking number or recipient name
+        # Search by tracking number, recipient name or shipper username
         search_query = self.request.GET.get('search')
         if search_query:
-            queryset = queryset.filter(
-                Q(tracking_number__icontains=search_query) |
-                Q(recipient_name__icontains=search_query) |
-                Q(shipper__username__icontains=search_query)
-            )
+            queryset = search_shipments(queryset, search_query)
 
         return queryset
 
+    def paginate_queryset(self, queryset, page_size):
+        # Search results are ranked by relevance, so they are paged by offset
+        # through the best search_max_results matches instead of by creation time
+        if self.request.GET.get('search'):
+            try:
+                page = paginate_ranked(queryset, self.get_cursor(), self.search_page_size, self.search_max_results)
+            except InvalidCursor:
+                page = paginate_ranked(queryset, None, self.search_page_size, self.search_max_results)
+            return None, page, page.object_list, page.has_other_pages()
+        return super().paginate_queryset(queryset, page_size)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['status_choices'] = Shipment.STATUS_CHOICES
@@ -662,10 +889,8 @@ class AdminShipmentListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
         context['search_query'] = self.request.GET.get('search', '')
 
         # Count by status
-        context['status_counts'] = {
-            status[0]: Shipment.objects.filter(status=status[0]).count()
-            for status in Shipment.STATUS_CHOICES
-        }
+        context['status_counts'] = ShipmentStatusCounter.get_counts()
+        context['total_count'] = sum(context['status_counts'].values())
 
         # Get all couriers for assignment dropdown
         context['couriers'] = UserProfile.objects.filter(role='courier').order_by('username')
@@ -683,6 +908,70 @@ class AdminShipmentListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
         return context
 
 
+class AdminShipmentExportView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """
+    Admin-only streaming export of shipments as CSV or Parquet
+    Query parameters: format (csv or parquet), start and end (YYYY-MM-DD,
+    inclusive) and status; see core.exports
+    """
+
+    def test_func(self):
+        return self.request.user.is_staff or self.request.user.role == 'admin'
+
+    def get(self, request):
+        export_format = request.GET.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return JsonResponse({'success': False, 'error': 'Invalid format'}, status=400)
+
+        dates = {}
+        for param in ('start', 'end'):
+            value = request.GET.get(param)
+            try:
+                dates[param] = parse_date(value) if value else None
+            except ValueError:
+                dates[param] = None
+            if value and dates[param] is None:
+                return JsonResponse({'success': False, 'error': f'Invalid {param} date'}, status=400)
+
+        status = request.GET.get('status') or None
+        if status and status not in dict(Shipment.STATUS_CHOICES):
+            return JsonResponse({'success': False, 'error': 'Invalid status'}, status=400)
+
+        try:
+            stream = stream_export(export_queryset(status=status, **dates), export_format)
+        except UnsupportedExportFormat as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+        content_type, extension = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(stream, content_type=content_type)
+        response.headers['Content-Disposition'] = (
+            f'attachment; filename="shipments-{timezone.now():%Y%m%d-%H%M%S}.{extension}"'
+        )
+        return response
+
+
+class AdminAutoAssignView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """
+    Admin action assigning every pending shipment without a courier to the
+    least loaded couriers (see core.assignment)
+    """
+
+    def test_func(self):
+        return self.request.user.is_staff or self.request.user.role == 'admin'
+
+    def handle_no_permission(self):
+        messages.error(self.request, 'Access denied. Admin privileges required.')
+        return redirect('core:home')
+
+    def post(self, request):
+        assigned = assign_unassigned(actor=request.user)
+        if assigned:
+            messages.success(request, f'Assigned {assigned} shipments to couriers.')
+        else:
+            messages.info(request, 'No shipments could be assigned (none unassigned, or every courier is at capacity).')
+        return redirect('core:admin_shipment_list')
+
+
 class AdminShipmentUpdateView(LoginRequiredMixin, UserPassesTestMixin, View):
     """
     Admin view to update shipment status and details
@@ -696,7 +985,7 @@ class AdminShipmentUpdateView(LoginRequiredMixin, UserPassesTestMixin, View):
         return redirect('core:home')
 
     def post(self, request, tracking_number):
-        shipment = get_object_or_404(Shipment, tracking_number=tracking_number.upper())
+        tracking_number = tracking_number.upper()
 
         # Get form data
         new_status = request.POST.get('status')
@@ -715,32 +1004,47 @@ class AdminShipmentUpdateView(LoginRequiredMixin, UserPassesTestMixin, View):
             messages.error(request, 'Hold reason is required when setting status to Hold.')
             return redirect('core:admin_shipment_list')
 
-        # Store old status for notification
-        old_status = shipment.status
-
-        # Update status and previous_status
-        if old_status != new_status:
-            shipment.previous_status = old_status
-
-        shipment.status = new_status
-
-        # Update hold_reason
-        if new_status == 'hold':
-            shipment.hold_reason = hold_reason
+        # The status and courier the admin saw when opening the form; the
+        # update only applies if nobody changed them in the meantime
+        old_status = request.POST.get('expected_status')
+        expected_courier = request.POST.get('expected_courier')
+        if old_status in valid_statuses and expected_courier is not None:
+            old_courier_id = int(expected_courier) if expected_courier.isdigit() else None
         else:
+            current = get_object_or_404(
+                Shipment.objects.for_tracking_number(tracking_number).values('status', 'courier_id')
+            )
+            old_status, old_courier_id = current['status'], current['courier_id']
+
+        changes = {
+            'status': new_status,
             # Clear hold_reason if status is not hold
-            shipment.hold_reason = None
+            'hold_reason': hold_reason if new_status == 'hold' else None,
+        }
+        if old_status != new_status:
+            changes['previous_status'] = old_status
 
         # Update courier if provided
         if courier_id:
             try:
-                courier = UserProfile.objects.get(id=courier_id, role='courier')
-                shipment.courier = courier
-            except UserProfile.DoesNotExist:
+                changes['courier'] = UserProfile.objects.get(id=courier_id, role='courier')
+            except (UserProfile.DoesNotExist, ValueError):
                 messages.error(request, 'Invalid courier selected.')
                 return redirect('core:admin_shipment_list')
 
-        shipment.save()
+        try:
+            shipment = compare_and_set(tracking_number, old_status, old_courier_id, actor=request.user, **changes)
+        except InvalidTransition as e:
+            messages.error(request, str(e))
+            return redirect('core:admin_shipment_list')
+        if shipment is None:
+            get_object_or_404(Shipment.objects.for_tracking_number(tracking_number))
+            messages.error(
+                request,
+                f'Shipment {tracking_number} was changed by someone else while you were editing it. '
+                'Please review its current status and try again.'
+            )
+            return redirect('core:admin_shipment_list')
 
         # Create status note if provided
         if status_note:
@@ -751,10 +1055,6 @@ class AdminShipmentUpdateView(LoginRequiredMixin, UserPassesTestMixin, View):
                 created_by=request.user
             )
 
-        # Send email notification if status changed
-        if old_status != new_status:
-            self.send_status_change_email(shipment, old_status, new_status)
-
         messages.success(
             request,
             f'Shipment {tracking_number} updated: {dict(Shipment.STATUS_CHOICES)[old_status]} → {dict(Shipment.STATUS_CHOICES)[new_status]}'
@@ -766,67 +1066,6 @@ class AdminShipmentUpdateView(LoginRequiredMixin, UserPassesTestMixin, View):
         else:
             return redirect('core:admin_shipment_list')
 
-    def send_status_change_email(self, shipment, old_status, new_status):
-        """Send email notification about status change"""
-        # Prepare email recipients
-        recipients = []
-
-        # Add shipper email
-        if shipment.shipper.email:
-            recipients.append(shipment.shipper.email)
-
-        # Add recipient email if provided
-        if shipment.recipient_email:
-            recipients.append(shipment.recipient_email)
-
-        if not recipients:
-            return
-
-        # Prepare email content
-        subject = f'Shipment Update - {shipment.tracking_number}'
-
-        old_status_display = dict(Shipment.STATUS_CHOICES).get(old_status, old_status)
-        new_status_display = dict(Shipment.STATUS_CHOICES).get(new_status, new_status)
-
-        message = f'''
-Hello,
-
-Your shipment status has been updated:
-
-Tracking Number: {shipment.tracking_number}
-Previous Status: {old_status_display}
-New Status: {new_status_display}
-'''
-
-        # Add hold reason if status is hold
-        if new_status == 'hold' and shipment.hold_reason:
-            message += f'\nReason for Hold: {shipment.hold_reason}\n'
-
-        message += f'''
-Package Details:
-- From: {shipment.shipper.username}
-- To: {shipment.recipient_name}
-- Weight: {shipment.weight} kg
-
-You can track your shipment at any time using your tracking number.
-
-Thank you for using our service!
-
-Best regards,
-Nexpress Team
-        '''
-
-        try:
-            send_mail(
-                subject,
-                message,
-                settings.DEFAULT_FROM_EMAIL if hasattr(settings, 'DEFAULT_FROM_EMAIL') else 'noreply@nexpress.com',
-                recipients,
-                fail_silently=True,
-            )
-        except Exception as e:
-            print(f"Error sending status change email: {e}")
-
 
 class AdminDashboardView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
     """
@@ -846,65 +1085,35 @@ class AdminDashboardView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        # Shipment counts by status
-        status_counts = {}
-        for status_code, status_display in Shipment.STATUS_CHOICES:
-            status_counts[status_code] = {
-                'display': status_display,
-                'count': Shipment.objects.filter(status=status_code).count()
-            }
-        context['status_counts'] = status_counts
-
-        # Total shipments
-        context['total_shipments'] = Shipment.objects.count()
+        # Counters and leaderboards come from a short-lived cached snapshot
+        context.update(get_dashboard_snapshot())
 
-        # User statistics
-        context['total_users'] = UserProfile.objects.count()
-        context['courier_count'] = UserProfile.objects.filter(role='courier').count()
-        context['shipper_count'] = UserProfile.objects.filter(role='shipper').count()
+        # Delivery time percentiles and histograms, cached per window
+        context['delivery_analytics'] = get_delivery_analytics(self.request.GET.get('window'))
+        context['analytics_windows'] = list(ANALYTICS_WINDOWS)
 
         # Recent shipments (last 20)
         context['recent_shipments'] = Shipment.objects.select_related(
             'shipper', 'courier'
         ).order_by('-created_at')[:20]
 
-        # Shipments created today
-        today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        context['today_shipments'] = Shipment.objects.filter(
-            created_at__gte=today_start
-        ).count()
-
-        # Shipments created this week
-        week_start = timezone.now() - timedelta(days=7)
-        context['week_shipments'] = Shipment.objects.filter(
-            created_at__gte=week_start
-        ).count()
-
-        # Unassigned pending shipments
-        context['unassigned_count'] = Shipment.objects.filter(
-            status='pending',
-            courier__isnull=True
-        ).count()
-
-        # Active couriers (couriers with at least one active shipment)
-        context['active_couriers'] = UserProfile.objects.filter(
-            role='courier',
-            shipments_assigned__status__in=['accepted', 'picked_up', 'in_transit']
-        ).distinct().count()
-
-        # Top shippers (users who have created the most shipments)
-        context['top_shippers'] = UserProfile.objects.filter(
-            shipments_sent__isnull=False
-        ).annotate(
-            shipment_count=Count('shipments_sent')
-        ).order_by('-shipment_count')[:5]
-
-        # Top couriers (couriers who have delivered the most shipments)
-        context['top_couriers'] = UserProfile.objects.filter(
-            role='courier',
-            shipments_assigned__status='delivered'
-        ).annotate(
-            delivered_count=Count('shipments_assigned')
-        ).order_by('-delivered_count')[:5]
-
         return context
+
+
+class AdminRateLimitStatsView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """
+    Admin-only JSON view of rate limiter counters
+    Shows how many tracking requests were allowed and how many were shed
+    """
+
+    def test_func(self):
+        return self.request.user.is_staff or self.request.user.role == 'admin'
+
+    def get(self, request):
+        from .ratelimit import get_limiter
+
+        return JsonResponse({
+            'success': True,
+            'enabled': getattr(settings, 'RATELIMIT_ENABLED', True),
+            'scopes': get_limiter().stats(),
+        })
@@ -21,6 +21,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fedex_clone.settings')
 django_asgi_app = get_asgi_application()
 
 import chat.routing
+import core.routing
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
@@ -28,6 +29,7 @@ application = ProtocolTypeRouter({
         AuthMiddlewareStack(
             URLRouter(
                 chat.routing.websocket_urlpatterns
+                + core.routing.websocket_urlpatterns
             )
         )
     ),
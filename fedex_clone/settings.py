@@ -98,6 +98,37 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Cache configuration
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'nexpress-default',
+    },
+}
+
+# Seconds a serialized tracking payload stays cached (writes invalidate it sooner)
+TRACKING_CACHE_TIMEOUT = 300
+
+# Seconds the admin dashboard statistics snapshot stays cached
+DASHBOARD_CACHE_TIMEOUT = 30
+
+# Key for the tracking number permutation. Must never change once numbers have
+# been issued, otherwise new numbers may collide with existing ones
+TRACKING_NUMBER_KEY = env("TRACKING_NUMBER_KEY", default="nexpress-tracking")
+
+# Rate limiting of the public tracking endpoints (see core/ratelimit.py)
+RATELIMIT_ENABLED = env.bool("RATELIMIT_ENABLED", default=True)
+RATELIMIT_RATES = {
+    # scope: {bucket kind: (capacity, tokens refilled per second)}
+    'tracking': {'ip': (60, 1.0), 'api_key': (600, 10.0)},
+}
+# API keys granted the larger per-key bucket
+RATELIMIT_API_KEYS = env.list("RATELIMIT_API_KEYS", default=[])
+# Set to a cache alias to share buckets across worker processes
+RATELIMIT_CACHE_ALIAS = env("RATELIMIT_CACHE_ALIAS", default=None)
+# Enable when running behind a proxy that sets X-Forwarded-For
+RATELIMIT_TRUST_X_FORWARDED_FOR = env.bool("RATELIMIT_TRUST_X_FORWARDED_FOR", default=False)
+
 
 
 